@@ -2,8 +2,9 @@
 Configuration de la base de données PostgreSQL avec SQLAlchemy
 """
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import Callable
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 # URL de connexion à la base de données
 # Render peut fournir postgres:// ou postgresql:// selon la version
@@ -34,3 +35,27 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Actions différées au commit, par session (voir after_commit)
+_AFTER_COMMIT = "after_commit"
+
+def after_commit(db: Session, callback: Callable[[], None]) -> None:
+    """
+    Exécuter callback() au commit de la transaction en cours de la session, jamais
+    après son rollback (caches locaux, purges: l'écriture doit être visible)
+    
+    Les actions sont gardées dans session.info: un rollback les abandonne, sans
+    écouteur résiduel sur la session.
+    """
+    db.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    for callback in session.info.pop(_AFTER_COMMIT, ()):
+        callback()
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_commit(session: Session, previous_transaction) -> None:
+    # Rollback d'un savepoint: la transaction englobante peut encore être commitée
+    if previous_transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT, None)
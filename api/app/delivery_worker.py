@@ -0,0 +1,94 @@
+"""
+Worker de livraison des commandes payées
+Réserve des lots de livraisons (FOR UPDATE SKIP LOCKED, plusieurs workers possibles),
+appelle le fournisseur de recharge en parallèle dans les limites de concurrence et de
+débit du fournisseur, puis enregistre les résultats du lot.
+
+Usage: TOPUP_PROVIDER=fake python -m app.delivery_worker [--batch 64]
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+from app.database import SessionLocal
+from app.services import delivery
+from app.services.topup_providers import get_provider
+
+POLL_INTERVAL_SECONDS = float(os.getenv("DELIVERY_POLL_INTERVAL", "1.0"))
+
+
+class DeliveryWorker:
+    """
+    Boucle de consommation de la table deliveries pour un fournisseur
+    """
+
+    def __init__(self, provider, batch_size: int = None):
+        self.provider = provider
+        # Par défaut quelques lots d'avance sur la concurrence du fournisseur
+        self.batch_size = batch_size or provider.max_concurrency * 4
+        self.dispatcher = delivery.Dispatcher(provider)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = True
+
+    def stop(self, *_):
+        """
+        Arrêt propre: terminer le lot en cours puis sortir
+        """
+        self.running = False
+
+    def run_once(self) -> int:
+        """
+        Réserver, livrer et enregistrer un lot, retourne le nombre traité
+        """
+        db = SessionLocal()
+        try:
+            batch = delivery.claim_batch(db, self.provider.name, self.worker_id, self.batch_size)
+            if not batch:
+                return 0
+            results = self.dispatcher.dispatch(batch)
+            summary = delivery.apply_results(db, self.worker_id, results)
+            print(f"📦 Lot de {len(batch)} livraisons: {summary}")
+            return len(batch)
+        finally:
+            db.close()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print(
+            f"🚚 Worker de livraison {self.worker_id} démarré "
+            f"(fournisseur={self.provider.name}, concurrence={self.provider.max_concurrency}, "
+            f"débit={self.provider.rate_per_second}/s)"
+        )
+
+        while self.running:
+            try:
+                processed = self.run_once()
+            except Exception as exc:
+                print(f"⚠️ Lot de livraison interrompu: {exc}")
+                processed = 0
+            if processed == 0:
+                time.sleep(POLL_INTERVAL_SECONDS)
+
+        self.dispatcher.shutdown()
+        print(f"🛑 Worker de livraison {self.worker_id} arrêté")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de livraison des commandes payées")
+    parser.add_argument("--provider", default=None, help="Fournisseur (TOPUP_PROVIDER par défaut)")
+    parser.add_argument("--batch", type=int, default=None)
+    args = parser.parse_args()
+
+    provider = get_provider(args.provider)
+    if provider is None:
+        print("❌ Aucun fournisseur de recharge configuré (TOPUP_PROVIDER)")
+        sys.exit(1)
+    DeliveryWorker(provider, batch_size=args.batch).run()
+
+
+if __name__ == "__main__":
+    main()
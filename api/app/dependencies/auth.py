@@ -4,19 +4,35 @@ Authentication Dependencies - Gestion de l'authentification JWT
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from typing import Optional
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+from uuid import UUID
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+import hashlib
 import os
+import secrets
+import threading
+import time
 
 from app.database import get_db
 from app.models import User
+from app.services.jwt_backends import TokenExpired, TokenInvalid, get_backend
+from app.services.revocation import revocations
 
 # Configuration JWT
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 
+# Implémentation JWT (JWT_BACKEND=jose|pyjwt)
+jwt_backend = get_backend()
+
+# Cache des tokens déjà vérifiés: sha256(token) -> (payload, exp), dans l'ordre
+# d'insertion (les plus anciens expirent les premiers)
+TOKEN_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+_verified_tokens: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
 security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
 
@@ -29,28 +45,116 @@ def create_access_token(user_id: str, email: str, role: str) -> str:
         "email": email,
         "role": role,
         "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS),
-        "iat": datetime.utcnow()
+        "iat": datetime.utcnow(),
+        # iat est à la seconde: révocation par utilisateur comparée à la milliseconde
+        "iat_ms": int(time.time() * 1000),
+        "jti": secrets.token_hex(8)
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt_backend.encode(payload, JWT_SECRET, JWT_ALGORITHM)
+
+def _remember_verified(key: bytes, payload: dict, expires_at: float) -> None:
+    """
+    Mémoriser un token vérifié; cache plein: le plus ancien est évincé en O(1)
+
+    Les tokens expirés sont retirés à leur prochaine lecture, ou évincés avec les plus anciens.
+    """
+    with _verified_tokens_lock:
+        while len(_verified_tokens) >= TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+        _verified_tokens[key] = (payload, expires_at)
+
+def _verify_signature(token: str) -> dict:
+    """
+    Vérifier signature et expiration, en réutilisant le résultat d'une vérification précédente
+
+    Retourne une copie du payload: l'appelant ne peut pas modifier l'entrée du cache.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    cached = _verified_tokens.get(key)
+    if cached is not None:
+        payload, expires_at = cached
+        if time.time() < expires_at:
+            return dict(payload)
+        with _verified_tokens_lock:
+            _verified_tokens.pop(key, None)
+        raise TokenExpired()
+    
+    payload = jwt_backend.decode(token, JWT_SECRET, [JWT_ALGORITHM])
+    if "exp" in payload:
+        _remember_verified(key, dict(payload), float(payload["exp"]))
+    return payload
 
 def decode_token(token: str) -> dict:
     """
     Décoder et valider un token JWT
+    
+    La signature HS256 n'est vérifiée qu'une fois par token (cache borné jusqu'à exp);
+    la révocation est contrôlée à chaque appel.
     """
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
+        payload = _verify_signature(token)
+    except TokenExpired:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token expiré"
         )
-    except JWTError:
+    except TokenInvalid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide"
+        )
+    
+    if revocations.is_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token révoqué"
+        )
+    
+    return payload
+
+class Principal(NamedTuple):
+    """
+    Identité issue des claims du token, sans accès à la base de données
+    
+    Expose id / email / role comme User pour les endpoints qui n'ont besoin que de ça.
+    """
+    id: UUID
+    email: str
+    role: str
+
+def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> Principal:
+    """
+    Récupérer l'identité depuis le token JWT seul (chemin rapide, pas de requête SQL)
+    
+    Les tokens révoqués (logout, changement de rôle, nouveau mot de passe) sont
+    refusés par decode_token via la liste de révocation en mémoire.
+    """
+    payload = decode_token(credentials.credentials)
+    try:
+        return Principal(
+            id=UUID(payload["user_id"]),
+            email=payload.get("email", ""),
+            role=payload.get("role", "user")
+        )
+    except (KeyError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token invalide"
         )
 
+def require_admin_principal(principal: Principal = Depends(get_current_principal)) -> Principal:
+    """
+    Vérifier que le token porte le rôle admin (sans requête SQL)
+    """
+    if principal.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès administrateur requis"
+        )
+    return principal
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
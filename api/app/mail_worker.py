@@ -0,0 +1,93 @@
+"""
+Worker d'envoi des emails
+Réserve des lots d'emails (FOR UPDATE SKIP LOCKED, plusieurs workers possibles), les
+envoie sur les connexions SMTP gardées ouvertes par le worker puis enregistre les
+résultats du lot.
+
+Usage: python -m app.mail_worker [--batch 100] [--pool 2]
+Développement: SMTP_HOST=localhost SMTP_PORT=1025 (MailHog, interface sur le port 8025)
+"""
+import argparse
+import os
+import signal
+import socket
+import time
+
+from app.database import SessionLocal
+from app.services import mailer
+
+POLL_INTERVAL_SECONDS = float(os.getenv("MAIL_POLL_INTERVAL", "1.0"))
+
+
+class MailWorker:
+    """
+    Boucle de consommation de la table email_outbox
+    """
+
+    def __init__(self, batch_size: int = 100, pool_size: int = mailer.SMTP_POOL_SIZE):
+        self.batch_size = batch_size
+        self.sender = mailer.Sender(pool_size)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = mailer.lease_seconds(batch_size, self.sender.pool.size)
+        self.running = True
+
+    def stop(self, *_):
+        """
+        Arrêt propre: terminer le lot en cours puis sortir
+        """
+        self.running = False
+
+    def run_once(self) -> int:
+        """
+        Réserver, envoyer et enregistrer un lot, retourne le nombre traité
+        """
+        db = SessionLocal()
+        try:
+            batch = mailer.claim_batch(db, self.worker_id, self.batch_size, self.lease)
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            results = self.sender.send_batch(batch)
+            summary = mailer.apply_results(db, self.worker_id, results)
+            print(f"✉️ Lot de {len(batch)} emails en {(time.perf_counter() - started) * 1000:.0f} ms: {summary}")
+            return len(batch)
+        finally:
+            db.close()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print(
+            f"✉️ Worker email {self.worker_id} démarré "
+            f"(serveur={mailer.SMTP_HOST}:{mailer.SMTP_PORT}, connexions={self.sender.pool.size}, bail={self.lease}s)"
+        )
+
+        while self.running:
+            try:
+                processed = self.run_once()
+            except Exception as exc:
+                print(f"⚠️ Lot d'emails interrompu: {exc}")
+                processed = 0
+            if processed == 0:
+                self.sender.pool.close_idle()
+                time.sleep(POLL_INTERVAL_SECONDS)
+
+        self.sender.shutdown()
+        print(f"🛑 Worker email {self.worker_id} arrêté")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker d'envoi des emails")
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--pool", type=int, default=mailer.SMTP_POOL_SIZE, help="Connexions SMTP simultanées")
+    args = parser.parse_args()
+
+    # Pas d'erreur sans SMTP: le service est facultatif (les emails restent en file)
+    if not mailer.SMTP_HOST:
+        print("⚠️ Aucun serveur SMTP configuré (SMTP_HOST): worker email désactivé")
+        return
+    MailWorker(batch_size=args.batch, pool_size=args.pool).run()
+
+
+if __name__ == "__main__":
+    main()
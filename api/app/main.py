@@ -3,9 +3,11 @@ Application principale FastAPI FreeFire MVP
 Point d'entrée de l'API avec configuration des routers et middleware
 """
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 from app.routers import (
     health,
@@ -17,76 +19,97 @@ from app.routers import (
     admin
 )
 from app.schemas import HealthResponse
+from app.services import lifecycle, payment_webhooks
+from app.services.payment_providers import registry as payment_providers
+from app.services.http_cache import HTTPCacheMiddleware
 
-# Configuration de l'application FastAPI
-app = FastAPI(
-    title="FreeFire MVP API",
-    description="API complète pour la plateforme FreeFire MVP - E-commerce et Tournois",
-    version="2.4.0",
-    docs_url="/docs",
-    redoc_url="/redoc"
-)
-
-# Configuration CORS - Lire depuis variable d'environnement ou autoriser tout
-cors_origins_env = os.getenv("CORS_ORIGINS", "*")
-if cors_origins_env == "*":
-    cors_origins = ["*"]
-else:
-    cors_origins = [origin.strip() for origin in cors_origins_env.split(",")]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=cors_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Configuration des routers (modules fonctionnels)
-app.include_router(health.router, prefix="", tags=["health"])
-app.include_router(auth.router, prefix="/auth", tags=["authentication"])
-app.include_router(catalog.router, prefix="", tags=["catalog"])
-app.include_router(orders.router, prefix="", tags=["orders"])
-app.include_router(payments.router, prefix="/payments", tags=["payments"])
-app.include_router(tournaments.router, prefix="/tournaments", tags=["tournaments"])
-app.include_router(admin.router, prefix="/admin", tags=["administration"])
-
-# Configuration des fichiers statiques (CSS, JS, images)
-# Gérer le cas où le dossier n'existe pas (pour éviter les erreurs au démarrage)
-import os
-static_dir = "app/static"
-if os.path.exists(static_dir) and os.path.isdir(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
-@app.get("/", response_model=HealthResponse)
-def root():
-    """
-    Endpoint racine - Information de base sur l'API
-    """
-    return HealthResponse(
-        status="ok",
-        timestamp=datetime.now(),
-        version="2.4.0"
-    )
+API_VERSION = "2.4.0"
 
-@app.on_event("startup")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    Événements exécutés au démarrage de l'application
+    Cycle de vie du worker: warmup avant de se déclarer prêt, libération à l'arrêt
     """
+    # Pool de connexions, caches de référence, bcrypt, liste de révocation
+    await run_in_threadpool(lifecycle.warmup)
+    # Clients HTTP des opérateurs: créés dans la boucle asyncio qui les utilisera
+    await payment_providers.start()
+    # Commit groupé des callbacks opérateurs (webhooks)
+    await payment_webhooks.buffer.start()
     print("🚀 FreeFire MVP API démarrée")
-    print("📊 Version: 2.4.0")
+    print(f"📊 Version: {API_VERSION}")
     print("🌐 Documentation: http://localhost:8080/docs")
+    yield
+    await payment_webhooks.buffer.aclose()
+    await payment_providers.aclose()
+    await run_in_threadpool(lifecycle.shutdown)
+    print("🛑 FreeFire MVP API arrêtée")
 
-@app.on_event("shutdown")
-async def shutdown_event():
+def create_app() -> FastAPI:
     """
-    Événements exécutés à l'arrêt de l'application
+    Construire l'application (routers, middleware, fichiers statiques)
     """
-    print("🛑 FreeFire MVP API arrêtée")
+    app = FastAPI(
+        title="FreeFire MVP API",
+        description="API complète pour la plateforme FreeFire MVP - E-commerce et Tournois",
+        version=API_VERSION,
+        docs_url="/docs",
+        redoc_url="/redoc",
+        lifespan=lifespan
+    )
+    
+    # Configuration CORS - Lire depuis variable d'environnement ou autoriser tout
+    cors_origins_env = os.getenv("CORS_ORIGINS", "*")
+    if cors_origins_env == "*":
+        cors_origins = ["*"]
+    else:
+        cors_origins = [origin.strip() for origin in cors_origins_env.split(",")]
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=cors_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    # Cache-Control / ETag / Surrogate-Key des endpoints publics (micro-cache nginx)
+    app.add_middleware(HTTPCacheMiddleware)
+    
+    # Configuration des routers (modules fonctionnels)
+    app.include_router(health.router, prefix="", tags=["health"])
+    app.include_router(auth.router, prefix="/auth", tags=["authentication"])
+    app.include_router(catalog.router, prefix="", tags=["catalog"])
+    app.include_router(orders.router, prefix="", tags=["orders"])
+    app.include_router(payments.router, prefix="/payments", tags=["payments"])
+    app.include_router(tournaments.router, prefix="/tournaments", tags=["tournaments"])
+    app.include_router(admin.router, prefix="/admin", tags=["administration"])
+    
+    # Configuration des fichiers statiques (CSS, JS, images)
+    # Gérer le cas où le dossier n'existe pas (pour éviter les erreurs au démarrage)
+    static_dir = "app/static"
+    if os.path.exists(static_dir) and os.path.isdir(static_dir):
+        app.mount("/static", StaticFiles(directory=static_dir), name="static")
+    
+    @app.get("/", response_model=HealthResponse)
+    def root():
+        """
+        Endpoint racine - Information de base sur l'API
+        """
+        return HealthResponse(
+            status="ok",
+            timestamp=datetime.now(),
+            version=API_VERSION
+        )
+    
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
     # Utiliser le port depuis la variable d'environnement (Render) ou 8080 par défaut
+    # En production, utiliser le lanceur multi-workers: python -m app.server
     port = int(os.getenv("PORT", 8080))
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
+    reload = os.getenv("APP_ENV", "development") == "development"
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=reload)
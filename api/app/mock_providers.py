@@ -0,0 +1,124 @@
+"""
+Serveur factice des opérateurs de paiement (MTN MoMo, Moov Money)
+Reproduit les endpoints d'encaissement utilisés par app.services.payment_providers,
+pour le développement et les tests, sans compte marchand.
+
+- Une demande passe à "réussie" après MOCK_PROVIDER_APPROVE_AFTER secondes
+- Un numéro se terminant par 0000 est refusé (solde insuffisant)
+- MOCK_PROVIDER_LATENCY / MOCK_PROVIDER_ERROR_RATE: latence et taux de 503 simulés
+
+Usage: python -m app.mock_providers [--port 9100]
+Puis PAYMENT_MTN_MOMO_URL=http://localhost:9100/mtn_momo
+     PAYMENT_MOOV_MONEY_URL=http://localhost:9100/moov_money
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from typing import Dict
+
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse, Response
+
+LATENCY_SECONDS = float(os.getenv("MOCK_PROVIDER_LATENCY", "0.05"))
+ERROR_RATE = float(os.getenv("MOCK_PROVIDER_ERROR_RATE", "0"))
+APPROVE_AFTER_SECONDS = float(os.getenv("MOCK_PROVIDER_APPROVE_AFTER", "3"))
+
+app = FastAPI(title="Opérateurs de paiement factices")
+
+# Encaissements en mémoire: (opérateur, référence) -> demande
+collections: Dict[tuple, dict] = {}
+
+
+@app.middleware("http")
+async def simulate_network(request: Request, call_next):
+    await asyncio.sleep(LATENCY_SECONDS)
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"message": "Erreur simulée"}, status_code=503)
+    return await call_next(request)
+
+
+def _create(operator: str, reference: str, body: dict, msisdn: str) -> bool:
+    key = (operator, reference)
+    if key in collections:
+        return False
+    collections[key] = {
+        "created_at": time.time(),
+        "amount": body.get("amount"),
+        "currency": body.get("currency"),
+        "declined": msisdn.endswith("0000"),
+        "transaction_id": uuid.uuid4().hex[:16].upper(),
+    }
+    return True
+
+
+def _status(operator: str, reference: str):
+    request = collections.get((operator, reference))
+    if request is None:
+        return None, None
+    if request["declined"]:
+        return "failed", request
+    if time.time() - request["created_at"] >= APPROVE_AFTER_SECONDS:
+        return "successful", request
+    return "pending", request
+
+
+@app.post("/mtn_momo/collection/v1_0/requesttopay")
+async def mtn_request_to_pay(request: Request, x_reference_id: str = Header(...)):
+    body = await request.json()
+    created = _create("mtn_momo", x_reference_id, body, body.get("payer", {}).get("partyId", ""))
+    return Response(status_code=202 if created else 409)
+
+
+@app.get("/mtn_momo/collection/v1_0/requesttopay/{reference}")
+def mtn_request_status(reference: str):
+    status, request = _status("mtn_momo", reference)
+    if status is None:
+        return JSONResponse({"code": "RESOURCE_NOT_FOUND"}, status_code=404)
+    return {
+        "amount": request["amount"],
+        "currency": request["currency"],
+        "status": {"pending": "PENDING", "successful": "SUCCESSFUL", "failed": "FAILED"}[status],
+        "financialTransactionId": request["transaction_id"] if status == "successful" else None,
+        "reason": "PAYER_LIMIT_REACHED" if status == "failed" else None,
+    }
+
+
+@app.post("/moov_money/v1/payments")
+async def moov_create_payment(request: Request):
+    body = await request.json()
+    created = _create("moov_money", body.get("reference", ""), body, body.get("msisdn", ""))
+    if not created:
+        return JSONResponse({"message": "Référence déjà utilisée"}, status_code=409)
+    return JSONResponse({"reference": body.get("reference"), "status": "PENDING"}, status_code=201)
+
+
+@app.get("/moov_money/v1/payments/{reference}")
+def moov_payment_status(reference: str):
+    status, request = _status("moov_money", reference)
+    if status is None:
+        return JSONResponse({"message": "Transaction inconnue"}, status_code=404)
+    return {
+        "reference": reference,
+        "amount": request["amount"],
+        "currency": request["currency"],
+        "status": {"pending": "PENDING", "successful": "SUCCESS", "failed": "FAILED"}[status],
+        "transaction_id": request["transaction_id"] if status == "successful" else None,
+        "message": "Solde insuffisant" if status == "failed" else None,
+    }
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serveur factice des opérateurs de paiement")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
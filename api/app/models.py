@@ -2,10 +2,10 @@
 Modèles SQLAlchemy pour l'application FreeFire MVP
 Toutes les tables de base de données sont définies ici
 """
-from sqlalchemy import Column, String, Numeric, DateTime, ForeignKey, Integer, Boolean, Text, func
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, Numeric, Date, DateTime, ForeignKey, Integer, BigInteger, SmallInteger, Boolean, Text, Computed, func
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, JSONB, TSVECTOR
 import uuid
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from app.database import Base
 
 
@@ -76,20 +76,42 @@ class CatalogItem(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
+class FxRate(Base):
+    """Taux de change: XOF pour une unité de la devise (snapshot en mémoire: services.fx_rates)"""
+    __tablename__ = "fx_rates"
+    
+    currency = Column(String(3), primary_key=True)
+    xof_per_unit = Column(Numeric(18,6), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class Order(Base):
-    """Commandes des utilisateurs"""
+    """Commandes des utilisateurs (partitionnée par mois sur created_at)"""
     __tablename__ = "orders"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    order_code = Column(String(20), unique=True, nullable=False)
+    order_code = Column(String(20), nullable=False)  # Unicité garantie par order_keys
     user_id = Column(UUID(as_uuid=True), nullable=False)
     catalog_item_id = Column(UUID(as_uuid=True), nullable=False)
     uid_freefire = Column(String(32), nullable=False)
-    status = Column(String(20), nullable=False)  # achete | en_attente | livre
+    status = Column(String(20), nullable=False)  # Voir services.state_machine.ORDERS
+    version = Column(Integer, nullable=False, default=0)  # Incrémentée à chaque transition
     total_amount = Column(Numeric(12,2), nullable=False)
     currency = Column(String(3), nullable=False, default="XOF")
+    idempotency_key = Column(String(64), nullable=True)  # Unicité garantie par order_keys
+    delivered_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, primary_key=True, server_default=func.now())
+
+
+class OrderKey(Base):
+    """Clés globales des commandes (unicité + partition ciblée), alimentée par trigger"""
+    __tablename__ = "order_keys"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    order_code = Column(String(20), unique=True, nullable=False)
     idempotency_key = Column(String(64), unique=True, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, nullable=False)
 
 
 class EntryFee(Base):
@@ -120,6 +142,16 @@ class Tournament(Base):
     contact_whatsapp = Column(String(32))
     ticket_code = Column(String(32))
     created_at = Column(DateTime, server_default=func.now())
+    # Colonnes générées pour la recherche (migration 009)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('french', coalesce(description, '')), 'A') || "
+        "setweight(to_tsvector('french', coalesce(reward_text, '')), 'B')",
+        persisted=True
+    )))
+    search_text = deferred(Column(Text, Computed(
+        "coalesce(description, '') || ' ' || coalesce(reward_text, '')",
+        persisted=True
+    )))
 
 
 class TournamentRegistration(Base):
@@ -130,13 +162,28 @@ class TournamentRegistration(Base):
     tournament_id = Column(UUID(as_uuid=True), ForeignKey("tournaments.id", ondelete="CASCADE"))
     user_id = Column(UUID(as_uuid=True), nullable=False)
     status = Column(String(20), nullable=False)  # registered | paid | cancelled
-    payment_id = Column(UUID(as_uuid=True), ForeignKey("payments.id", ondelete="SET NULL"), nullable=True)
+    payment_id = Column(UUID(as_uuid=True), ForeignKey("payment_keys.id", ondelete="SET NULL"), nullable=True)
+    squad_code = Column(String(32), nullable=True)  # Escouade pré-formée (gardée ensemble en salle)
     created_at = Column(DateTime, server_default=func.now())
 
 
+class TournamentRoomAssignment(Base):
+    """Place d'un inscrit: salle, équipe, rang (services.room_assignment)"""
+    __tablename__ = "tournament_room_assignments"
+    
+    registration_id = Column(UUID(as_uuid=True), ForeignKey("tournament_registrations.id", ondelete="CASCADE"), primary_key=True)
+    tournament_id = Column(UUID(as_uuid=True), ForeignKey("tournaments.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    room_no = Column(Integer, nullable=False)
+    team_no = Column(Integer, nullable=False)
+    seat = Column(SmallInteger, nullable=False)
+    assigned_at = Column(DateTime, server_default=func.now())
+
+
 class Payment(Base):
-    """Paiements (commandes et inscriptions tournois)"""
+    """Paiements (commandes et inscriptions tournois), partitionnée par mois sur created_at"""
     __tablename__ = "payments"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     type = Column(String(16), nullable=False)  # order | entry_fee
@@ -146,21 +193,226 @@ class Payment(Base):
     method = Column(String(32))
     currency = Column(String(3), nullable=False, default="XOF")
     amount = Column(Numeric(12,2), nullable=False)
-    status = Column(String(20), nullable=False)  # initiated | pending_review | confirmed | etc.
-    reference = Column(String(40), unique=True, nullable=False)
+    status = Column(String(20), nullable=False)  # Voir services.state_machine.PAYMENTS
+    version = Column(Integer, nullable=False, default=0)  # Incrémentée à chaque transition
+    reference = Column(String(40), nullable=False)  # Unicité garantie par payment_keys
     order_code = Column(String(20))
-    created_at = Column(DateTime, server_default=func.now())
+    payer_msisdn = Column(String(32))  # Numéro mobile money déclaré au checkout
+    fx_rate = Column(Numeric(18,6))  # XOF pour une unité de currency, verrouillé au checkout
+    amount_xof = Column(Numeric(12,2))  # Contre-valeur XOF au taux verrouillé
+    claimed_by = Column(UUID(as_uuid=True), nullable=True)  # Admin qui examine la preuve
+    claim_expires_at = Column(DateTime, nullable=True)
+    validated_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, primary_key=True, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
+class PaymentKey(Base):
+    """Clés globales des paiements (unicité + cible des clés étrangères), alimentée par trigger"""
+    __tablename__ = "payment_keys"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    reference = Column(String(40), unique=True, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
 class PaymentProof(Base):
     """Preuves de paiement uploadées par les utilisateurs"""
     __tablename__ = "payment_proofs"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    payment_id = Column(UUID(as_uuid=True), ForeignKey("payments.id", ondelete="CASCADE"))
+    payment_id = Column(UUID(as_uuid=True), ForeignKey("payment_keys.id", ondelete="CASCADE"))
     file_url = Column(Text, nullable=False)
     file_hash_sha256 = Column(String(64), nullable=False)
     mime = Column(String(64), nullable=False)
     size_bytes = Column(Integer, nullable=False)
+    # Versions réduites générées par le worker (job proofs.renditions)
+    renditions_status = Column(String(16), nullable=False, default="pending")  # pending | done | unsupported | failed
+    rendition_url = Column(Text, nullable=True)
+    rendition_bytes = Column(Integer, nullable=True)
+    rendition_width = Column(Integer, nullable=True)
+    rendition_height = Column(Integer, nullable=True)
+    thumbnail_url = Column(Text, nullable=True)
+    thumbnail_bytes = Column(Integer, nullable=True)
+    # Empreinte perceptuelle (dHash) et ses bandes indexées (services.proof_similarity)
+    phash = Column(BigInteger, nullable=True)
+    phash_b0 = Column(Integer, nullable=True)
+    phash_b1 = Column(Integer, nullable=True)
+    phash_b2 = Column(Integer, nullable=True)
+    phash_b3 = Column(Integer, nullable=True)
+    near_duplicate_of = Column(UUID(as_uuid=True), nullable=True)  # Preuve antérieure la plus proche
+    near_duplicate_distance = Column(SmallInteger, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class Job(Base):
+    """Tâches en arrière-plan exécutées par le worker (app.worker)"""
+    __tablename__ = "jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    queue = Column(String(32), nullable=False, default="default")
+    kind = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    status = Column(String(16), nullable=False, default="queued")  # queued | running | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, server_default=func.now())
+    locked_at = Column(DateTime, nullable=True)
+    locked_by = Column(String(64), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class Delivery(Base):
+    """Recharges à effectuer auprès du fournisseur pour les commandes payées (app.delivery_worker)"""
+    __tablename__ = "deliveries"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("order_keys.id", ondelete="CASCADE"), unique=True, nullable=False)
+    order_created_at = Column(DateTime, nullable=False)  # Clé de partition de la commande
+    order_code = Column(String(20), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    uid_freefire = Column(String(32), nullable=False)
+    sku = Column(String(60), nullable=False)
+    provider = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False, default="queued")  # queued | in_flight | delivered | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=8)
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now())
+    locked_at = Column(DateTime, nullable=True)
+    locked_by = Column(String(64), nullable=True)
+    provider_reference = Column(String(120), nullable=True)
+    last_error = Column(Text, nullable=True)
+    delivered_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class TokenRevocation(Base):
+    """Révocations de tokens JWT (par jti ou par utilisateur avant une date d'émission)"""
+    __tablename__ = "token_revocations"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    jti = Column(String(64), nullable=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    revoked_before = Column(BigInteger, nullable=True)  # epoch en ms (claim iat_ms)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class PaymentWebhookEvent(Base):
+    """Callbacks d'encaissement des opérateurs, dédoublonnés par transaction (appliqués par le worker)"""
+    __tablename__ = "payment_webhook_events"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    provider = Column(String(32), nullable=False)
+    transaction_id = Column(String(120), nullable=False)  # Unique par opérateur
+    payment_id = Column(UUID(as_uuid=True), nullable=True)
+    payment_reference = Column(String(40), nullable=True)
+    status = Column(String(16), nullable=False)  # successful | failed | pending
+    amount = Column(Numeric(12,2), nullable=True)
+    currency = Column(String(3), nullable=True)
+    msisdn = Column(String(32), nullable=True)
+    payload = Column(JSONB, nullable=False)
+    received_at = Column(DateTime, server_default=func.now())
+    attempts = Column(Integer, nullable=False, default=0)
+    processed_at = Column(DateTime, nullable=True)
+    outcome = Column(String(32), nullable=True)  # Voir services.payment_webhooks
+
+
+class TournamentMatch(Base):
+    """Matchs d'un tournoi (un par numéro et par salle)"""
+    __tablename__ = "tournament_matches"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tournament_id = Column(UUID(as_uuid=True), ForeignKey("tournaments.id", ondelete="CASCADE"), nullable=False)
+    match_no = Column(Integer, nullable=False)
+    room_no = Column(Integer, nullable=False, default=0)  # 0: sans répartition en salles
+    recorded_by = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class TournamentResult(Base):
+    """Résultat d'un joueur dans un match"""
+    __tablename__ = "tournament_results"
+    
+    match_id = Column(UUID(as_uuid=True), ForeignKey("tournament_matches.id", ondelete="CASCADE"), primary_key=True)
+    tournament_id = Column(UUID(as_uuid=True), ForeignKey("tournaments.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    placement = Column(SmallInteger, nullable=False)
+    kills = Column(SmallInteger, nullable=False, default=0)
+    points = Column(Integer, nullable=False)  # Barème du mode au moment de l'enregistrement (services.scoring)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class TournamentStanding(Base):
+    """Cumul des résultats par joueur (source du classement en mémoire)"""
+    __tablename__ = "tournament_standings"
+    
+    tournament_id = Column(UUID(as_uuid=True), ForeignKey("tournaments.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    points = Column(Integer, nullable=False, default=0)
+    kills = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    matches = Column(Integer, nullable=False, default=0)
+    best_placement = Column(SmallInteger, nullable=True)
+    revision = Column(BigInteger, nullable=False)  # Séquence tournament_standings_revision_seq
+    updated_at = Column(DateTime, server_default=func.now())
+
+
+class TournamentScoringRule(Base):
+    """Barème de points des matchs par mode de tournoi"""
+    __tablename__ = "tournament_scoring_rules"
+    
+    mode = Column(String(20), primary_key=True)
+    placement_points = Column(ARRAY(Integer), nullable=False)  # 1re place, 2e, ...; 0 au-delà
+    kill_points = Column(Integer, nullable=False, default=1)
+    kill_cap = Column(Integer, nullable=True)
+    updated_by = Column(UUID(as_uuid=True), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now())
+
+
+class EmailOutbox(Base):
+    """Emails rendus en attente d'envoi (consommés par app.mail_worker)"""
+    __tablename__ = "email_outbox"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    template = Column(String(40), nullable=False)
+    to_address = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body_text = Column(Text, nullable=False)
+    body_html = Column(Text, nullable=True)
+    status = Column(String(16), nullable=False, default="queued")  # queued, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=6)
+    next_attempt_at = Column(DateTime, server_default=func.now())
+    locked_at = Column(DateTime, nullable=True)
+    locked_by = Column(String(64), nullable=True)
+    last_error = Column(Text, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class RevenueDaily(Base):
+    """Revenu validé agrégé par jour (tenu à jour par le job analytics.revenue_rollup)"""
+    __tablename__ = "revenue_daily"
+    
+    day = Column(Date, primary_key=True)
+    country = Column(String(2), primary_key=True)
+    method = Column(String(32), primary_key=True)  # '' si inconnue
+    catalog_type = Column(String(24), primary_key=True)  # Type du catalogue, ENTRY_FEE pour les inscriptions
+    payments = Column(Integer, nullable=False)
+    revenue_xof = Column(Numeric(16,2), nullable=False)
+    refreshed_at = Column(DateTime, server_default=func.now())
+
+
+class RollupWatermark(Base):
+    """Progression des agrégats incrémentaux (NULL: reconstruction complète au prochain passage)"""
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String(40), primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -1,16 +1,23 @@
 """
 Router Admin - Endpoints d'administration
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from pydantic import BaseModel
-from typing import List, Optional
+from sqlalchemy import func, text
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from uuid import UUID
-from datetime import datetime
+from datetime import date, datetime, timedelta
+import os
 
 from app.database import get_db
-from app.dependencies.auth import require_admin
+from app.dependencies.auth import require_admin, require_admin_principal, Principal
+from app.services import delivery, http_cache, jobs, notifications, partitions, revocation, storage
+from app.services import fx_rates, payment_webhooks, proof_similarity, reconciliation, revenue_rollups, scoring, state_machine
+from app.services.payment_providers import registry as payment_providers
+from app.services.state_machine import PAYMENTS, PAYMENT_REJECTED, PAYMENT_REVIEWABLE, PAYMENT_VALIDATED
+from app.services.state_machine import TOURNAMENTS, TOURNAMENT_IN_REVIEW, TOURNAMENT_REJECTED, TOURNAMENT_VALIDATED
 from app.models import User, UserProfile, Order, Payment, PaymentProof, Tournament, CatalogItem
 
 router = APIRouter()
@@ -40,6 +47,16 @@ class UserListResponse(BaseModel):
 class UpdateUserRoleRequest(BaseModel):
     role: str
 
+class ProofPreview(BaseModel):
+    id: str
+    mime: str
+    size_bytes: int
+    renditions_status: str
+    url: str
+    url_bytes: Optional[int]
+    near_duplicate_of: Optional[str] = None
+    near_duplicate_distance: Optional[int] = None
+
 class PendingPaymentResponse(BaseModel):
     id: str
     user_email: str
@@ -47,6 +64,115 @@ class PendingPaymentResponse(BaseModel):
     payment_method: str
     created_at: str
     proof_count: int
+    proofs: List[ProofPreview] = []
+    suspected_duplicate: bool = False
+
+class UpdateFxRateRequest(BaseModel):
+    xof_per_unit: float = Field(..., gt=0)
+
+class UpdateScoringRuleRequest(BaseModel):
+    placement_points: List[int] = Field(..., min_length=1, max_length=100)
+    kill_points: int = Field(default=1, ge=0, le=100)
+    kill_cap: Optional[int] = Field(default=None, ge=0, le=100)
+
+class SimilarProofResponse(BaseModel):
+    id: str
+    payment_id: str
+    distance: int
+    created_at: str
+
+class DeliveryStatsResponse(BaseModel):
+    provider: Optional[str]
+    queued: int
+    in_flight: int
+    delivered: int
+    failed: int
+    oldest_pending_seconds: int
+
+class ReconciliationResponse(BaseModel):
+    operator: str
+    dry_run: bool
+    rows: int
+    validated: int
+    already_validated: int
+    ignored: int
+    mismatches: Dict[str, int]
+    sample: List[Dict[str, str]]
+    report_url: Optional[str]
+    duration_ms: int
+
+class ClaimedPaymentResponse(BaseModel):
+    id: str
+    user_id: str
+    amount: float
+    method: Optional[str]
+    status: str
+    version: int
+    created_at: str
+    claim_expires_at: str
+
+class RevenuePoint(BaseModel):
+    period: str
+    country: Optional[str] = None
+    method: Optional[str] = None
+    catalog_type: Optional[str] = None
+    payments: int
+    revenue_xof: int
+
+class RevenueSeriesResponse(BaseModel):
+    start: str
+    end: str
+    granularity: str
+    group_by: List[str]
+    timezone: str
+    refreshed_through: Optional[str]
+    total_payments: int
+    total_revenue_xof: int
+    points: List[RevenuePoint]
+
+# Durée du bail d'examen d'un paiement réservé par un admin
+REVIEW_LEASE_MINUTES = 10
+
+# Décision refusée si un autre admin détient un bail actif sur le paiement
+REVIEW_CLAIM_GUARD = "claimed_by IS NULL OR claimed_by = :admin_id OR claim_expires_at < now()"
+
+def decide_payment(db: Session, payment_id: UUID, target: str, version: Optional[int], admin: User) -> dict:
+    """
+    Appliquer une décision admin en une seule requête gardée (statut, version, bail)
+
+    Deux décisions concurrentes sur le même paiement: la seconde reçoit 409 au lieu
+    d'écraser la première.
+    """
+    try:
+        return PAYMENTS.transition(
+            db, payment_id, target,
+            version=version,
+            guard=REVIEW_CLAIM_GUARD,
+            values={"claimed_by": "NULL", "claim_expires_at": "NULL"},
+            params={"admin_id": admin.id}
+        )
+    except state_machine.NotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Paiement non trouvé"
+        )
+    except state_machine.InvalidTransition as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Paiement déjà traité (statut: {exc.source})"
+        )
+    except state_machine.StaleState as exc:
+        current = exc.current
+        if version is None or current["version"] == version:
+            # Statut et version inchangés: seul le bail a bloqué la décision
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Paiement en cours d'examen par un autre administrateur"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Paiement modifié par un autre administrateur (version actuelle: {current['version']})"
+        )
 
 @router.get("/stats", response_model=StatsResponse)
 def get_admin_stats(
@@ -63,12 +189,12 @@ def get_admin_stats(
     
     # Calculer le revenu total (paiements validés)
     total_revenue = db.query(func.sum(Payment.amount_xof)).filter(
-        Payment.status == "validated"
+        Payment.status == PAYMENT_VALIDATED
     ).scalar() or 0
     
     # Compter les paiements en attente
     pending_payments = db.query(func.count(Payment.id)).filter(
-        Payment.status.in_(["pending", "proof_uploaded"])
+        Payment.status.in_(PAYMENT_REVIEWABLE)
     ).scalar()
     
     # Compter les tournois actifs
@@ -86,6 +212,86 @@ def get_admin_stats(
         active_tournaments=active_tournaments
     )
 
+# Fenêtre maximale d'une série de revenu (3 ans de journées)
+REVENUE_MAX_DAYS = 1100
+
+@router.get("/analytics/revenue", response_model=RevenueSeriesResponse)
+def get_revenue_series(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    group_by: List[str] = Query(default=[]),
+    country: Optional[str] = Query(None, min_length=2, max_length=2),
+    method: Optional[str] = None,
+    catalog_type: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin_principal)
+):
+    """
+    Chiffre d'affaires validé par période (Admin uniquement)
+    
+    - **start** / **end**: Journées incluses (par défaut les 30 derniers jours)
+    - **granularity**: day, week (semaines commençant le lundi) ou month
+    - **group_by**: Ventilation répétable: country, method, catalog_type
+    - **country** / **method** / **catalog_type**: Filtres (ENTRY_FEE: inscriptions aux tournois)
+    
+    Lu dans les agrégats quotidiens (revenue_daily), à jour à la minute près
+    (voir refreshed_through); les remboursements sont retirés de leur jour de validation.
+    """
+    end = end or revenue_rollups.today()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days >= REVENUE_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Période invalide (début avant fin, {REVENUE_MAX_DAYS} jours au plus)"
+        )
+    
+    filters = {"country": country.upper() if country else None, "method": method, "catalog_type": catalog_type}
+    try:
+        rows = revenue_rollups.series(db, start, end, granularity, group_by, filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    refreshed_through = revenue_rollups.refreshed_through(db)
+    
+    points = [
+        RevenuePoint(
+            period=row["period"].isoformat(),
+            country=row.get("country"),
+            method=row.get("method"),
+            catalog_type=row.get("catalog_type"),
+            payments=row["payments"],
+            revenue_xof=int(row["revenue_xof"])
+        )
+        for row in rows
+    ]
+    return RevenueSeriesResponse(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        granularity=granularity,
+        group_by=[dimension for dimension in revenue_rollups.DIMENSIONS if dimension in group_by],
+        timezone=revenue_rollups.ANALYTICS_TIMEZONE,
+        refreshed_through=refreshed_through.isoformat() if refreshed_through else None,
+        total_payments=sum(point.payments for point in points),
+        total_revenue_xof=sum(point.revenue_xof for point in points),
+        points=points
+    )
+
+@router.post("/analytics/revenue/rebuild")
+def rebuild_revenue_rollups(
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin_principal)
+):
+    """
+    Reconstruire les agrégats de revenu au prochain passage du job (Admin uniquement)
+    
+    À utiliser après un changement de ANALYTICS_TIMEZONE ou une correction
+    manuelle de paiements hors machine à états.
+    """
+    revenue_rollups.request_rebuild(db)
+    db.commit()
+    
+    return {"message": "Reconstruction des agrégats planifiée"}
+
 @router.get("/users", response_model=List[UserListResponse])
 def list_users(
     role: Optional[str] = None,
@@ -152,6 +358,8 @@ def update_user_role(
         )
     
     user.role = request.role
+    # Les tokens existants portent l'ancien rôle dans leurs claims
+    revocation.revoke_user_tokens(db, user.id)
     db.commit()
     
     return {
@@ -160,42 +368,219 @@ def update_user_role(
         "new_role": user.role
     }
 
+def proof_variant(proof: PaymentProof, size: str):
+    """
+    Clé de stockage et poids de la version demandée d'une preuve
+
+    Retombe sur l'original tant que les versions réduites ne sont pas prêtes (ou PDF).
+    """
+    if size == "thumbnail" and proof.thumbnail_url:
+        return proof.thumbnail_url, proof.thumbnail_bytes
+    if size in ("thumbnail", "review") and proof.rendition_url:
+        return proof.rendition_url, proof.rendition_bytes
+    return proof.file_url, proof.size_bytes
+
+def proof_preview(proof: PaymentProof, size: str) -> ProofPreview:
+    key, size_bytes = proof_variant(proof, size)
+    return ProofPreview(
+        id=str(proof.id),
+        mime=proof.mime,
+        size_bytes=proof.size_bytes,
+        renditions_status=proof.renditions_status,
+        url=storage.presigned_url(key),
+        url_bytes=size_bytes,
+        near_duplicate_of=str(proof.near_duplicate_of) if proof.near_duplicate_of else None,
+        near_duplicate_distance=proof.near_duplicate_distance
+    )
+
 @router.get("/payments/pending", response_model=List[PendingPaymentResponse])
 def list_pending_payments(
+    days: Optional[int] = Query(None, ge=1, le=366),
+    proof_size: str = Query("thumbnail", pattern="^(thumbnail|review|original)$"),
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin)
 ):
     """
     Lister les paiements en attente de validation (Admin uniquement)
+    
+    - **days**: Fenêtre de recherche en jours (optionnelle: toute la file par défaut)
+    - **proof_size**: Version des preuves référencée (thumbnail par défaut, review, original)
+    
+    La file entière reste peu coûteuse: l'index partiel idx_pay_review_queue ne
+    contient que les paiements en attente, quelle que soit leur partition.
     """
-    payments = db.query(Payment).filter(
-        Payment.status.in_(["pending", "proof_uploaded"])
-    ).order_by(Payment.created_at.desc()).all()
+    query = db.query(Payment, User.email).join(User, User.id == Payment.user_id).filter(
+        Payment.status.in_(PAYMENT_REVIEWABLE)
+    )
+    if days is not None:
+        query = query.filter(Payment.created_at >= datetime.utcnow() - timedelta(days=days))
+    rows = query.order_by(Payment.created_at.desc()).all()
+    
+    # Preuves de toute la page en une seule requête
+    proofs_by_payment = {}
+    payment_ids = [payment.id for payment, _ in rows]
+    if payment_ids:
+        proofs = db.query(PaymentProof).filter(
+            PaymentProof.payment_id.in_(payment_ids)
+        ).order_by(PaymentProof.created_at).all()
+        for proof in proofs:
+            proofs_by_payment.setdefault(proof.payment_id, []).append(proof)
     
     return [
         PendingPaymentResponse(
             id=str(payment.id),
-            user_email=payment.user.email,
-            amount_xof=payment.amount_xof,
-            payment_method=payment.payment_method,
+            user_email=email,
+            amount_xof=int(payment.amount),
+            payment_method=payment.method or "",
             created_at=payment.created_at.isoformat(),
-            proof_count=len(payment.proofs)
+            proof_count=len(proofs_by_payment.get(payment.id, [])),
+            proofs=[proof_preview(proof, proof_size) for proof in proofs_by_payment.get(payment.id, [])],
+            suspected_duplicate=any(
+                proof.near_duplicate_of is not None for proof in proofs_by_payment.get(payment.id, [])
+            )
         )
-        for payment in payments
+        for payment, email in rows
     ]
 
-@router.post("/payments/{payment_id}/validate")
-def validate_payment(
+@router.get("/proofs/{proof_id}")
+def get_proof_file(
+    proof_id: UUID,
+    size: str = Query("review", pattern="^(thumbnail|review|original)$"),
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin_principal)
+):
+    """
+    Ouvrir une preuve de paiement (Admin uniquement)
+    
+    - **size**: review par défaut (rendu compressé), thumbnail ou original
+    
+    Redirige vers une URL présignée du stockage objet.
+    """
+    proof = db.query(PaymentProof).filter(PaymentProof.id == proof_id).first()
+    
+    if not proof:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Preuve non trouvée"
+        )
+    
+    key, _ = proof_variant(proof, size)
+    return RedirectResponse(storage.presigned_url(key), status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+@router.get("/proofs/{proof_id}/similar", response_model=List[SimilarProofResponse])
+def list_similar_proofs(
+    proof_id: UUID,
+    max_distance: int = Query(proof_similarity.DUPLICATE_DISTANCE, ge=0, le=proof_similarity.MAX_SEARCH_DISTANCE),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Preuves d'autres paiements visuellement proches de celle-ci (Admin uniquement)
+    
+    - **max_distance**: Distance de Hamming maximale entre empreintes (sur 64 bits)
+    - **limit**: Nombre maximum de résultats, les plus proches d'abord
+    """
+    proof = db.query(PaymentProof).filter(PaymentProof.id == proof_id).first()
+    
+    if not proof:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Preuve non trouvée"
+        )
+    
+    if proof.phash is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Empreinte de la preuve pas encore calculée"
+        )
+    
+    matches = proof_similarity.find_similar(
+        db, proof.phash & ((1 << 64) - 1), max_distance,
+        exclude_proof_id=proof.id, exclude_payment_id=proof.payment_id, limit=limit
+    )
+    return [
+        SimilarProofResponse(
+            id=str(match["id"]),
+            payment_id=str(match["payment_id"]),
+            distance=match["distance"],
+            created_at=match["created_at"].isoformat()
+        )
+        for match in matches
+    ]
+
+@router.post("/review/claim", response_model=List[ClaimedPaymentResponse])
+def claim_review_batch(
+    limit: int = Query(5, ge=1, le=50),
+    days: Optional[int] = Query(None, ge=1, le=366),
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Réserver les prochains paiements à examiner (Admin uniquement)
+    
+    - **limit**: Nombre de preuves à réserver
+    - **days**: Fenêtre de recherche en jours (optionnelle: toute la file par défaut)
+    
+    Chaque paiement est réservé pour REVIEW_LEASE_MINUTES minutes; deux admins ne
+    reçoivent jamais le même paiement (FOR UPDATE SKIP LOCKED). Un nouvel appel
+    prolonge les baux déjà détenus par l'admin.
+    """
+    window = "AND created_at >= now() - make_interval(days => :days)" if days is not None else ""
+    rows = db.execute(
+        text(f"""
+            UPDATE payments p SET
+                claimed_by = :admin_id,
+                claim_expires_at = now() + make_interval(mins => :lease)
+            FROM (
+                SELECT id, created_at FROM payments
+                WHERE status = ANY(:reviewable)
+                  {window}
+                  AND (claimed_by IS NULL OR claim_expires_at < now() OR claimed_by = :admin_id)
+                ORDER BY created_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            ) c
+            WHERE p.id = c.id AND p.created_at = c.created_at
+            RETURNING p.id, p.user_id, p.amount, p.method, p.status, p.version, p.created_at, p.claim_expires_at
+        """),
+        {
+            "admin_id": admin.id, "lease": REVIEW_LEASE_MINUTES, "days": days, "limit": limit,
+            "reviewable": list(PAYMENT_REVIEWABLE)
+        }
+    ).mappings().all()
+    
+    for row in rows:
+        notifications.notify_review(db, "claimed", row["id"], admin.id)
+    
+    db.commit()
+    
+    return [
+        ClaimedPaymentResponse(
+            id=str(row["id"]),
+            user_id=str(row["user_id"]),
+            amount=float(row["amount"]),
+            method=row["method"],
+            status=row["status"],
+            version=row["version"],
+            created_at=row["created_at"].isoformat(),
+            claim_expires_at=row["claim_expires_at"].isoformat()
+        )
+        for row in rows
+    ]
+
+@router.post("/review/{payment_id}/release")
+def release_review_claim(
     payment_id: UUID,
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin)
 ):
     """
-    Valider un paiement (Admin uniquement)
+    Libérer un paiement réservé sans décision (Admin uniquement)
     
-    - **payment_id**: ID du paiement à valider
+    - **payment_id**: ID du paiement à remettre dans la file
     """
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = partitions.find_payment(db, payment_id)
     
     if not payment:
         raise HTTPException(
@@ -203,44 +588,68 @@ def validate_payment(
             detail="Paiement non trouvé"
         )
     
-    if payment.status == "validated":
+    if payment.claimed_by != admin.id:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Paiement déjà validé"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ce paiement n'est pas réservé par vous"
         )
     
-    # Valider le paiement
-    payment.status = "validated"
-    payment.validated_at = datetime.utcnow()
-    
-    # Si c'est un paiement de commande, mettre à jour le statut
-    if payment.order_id:
-        order = db.query(Order).filter(Order.id == payment.order_id).first()
-        if order:
-            order.status = "paid"
-    
-    # Si c'est un paiement de tournoi, mettre à jour l'inscription
-    if payment.tournament_id:
-        from app.models import TournamentRegistration
-        registration = db.query(TournamentRegistration).filter(
-            TournamentRegistration.tournament_id == payment.tournament_id,
-            TournamentRegistration.user_id == payment.user_id
-        ).first()
-        if registration:
-            registration.status = "paid"
+    payment.claimed_by = None
+    payment.claim_expires_at = None
+    notifications.notify_review(db, "released", payment.id, admin.id)
+    
+    db.commit()
+    
+    return {"message": "Paiement remis dans la file", "payment_id": str(payment.id)}
+
+@router.get("/review/events")
+async def stream_review_events(
+    request: Request,
+    admin: Principal = Depends(require_admin_principal)
+):
+    """
+    Flux Server-Sent Events de la file de revue (Admin uniquement)
+    
+    Réservations, libérations, validations, rejets et nouvelles preuves en temps réel.
+    """
+    return notifications.sse_response(
+        request, notifications.REVIEW_EVENTS_CHANNEL, "admins", event_field="action"
+    )
+
+@router.post("/payments/{payment_id}/validate")
+def validate_payment(
+    payment_id: UUID,
+    version: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Valider un paiement (Admin uniquement)
+    
+    - **payment_id**: ID du paiement à valider
+    - **version**: Version du paiement affichée à l'admin (409 si elle a changé)
+    """
+    payment = decide_payment(db, payment_id, PAYMENT_VALIDATED, version, admin)
+    
+    # Mise à jour de la commande / inscription tournoi déléguée au worker
+    jobs.enqueue(db, "payments.validated", {"payment_id": str(payment["id"])})
+    notifications.notify_payment_status(db, payment["user_id"], "payment", payment["id"], payment["status"])
+    notifications.notify_review(db, "validated", payment["id"], admin.id)
     
     db.commit()
     
     return {
         "message": "Paiement validé avec succès",
-        "payment_id": str(payment.id),
-        "validated_at": payment.validated_at.isoformat()
+        "payment_id": str(payment["id"]),
+        "version": payment["version"],
+        "validated_at": payment["validated_at"].isoformat()
     }
 
 @router.post("/payments/{payment_id}/reject")
 def reject_payment(
     payment_id: UUID,
     reason: Optional[str] = None,
+    version: Optional[int] = Query(None, ge=0),
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin)
 ):
@@ -249,21 +658,319 @@ def reject_payment(
     
     - **payment_id**: ID du paiement à rejeter
     - **reason**: Raison du rejet (optionnel)
+    - **version**: Version du paiement affichée à l'admin (409 si elle a changé)
     """
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = decide_payment(db, payment_id, PAYMENT_REJECTED, version, admin)
     
-    if not payment:
+    notifications.notify_payment_status(db, payment["user_id"], "payment", payment["id"], payment["status"])
+    notifications.notify_review(db, "rejected", payment["id"], admin.id)
+    
+    db.commit()
+    
+    return {
+        "message": "Paiement rejeté",
+        "payment_id": str(payment["id"]),
+        "version": payment["version"],
+        "reason": reason
+    }
+
+@router.post("/payments/reconcile/{operator}", response_model=ReconciliationResponse)
+def reconcile_operator_statement(
+    operator: str,
+    file: UploadFile = File(...),
+    days: int = Query(7, ge=1, le=90),
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Rapprocher un relevé CSV opérateur avec les paiements (Admin uniquement)
+    
+    - **operator**: mtn_momo ou moov_money (méthode de paiement rapprochée)
+    - **file**: Relevé CSV exporté par l'opérateur
+    - **days**: Fenêtre des paiements rapprochés en jours
+    - **dry_run**: Classer les lignes sans valider aucun paiement
+    
+    Les paiements dont la référence, le montant et le numéro correspondent sont
+    validés; les écarts sont listés dans un rapport CSV téléchargeable.
+    """
+    if operator not in reconciliation.STATEMENT_FORMATS:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Paiement non trouvé"
+            detail=f"Opérateur non supporté: {operator}"
+        )
+    
+    try:
+        summary = reconciliation.reconcile_statement(db, file.file, operator, days=days, dry_run=dry_run)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    
+    report_key = summary.pop("report_key")
+    print(f"🧾 Relevé {operator} rapproché par {admin.email}: {summary['validated']} validés, {summary['mismatches']}")
+    return ReconciliationResponse(
+        **summary,
+        report_url=storage.presigned_url(report_key) if report_key else None
+    )
+
+@router.get("/payment-providers")
+def get_payment_providers(admin: User = Depends(require_admin)):
+    """
+    État des opérateurs de paiement de ce worker (Admin uniquement)
+    
+    Disjoncteur et latence des appels par opération (histogramme, quantiles
+    approchés). Les compteurs sont propres au processus qui répond.
+    """
+    return {"worker_pid": os.getpid(), "providers": payment_providers.stats()}
+
+@router.get("/payment-webhooks")
+def get_payment_webhooks(
+    hours: int = Query(24, ge=1, le=24 * 30),
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Callbacks opérateurs reçus sur la période, par opérateur et par issue (Admin uniquement)
+    
+    - **hours**: Fenêtre en heures (défaut 24)
+    
+    unprocessed: callbacks pas encore appliqués par le worker. buffer: commit groupé du
+    worker qui répond.
+    """
+    rows = db.execute(
+        text("""
+            SELECT provider, COALESCE(outcome, 'unprocessed') AS outcome, count(*) AS count,
+                   max(received_at) AS last_received_at
+            FROM payment_webhook_events
+            WHERE received_at >= now() - make_interval(hours => :hours)
+            GROUP BY provider, outcome
+            ORDER BY provider, outcome
+        """),
+        {"hours": hours}
+    ).mappings().all()
+    
+    providers: Dict[str, dict] = {}
+    for row in rows:
+        entry = providers.setdefault(row["provider"], {"outcomes": {}, "last_received_at": None})
+        entry["outcomes"][row["outcome"]] = row["count"]
+        if entry["last_received_at"] is None or row["last_received_at"] > entry["last_received_at"]:
+            entry["last_received_at"] = row["last_received_at"]
+    
+    return {
+        "hours": hours,
+        "providers": providers,
+        "worker_pid": os.getpid(),
+        "buffer": payment_webhooks.buffer.stats(),
+    }
+
+@router.put("/fx-rates/{currency}")
+def update_fx_rate(
+    currency: str,
+    request: UpdateFxRateRequest,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Créer ou modifier un taux de change (Admin uniquement)
+    
+    - **currency**: Code ISO de la devise (ex: EUR, USD)
+    - **xof_per_unit**: Nombre de XOF pour une unité de la devise
+    
+    Les prix affichés changent immédiatement; les paiements déjà initiés gardent
+    le taux verrouillé à leur checkout.
+    """
+    currency = currency.upper()
+    if len(currency) != 3 or not currency.isalpha() or currency == fx_rates.BASE_CURRENCY:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Devise invalide: {currency}"
+        )
+    
+    db.execute(
+        text("""
+            INSERT INTO fx_rates (currency, xof_per_unit, updated_at)
+            VALUES (:currency, :rate, now())
+            ON CONFLICT (currency) DO UPDATE SET xof_per_unit = EXCLUDED.xof_per_unit, updated_at = now()
+        """),
+        {"currency": currency, "rate": request.xof_per_unit}
+    )
+    # Nouveau snapshot dans chaque worker, prix du catalogue rafraîchis
+    http_cache.invalidate(db, "fx", "catalog")
+    db.commit()
+    
+    return {"message": "Taux de change mis à jour", "currency": currency, "xof_per_unit": request.xof_per_unit}
+
+@router.get("/scoring-rules")
+def get_scoring_rules(admin: User = Depends(require_admin)):
+    """
+    Barèmes de points des matchs par mode de tournoi (Admin uniquement)
+    """
+    return {mode: rule._asdict() for mode, rule in sorted(scoring.rules().items())}
+
+@router.put("/scoring-rules/{mode}")
+def update_scoring_rule(
+    mode: str,
+    request: UpdateScoringRuleRequest,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Modifier le barème d'un mode (Admin uniquement)
+    
+    - **placement_points**: Points de la 1re place, de la 2e, ... (0 au-delà)
+    - **kill_points**: Points par kill
+    - **kill_cap**: Kills comptés au plus par match (vide: sans plafond)
+    
+    S'applique aux résultats enregistrés ensuite; les résultats existants gardent
+    leurs points.
+    """
+    if mode not in scoring.DEFAULT_RULES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Mode inconnu: {mode}"
+        )
+    
+    if any(points < 0 or points > 1000 for points in request.placement_points):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Points par place entre 0 et 1000"
+        )
+    
+    db.execute(
+        text("""
+            INSERT INTO tournament_scoring_rules (mode, placement_points, kill_points, kill_cap, updated_by, updated_at)
+            VALUES (:mode, :placement_points, :kill_points, :kill_cap, :admin_id, now())
+            ON CONFLICT (mode) DO UPDATE SET
+                placement_points = EXCLUDED.placement_points,
+                kill_points = EXCLUDED.kill_points,
+                kill_cap = EXCLUDED.kill_cap,
+                updated_by = EXCLUDED.updated_by,
+                updated_at = now()
+        """),
+        {
+            "mode": mode,
+            "placement_points": request.placement_points,
+            "kill_points": request.kill_points,
+            "kill_cap": request.kill_cap,
+            "admin_id": admin.id,
+        }
+    )
+    # Nouveau barème dans chaque worker
+    http_cache.invalidate(db, "scoring")
+    db.commit()
+    
+    return {"message": "Barème mis à jour", "mode": mode, **request.model_dump()}
+
+def decide_tournament(db: Session, tournament_id: UUID, target: str) -> dict:
+    """
+    Valider ou rejeter un tournoi en examen, en une requête gardée par son statut
+
+    Deux décisions concurrentes: la seconde reçoit 400 au lieu d'écraser la première.
+    """
+    try:
+        return TOURNAMENTS.transition(db, tournament_id, target, source=TOURNAMENT_IN_REVIEW)
+    except state_machine.NotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tournoi non trouvé"
+        )
+    except state_machine.InvalidTransition as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tournoi déjà traité (statut: {exc.source})"
         )
+
+@router.post("/tournaments/{tournament_id}/validate")
+def validate_tournament(
+    tournament_id: UUID,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Valider un tournoi en examen (Admin uniquement)
     
-    payment.status = "rejected"
+    - **tournament_id**: ID du tournoi à valider
+    """
+    tournament = decide_tournament(db, tournament_id, TOURNAMENT_VALIDATED)
     
+    http_cache.invalidate(db, "tournaments", f"tournament:{tournament['id']}")
     db.commit()
     
     return {
-        "message": "Paiement rejeté",
-        "payment_id": str(payment.id),
+        "message": "Tournoi validé",
+        "tournament_id": str(tournament["id"])
+    }
+
+@router.post("/tournaments/{tournament_id}/reject")
+def reject_tournament(
+    tournament_id: UUID,
+    reason: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_admin)
+):
+    """
+    Rejeter un tournoi en examen (Admin uniquement)
+    
+    - **tournament_id**: ID du tournoi à rejeter
+    - **reason**: Raison du rejet (optionnel)
+    """
+    tournament = decide_tournament(db, tournament_id, TOURNAMENT_REJECTED)
+    
+    http_cache.invalidate(db, "tournaments", f"tournament:{tournament['id']}")
+    db.commit()
+    
+    return {
+        "message": "Tournoi rejeté",
+        "tournament_id": str(tournament["id"]),
         "reason": reason
     }
+
+@router.get("/deliveries/stats", response_model=DeliveryStatsResponse)
+def get_delivery_stats(
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin_principal)
+):
+    """
+    État de la file de livraison automatique (Admin uniquement)
+    """
+    return DeliveryStatsResponse(provider=delivery.configured_provider(), **delivery.stats(db))
+
+@router.post("/deliveries/enqueue")
+def enqueue_paid_orders(
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin_principal)
+):
+    """
+    Mettre en file de livraison les commandes payées qui n'y sont pas encore (Admin uniquement)
+    
+    - **days**: Fenêtre de recherche en jours
+    """
+    if delivery.configured_provider() is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucun fournisseur de recharge configuré"
+        )
+    
+    count = delivery.enqueue_paid_orders(db, days)
+    db.commit()
+    
+    return {"message": "Commandes mises en file de livraison", "enqueued": count}
+
+@router.post("/deliveries/retry")
+def retry_failed_deliveries(
+    delivery_id: Optional[UUID] = None,
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin_principal)
+):
+    """
+    Relancer les livraisons échouées (Admin uniquement)
+    
+    - **delivery_id**: Une livraison précise (toutes les livraisons échouées si absent)
+    """
+    count = delivery.requeue_failed(db, delivery_id)
+    db.commit()
+    
+    return {"message": "Livraisons remises en file", "requeued": count}
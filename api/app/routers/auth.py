@@ -2,13 +2,14 @@
 Router Auth - Endpoints d'authentification et gestion utilisateur
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 
 from app.database import get_db
-from app.dependencies.auth import create_access_token, get_current_user
-from app.services import auth_service
+from app.dependencies.auth import create_access_token, decode_token, get_current_user, security
+from app.services import auth_service, jobs, revocation
 from app.models import User, UserProfile
 
 router = APIRouter()
@@ -229,7 +230,9 @@ def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db
     
     Un email sera envoyé avec un lien de réinitialisation
     """
-    token = auth_service.create_password_reset_token(db, request.email)
+    # Token et envoi de l'email traités par le worker (temps de réponse constant)
+    jobs.enqueue(db, "auth.password_reset", {"email": request.email})
+    db.commit()
     
     # Toujours retourner succès pour éviter l'énumération d'emails
     return {"message": "Si cet email existe, un lien de réinitialisation a été envoyé"}
@@ -261,10 +264,17 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
     return {"message": "Mot de passe réinitialisé avec succès"}
 
 @router.post("/logout")
-def logout(current_user: User = Depends(get_current_user)):
+def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
     """
-    Se déconnecter (côté client, supprimer le token)
+    Se déconnecter en révoquant le token courant
     
-    Note: Avec JWT, la déconnexion est gérée côté client en supprimant le token
+    Le token est ajouté à la liste de révocation partagée par tous les workers
     """
+    payload = decode_token(credentials.credentials)
+    revocation.revoke_token(db, payload)
+    db.commit()
+    
     return {"message": "Déconnexion réussie"}
@@ -1,15 +1,20 @@
 """
 Router Catalog - Endpoints pour le catalogue de produits
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import Numeric, cast, func
+from sqlalchemy.dialects.postgresql import ARRAY, array
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from uuid import UUID
+from decimal import Decimal
+import json
 
 from app.database import get_db
 from app.dependencies.auth import require_admin, get_optional_user
 from app.models import CatalogItem, User
+from app.services import fx_rates, http_cache, reference_cache
 
 router = APIRouter()
 
@@ -26,6 +31,8 @@ class CatalogItemResponse(BaseModel):
     image_url: Optional[str]
     active: bool
     created_at: str
+    display_amount: Optional[float] = None
+    display_currency: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -62,10 +69,144 @@ class UpdateCatalogItemRequest(BaseModel):
     image_url: Optional[str] = None
     active: Optional[bool] = None
 
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class CatalogFacets(BaseModel):
+    type: List[FacetCount]
+    price: List[FacetCount]
+
+class CatalogSearchResponse(BaseModel):
+    total: int
+    items: List[CatalogItemResponse]
+    facets: CatalogFacets
+    fx_version: str
+
+# Bornes des tranches de prix (XOF) pour la facette "price"
+PRICE_BUCKET_BOUNDS = [1000, 2500, 5000, 10000]
+
+SORT_OPTIONS = {
+    "price_asc": (CatalogItem.price_amount.asc(),),
+    "price_desc": (CatalogItem.price_amount.desc(),),
+    "newest": (CatalogItem.created_at.desc(),),
+    "title": (CatalogItem.title.asc(),),
+}
+
+def parse_attribute_filters(attr: List[str]) -> dict:
+    """
+    Convertir les filtres "cle:valeur" en document JSON pour l'opérateur @>
+    
+    La valeur est interprétée en JSON si possible (nombres, booléens), sinon en texte.
+    """
+    document = {}
+    for raw in attr:
+        key, sep, value = raw.partition(":")
+        if not sep or not key:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Filtre d'attribut invalide: {raw} (format attendu cle:valeur)"
+            )
+        try:
+            document[key] = json.loads(value)
+        except ValueError:
+            document[key] = value
+    return document
+
+def apply_catalog_filters(
+    query,
+    type: Optional[str],
+    active: Optional[bool],
+    attr: List[str],
+    has: List[str],
+    price_min: Optional[float],
+    price_max: Optional[float]
+):
+    """
+    Filtres communs à la liste et à la recherche du catalogue (index GIN sur attributes)
+    """
+    if type:
+        query = query.filter(CatalogItem.type == type)
+    
+    if active is not None:
+        query = query.filter(CatalogItem.active == active)
+    
+    if attr:
+        query = query.filter(CatalogItem.attributes.contains(parse_attribute_filters(attr)))
+    
+    for key in has:
+        query = query.filter(CatalogItem.attributes.has_key(key))
+    
+    if price_min is not None:
+        query = query.filter(CatalogItem.price_amount >= price_min)
+    
+    if price_max is not None:
+        query = query.filter(CatalogItem.price_amount <= price_max)
+    
+    return query
+
+def price_bucket_label(bucket: int) -> str:
+    """
+    Libellé d'une tranche de prix issue de width_bucket (0 = sous la première borne)
+    """
+    if bucket == 0:
+        return f"<{PRICE_BUCKET_BOUNDS[0]}"
+    if bucket >= len(PRICE_BUCKET_BOUNDS):
+        return f">={PRICE_BUCKET_BOUNDS[-1]}"
+    return f"{PRICE_BUCKET_BOUNDS[bucket - 1]}-{PRICE_BUCKET_BOUNDS[bucket]}"
+
+def catalog_item_response(
+    item: CatalogItem,
+    display_amount: Optional[Decimal] = None,
+    display_currency: Optional[str] = None
+) -> CatalogItemResponse:
+    return CatalogItemResponse(
+        id=str(item.id),
+        type=item.type,
+        title=item.title,
+        sku=item.sku,
+        price_amount=float(item.price_amount),
+        price_currency=item.price_currency,
+        attributes=item.attributes,
+        image_url=item.image_url,
+        active=item.active,
+        created_at=item.created_at.isoformat(),
+        display_amount=float(display_amount) if display_amount is not None else None,
+        display_currency=display_currency
+    )
+
+def catalog_responses(
+    items: List[CatalogItem],
+    currency: str,
+    rates: Optional[fx_rates.RateSnapshot] = None
+) -> List[CatalogItemResponse]:
+    """
+    Réponses du catalogue avec les prix convertis dans `currency`
+
+    Toute la liste est convertie en une passe sur le snapshot de taux en mémoire
+    (aucune requête par produit).
+    """
+    try:
+        prices = fx_rates.convert_prices(
+            ((item.price_amount, item.price_currency) for item in items), currency, rates
+        )
+    except fx_rates.UnknownCurrency:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Devise non supportée: {currency}"
+        )
+    return [catalog_item_response(item, price, currency) for item, price in zip(items, prices)]
+
 @router.get("/catalog", response_model=List[CatalogItemResponse])
 def list_catalog_items(
     type: Optional[str] = None,
     active: Optional[bool] = None,
+    attr: List[str] = Query([]),
+    has: List[str] = Query([]),
+    price_min: Optional[float] = Query(None, ge=0),
+    price_max: Optional[float] = Query(None, ge=0),
+    sort: str = Query("price_asc", pattern="^(price_asc|price_desc|newest|title)$"),
+    currency: str = Query(fx_rates.BASE_CURRENCY, pattern="^[A-Z]{3}$"),
     db: Session = Depends(get_db)
 ):
     """
@@ -73,45 +214,96 @@ def list_catalog_items(
     
     - **type**: Filtrer par type (DIAMONDS, SUBSCRIPTION, PASS, SPECIAL)
     - **active**: Filtrer par disponibilité
+    - **attr**: Filtre attribut exact, répétable (ex: diamonds:1000, days:30)
+    - **has**: Présence d'un attribut, répétable (ex: bonus)
+    - **price_min** / **price_max**: Fourchette de prix
+    - **sort**: price_asc, price_desc, newest, title
+    - **currency**: Devise d'affichage des prix (display_amount), XOF par défaut
     
     Endpoint public, pas d'authentification requise
     """
-    query = db.query(CatalogItem)
+    unfiltered = type is None and active is None and not attr and not has \
+        and price_min is None and price_max is None
+    if unfiltered and sort == "price_asc":
+        # Liste par défaut servie depuis le cache de référence (préchargé au démarrage)
+        items = reference_cache.catalog_items()
+    else:
+        query = apply_catalog_filters(
+            db.query(CatalogItem), type, active, attr, has, price_min, price_max
+        )
+        items = query.order_by(*SORT_OPTIONS[sort]).all()
     
-    if type:
-        query = query.filter(CatalogItem.type == type)
+    return catalog_responses(items, currency)
+
+
+@router.get("/catalog/search", response_model=CatalogSearchResponse)
+def search_catalog_items(
+    type: Optional[str] = None,
+    active: Optional[bool] = True,
+    attr: List[str] = Query([]),
+    has: List[str] = Query([]),
+    price_min: Optional[float] = Query(None, ge=0),
+    price_max: Optional[float] = Query(None, ge=0),
+    sort: str = Query("price_asc", pattern="^(price_asc|price_desc|newest|title)$"),
+    currency: str = Query(fx_rates.BASE_CURRENCY, pattern="^[A-Z]{3}$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Rechercher dans le catalogue avec les comptes par facette
     
-    if active is not None:
-        query = query.filter(CatalogItem.active == active)
+    Mêmes filtres que la liste. Les comptes par type et par tranche de prix
+    sont calculés dans la même requête (fonctions de fenêtrage). Les filtres et
+    tranches de prix restent en devise de base, seuls les prix affichés sont convertis.
     
-    items = query.order_by(CatalogItem.price_amount).all()
-    
-    return [
-        CatalogItemResponse(
-            id=str(item.id),
-            type=item.type,
-            title=item.title,
-            sku=item.sku,
-            price_amount=float(item.price_amount),
-            price_currency=item.price_currency,
-            attributes=item.attributes,
-            image_url=item.image_url,
-            active=item.active,
-            created_at=item.created_at.isoformat()
-        )
-        for item in items
-    ]
+    Endpoint public, pas d'authentification requise
+    """
+    bucket = func.width_bucket(
+        CatalogItem.price_amount, cast(array(PRICE_BUCKET_BOUNDS), ARRAY(Numeric))
+    )
+    query = apply_catalog_filters(
+        db.query(
+            CatalogItem,
+            bucket.label("price_bucket"),
+            func.count().over(partition_by=CatalogItem.type).label("type_count"),
+            func.count().over(partition_by=bucket).label("price_count"),
+        ),
+        type, active, attr, has, price_min, price_max
+    )
+    
+    rows = query.order_by(*SORT_OPTIONS[sort]).all()
+    
+    type_counts = {}
+    price_counts = {}
+    for item, price_bucket, type_count, price_count in rows:
+        type_counts[item.type] = type_count
+        price_counts[price_bucket] = price_count
+    
+    rates = fx_rates.snapshot()
+    return CatalogSearchResponse(
+        total=len(rows),
+        items=catalog_responses([item for item, _, _, _ in rows], currency, rates),
+        facets=CatalogFacets(
+            type=[FacetCount(value=t, count=c) for t, c in sorted(type_counts.items())],
+            price=[
+                FacetCount(value=price_bucket_label(b), count=c)
+                for b, c in sorted(price_counts.items())
+            ]
+        ),
+        fx_version=rates.version
+    )
 
 
 @router.get("/catalog/{item_id}", response_model=CatalogItemResponse)
 def get_catalog_item(
     item_id: UUID,
+    currency: str = Query(fx_rates.BASE_CURRENCY, pattern="^[A-Z]{3}$"),
     db: Session = Depends(get_db)
 ):
     """
     Récupérer les détails d'un produit
     
     - **item_id**: ID du produit
+    - **currency**: Devise d'affichage du prix (display_amount), XOF par défaut
     
     Endpoint public, pas d'authentification requise
     """
@@ -123,18 +315,7 @@ def get_catalog_item(
             detail="Produit non trouvé"
         )
     
-    return CatalogItemResponse(
-        id=str(item.id),
-        type=item.type,
-        title=item.title,
-        sku=item.sku,
-        price_amount=float(item.price_amount),
-        price_currency=item.price_currency,
-        attributes=item.attributes,
-        image_url=item.image_url,
-        active=item.active,
-        created_at=item.created_at.isoformat()
-    )
+    return catalog_responses([item], currency)[0]
 
 @router.post("/admin/catalog", response_model=CatalogItemResponse, status_code=status.HTTP_201_CREATED)
 def create_catalog_item(
@@ -165,6 +346,7 @@ def create_catalog_item(
     )
     
     db.add(item)
+    http_cache.invalidate(db, "catalog")
     db.commit()
     db.refresh(item)
     
@@ -212,6 +394,7 @@ def update_catalog_item(
     if request.active is not None:
         item.active = request.active
     
+    http_cache.invalidate(db, "catalog", f"catalog:{item.id}")
     db.commit()
     db.refresh(item)
     
@@ -246,6 +429,7 @@ def delete_catalog_item(
         )
     
     db.delete(item)
+    http_cache.invalidate(db, "catalog", f"catalog:{item.id}")
     db.commit()
     
     return None
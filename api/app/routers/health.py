@@ -2,11 +2,24 @@
 Router Health - Endpoints de santé et monitoring
 """
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
+from typing import Optional
 from app.schemas import HealthResponse
+from app.services import auth_service, lifecycle
 
 router = APIRouter()
 
+class ReadinessResponse(BaseModel):
+    status: str
+    warmed_up: bool
+    database: bool
+    database_error: Optional[str]
+    bcrypt_cost_ms: Optional[float]
+    uptime_seconds: int
+
 @router.get("/health", response_model=HealthResponse)
 def health_check():
     """
@@ -17,3 +30,38 @@ def health_check():
         timestamp=datetime.now(),
         version="2.4.0"
     )
+
+@router.get("/health/live")
+async def liveness():
+    """
+    Liveness - Le processus répond (aucune dépendance vérifiée)
+    
+    Ne jamais ajouter d'accès base ici: un Postgres indisponible ne doit pas
+    faire redémarrer tous les pods.
+    """
+    return {"status": "ok"}
+
+@router.get("/health/ready", response_model=ReadinessResponse)
+async def readiness():
+    """
+    Readiness - Le worker est préchauffé et la base répond
+    
+    Retourne 503 tant que le warmup n'est pas terminé, pendant l'arrêt, ou si la
+    sonde base de données (mise en cache quelques secondes) échoue.
+    """
+    state = lifecycle.state
+    if lifecycle.is_fresh_probe():
+        database = state.probe_ok
+    else:
+        database = await run_in_threadpool(lifecycle.probe_database)
+    ready = state.warmed_up and not state.shutting_down and database
+    
+    body = ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        warmed_up=state.warmed_up,
+        database=database,
+        database_error=state.probe_error,
+        bcrypt_cost_ms=round(auth_service.bcrypt_cost_seconds * 1000, 1) if auth_service.bcrypt_cost_seconds else None,
+        uptime_seconds=int(datetime.now().timestamp() - state.started_at)
+    )
+    return JSONResponse(status_code=200 if ready else 503, content=body.model_dump())
@@ -9,8 +9,10 @@ from uuid import UUID
 from datetime import datetime
 
 from app.database import get_db
-from app.dependencies.auth import get_current_user, require_admin
+from app.dependencies.auth import get_current_user, get_current_principal, require_admin, Principal
 from app.models import Order, User, CatalogItem
+from app.services import delivery, notifications, partitions, state_machine
+from app.services.state_machine import ORDERS, ORDER_DELIVERED, ORDER_PAID, ORDER_PENDING
 
 router = APIRouter()
 
@@ -103,7 +105,7 @@ def create_order(
         catalog_item_id=catalog_item.id,
         price_xof=catalog_item.price_xof,
         uid_freefire=request.uid_freefire,
-        status="pending",
+        status=ORDER_PENDING,
         idempotency_key=request.idempotency_key
     )
     
@@ -128,7 +130,7 @@ def create_order(
 def get_my_orders(
     status: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Récupérer mes commandes
@@ -162,14 +164,14 @@ def get_my_orders(
 def get_order(
     order_code: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Récupérer les détails d'une commande
     
     - **order_code**: Code de la commande
     """
-    order = db.query(Order).filter(Order.order_code == order_code).first()
+    order = partitions.find_order_by_code(db, order_code)
     
     if not order:
         raise HTTPException(
@@ -208,7 +210,7 @@ def deliver_order(
     
     - **order_code**: Code de la commande
     """
-    order = db.query(Order).filter(Order.order_code == order_code).first()
+    order = partitions.find_order_by_code(db, order_code)
     
     if not order:
         raise HTTPException(
@@ -216,14 +218,34 @@ def deliver_order(
             detail="Commande non trouvée"
         )
     
-    if order.status == "delivered":
+    if order.status == ORDER_DELIVERED:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Commande déjà livrée"
         )
     
-    order.status = "delivered"
-    order.delivered_at = datetime.utcnow()
+    if not ORDERS.can(order.status, ORDER_DELIVERED):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Commande non livrable (statut: {order.status})"
+        )
+    
+    # Retirer la commande de la file automatique pour éviter une double recharge
+    if not delivery.mark_manually_delivered(db, order.id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Recharge automatique en cours ou déjà effectuée pour cette commande"
+        )
+    
+    try:
+        ORDERS.transition(db, order.id, ORDER_DELIVERED, version=order.version, source=ORDER_PAID)
+    except (state_machine.InvalidTransition, state_machine.StaleState):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Commande modifiée entre-temps, veuillez réessayer"
+        )
+    notifications.notify_payment_status(db, order.user_id, "order", order.id, ORDER_DELIVERED)
     
     db.commit()
     db.refresh(order)
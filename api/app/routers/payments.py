@@ -1,33 +1,39 @@
 """
 Router Payments - Endpoints pour la gestion des paiements
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from uuid import UUID
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import hashlib
+import json
+import uuid
 
 from app.database import get_db
-from app.dependencies.auth import get_current_user, require_admin
+from app.dependencies.auth import get_current_user, get_current_principal, require_admin, Principal
 from app.models import Payment, PaymentProof, User
+from app.services import fx_rates, jobs, notifications, partitions, payment_targets, payment_webhooks, state_machine, storage
+from app.services.payment_providers import CircuitOpen, CollectionRequest, CollectionStatus, ProviderError, registry
+from app.services.state_machine import PAYMENTS, PAYMENT_PENDING, PAYMENT_PROOF_UPLOADED, PAYMENT_VALIDATED
 
 router = APIRouter()
 
-# Configuration des méthodes de paiement par pays
-PAYMENT_METHODS_BY_COUNTRY = {
-    "BJ": ["mtn_momo", "moov_money"],
-    "CI": ["mtn_momo", "moov_money"],
-    "TG": ["mtn_momo", "moov_money"],
-    "BF": ["mtn_momo", "moov_money"],
-    "ML": ["mtn_momo", "moov_money"],
-    "NE": ["mtn_momo", "moov_money"],
-    "SN": ["mtn_momo", "moov_money"],
-    "GW": ["mtn_momo"],
-    "NG": ["mtn_momo"],
-    "FR": ["remitly", "worldremit", "western_union", "ria", "moneygram", "taptap_send"]
+# Extension des fichiers de preuve stockés, par type MIME accepté
+PROOF_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "application/pdf": ".pdf",
 }
 
+# Taille maximale d'un callback opérateur (quelques centaines d'octets en pratique)
+WEBHOOK_MAX_BYTES = 64 * 1024
+
 # Schémas Pydantic
 
 class PaymentMethodsResponse(BaseModel):
@@ -42,6 +48,7 @@ class CreatePaymentRequest(BaseModel):
     country_code: str = Field(..., pattern="^(BJ|CI|TG|BF|ML|NE|SN|GW|NG|FR)$")
     phone_number: Optional[str] = None
     reference: Optional[str] = None
+    currency: str = Field(default=fx_rates.BASE_CURRENCY, pattern="^[A-Z]{3}$")
     
     class Config:
         json_schema_extra = {
@@ -51,7 +58,8 @@ class CreatePaymentRequest(BaseModel):
                 "payment_method": "mtn_momo",
                 "country_code": "BJ",
                 "phone_number": "+22912345678",
-                "reference": "MP201224001234"
+                "reference": "MP201224001234",
+                "currency": "XOF"
             }
         }
 
@@ -63,6 +71,9 @@ class PaymentResponse(BaseModel):
     amount_xof: int
     payment_method: str
     country_code: str
+    currency: str
+    amount: float
+    fx_rate: Optional[float]
     status: str
     created_at: str
     validated_at: Optional[str]
@@ -70,6 +81,40 @@ class PaymentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CollectionResponse(BaseModel):
+    payment_id: str
+    method: str
+    status: str
+    provider_reference: Optional[str] = None
+    reason: Optional[str] = None
+    payment_status: str
+
+class FxRatesResponse(BaseModel):
+    base: str
+    version: str
+    rates: Dict[str, float]
+
+class WebhookAck(BaseModel):
+    received: bool
+    duplicate: bool
+
+def payment_response(payment: Payment) -> PaymentResponse:
+    return PaymentResponse(
+        id=str(payment.id),
+        order_id=str(payment.target_id) if payment.type == "order" else None,
+        tournament_id=str(payment.target_id) if payment.type == "entry_fee" else None,
+        user_id=str(payment.user_id),
+        amount_xof=int(payment.amount_xof if payment.amount_xof is not None else payment.amount),
+        payment_method=payment.method or "",
+        country_code=payment.country,
+        currency=payment.currency,
+        amount=float(payment.amount),
+        fx_rate=float(payment.fx_rate) if payment.fx_rate is not None else None,
+        status=payment.status,
+        created_at=payment.created_at.isoformat(),
+        validated_at=payment.validated_at.isoformat() if payment.validated_at else None
+    )
+
 @router.get("/methods", response_model=PaymentMethodsResponse)
 def get_payment_methods(country: str = "BJ"):
     """
@@ -77,32 +122,43 @@ def get_payment_methods(country: str = "BJ"):
     
     - **country**: Code pays (BJ, CI, TG, BF, ML, NE, SN, GW, NG, FR)
     """
-    if country not in PAYMENT_METHODS_BY_COUNTRY:
+    # Listes précalculées par le registre au démarrage
+    methods = registry.methods(country)
+    if methods is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Pays non supporté: {country}"
         )
     
-    methods = PAYMENT_METHODS_BY_COUNTRY[country]
-    
-    # Mapper les méthodes avec leurs noms affichables
-    method_names = {
-        "mtn_momo": "MTN Mobile Money",
-        "moov_money": "Moov Money",
-        "remitly": "Remitly",
-        "worldremit": "WorldRemit",
-        "western_union": "Western Union",
-        "ria": "RIA Money Transfer",
-        "moneygram": "MoneyGram",
-        "taptap_send": "Taptap Send"
-    }
+    return PaymentMethodsResponse(country=country, methods=methods)
+
+@router.get("/fx-rates", response_model=FxRatesResponse)
+def get_fx_rates():
+    """
+    Taux de change utilisés pour l'affichage des prix et le checkout
     
-    return PaymentMethodsResponse(
-        country=country,
-        methods=[
-            {"id": method, "name": method_names.get(method, method)}
-            for method in methods
-        ]
+    rates[devise] = XOF pour une unité de la devise
+    """
+    rates = fx_rates.snapshot()
+    return FxRatesResponse(
+        base=fx_rates.BASE_CURRENCY,
+        version=rates.version,
+        rates={currency: float(rate) for currency, rate in rates.rates.items()}
+    )
+
+@router.get("/events")
+async def stream_payment_events(
+    request: Request,
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Flux Server-Sent Events des changements de statut de mes paiements et commandes
+    
+    Remplace le polling de GET /payments/{payment_id}: un événement est envoyé
+    à chaque validation, rejet ou livraison.
+    """
+    return notifications.sse_response(
+        request, notifications.PAYMENT_EVENTS_CHANNEL, str(current_user.id), event_field="kind"
     )
 
 @router.post("/checkout", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
@@ -121,6 +177,10 @@ def create_payment(
     - **country_code**: Code pays
     - **phone_number**: Numéro de téléphone (pour mobile money)
     - **reference**: Référence de transaction (optionnel)
+    - **currency**: Devise de paiement (ex: EUR depuis la France), XOF par défaut
+    
+    Le taux de change est verrouillé sur le paiement: le montant dû ne change
+    plus si les taux sont modifiés ensuite.
     """
     # Vérifier qu'au moins order_id ou tournament_id est fourni
     if not request.order_id and not request.tournament_id:
@@ -130,41 +190,60 @@ def create_payment(
         )
     
     # Vérifier que la méthode est disponible pour le pays
-    if request.payment_method not in PAYMENT_METHODS_BY_COUNTRY.get(request.country_code, []):
+    if not registry.supports(request.country_code, request.payment_method):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Méthode de paiement non disponible pour {request.country_code}"
         )
     
+    # Le montant déclaré doit couvrir exactement le prix de la cible: il sert
+    # ensuite de référence aux validations automatiques
+    payment_type = "order" if request.order_id else "entry_fee"
+    target_id = request.order_id or request.tournament_id
+    expected = payment_targets.expected_amount_xof(db, payment_type, target_id)
+    if expected is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Commande ou tournoi non trouvé (ou sans frais d'inscription)"
+        )
+    if not payment_targets.amount_matches(expected, request.amount_xof):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Montant incorrect: {expected} XOF attendus"
+        )
+    
+    # Verrouiller le taux du snapshot courant (aucune requête)
+    rates = fx_rates.snapshot()
+    try:
+        amount = fx_rates.convert(request.amount_xof, fx_rates.BASE_CURRENCY, request.currency, rates)
+        fx_rate = rates.rate(request.currency)
+    except fx_rates.UnknownCurrency:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Devise non supportée: {request.currency}"
+        )
+    
     # Créer le paiement
     payment = Payment(
-        order_id=request.order_id,
-        tournament_id=request.tournament_id,
+        type=payment_type,
+        target_id=target_id,
         user_id=current_user.id,
+        country=request.country_code,
+        method=request.payment_method,
+        currency=request.currency,
+        amount=amount,
+        fx_rate=fx_rate,
         amount_xof=request.amount_xof,
-        payment_method=request.payment_method,
-        country_code=request.country_code,
-        phone_number=request.phone_number,
-        reference=request.reference,
-        status="pending"
+        payer_msisdn=request.phone_number,
+        reference=request.reference or f"PAY{uuid.uuid4().hex[:12].upper()}",
+        status=PAYMENT_PENDING
     )
     
     db.add(payment)
     db.commit()
     db.refresh(payment)
     
-    return PaymentResponse(
-        id=str(payment.id),
-        order_id=str(payment.order_id) if payment.order_id else None,
-        tournament_id=str(payment.tournament_id) if payment.tournament_id else None,
-        user_id=str(payment.user_id),
-        amount_xof=payment.amount_xof,
-        payment_method=payment.payment_method,
-        country_code=payment.country_code,
-        status=payment.status,
-        created_at=payment.created_at.isoformat(),
-        validated_at=None
-    )
+    return payment_response(payment)
 
 @router.post("/{payment_id}/proof", status_code=status.HTTP_201_CREATED)
 async def upload_payment_proof(
@@ -182,7 +261,7 @@ async def upload_payment_proof(
     Formats acceptés: JPG, PNG, GIF, PDF
     """
     # Vérifier que le paiement existe et appartient à l'utilisateur
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = partitions.find_payment(db, payment_id)
     
     if not payment:
         raise HTTPException(
@@ -196,9 +275,14 @@ async def upload_payment_proof(
             detail="Accès non autorisé"
         )
     
+    if not PAYMENTS.can(payment.status, PAYMENT_PROOF_UPLOADED):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Preuve refusée pour un paiement au statut {payment.status}"
+        )
+    
     # Vérifier le type de fichier
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "application/pdf"]
-    if file.content_type not in allowed_types:
+    if file.content_type not in PROOF_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Format de fichier non supporté. Utilisez JPG, PNG, GIF ou PDF"
@@ -215,26 +299,38 @@ async def upload_payment_proof(
         )
     
     # Calculer le hash SHA256 du fichier (requis par le modèle)
-    import hashlib
     file_hash = hashlib.sha256(content).hexdigest()
     
-    # Créer l'URL temporaire (en production, utiliser MinIO/S3)
-    # Pour l'instant, on stocke juste les métadonnées
-    file_url = f"/storage/payment-proofs/{payment.id}/{file.filename}"
+    # Original stocké tel quel; rendu de revue et miniature générés par le worker
+    proof_id = uuid.uuid4()
+    extension = PROOF_EXTENSIONS[file.content_type]
+    file_url = f"payment-proofs/{payment.id}/{proof_id}/original{extension}"
+    await run_in_threadpool(storage.put_object, file_url, content, file.content_type)
     
     # Créer la preuve de paiement selon le modèle
     proof = PaymentProof(
+        id=proof_id,
         payment_id=payment.id,
         file_url=file_url,
         file_hash_sha256=file_hash,
-        mime=file.content_type or "application/octet-stream",
-        size_bytes=len(content)
+        mime=file.content_type,
+        size_bytes=len(content),
+        renditions_status="pending"
     )
     
-    db.add(proof)
+    # Mettre à jour le statut du paiement (échoue si un admin a statué pendant l'upload)
+    try:
+        PAYMENTS.transition(db, payment.id, PAYMENT_PROOF_UPLOADED, version=payment.version)
+    except (state_machine.InvalidTransition, state_machine.StaleState):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Paiement modifié pendant l'envoi de la preuve, veuillez réessayer"
+        )
     
-    # Mettre à jour le statut du paiement
-    payment.status = "proof_uploaded"
+    db.add(proof)
+    jobs.enqueue(db, "proofs.renditions", {"proof_id": str(proof_id)})
+    notifications.notify_review(db, "proof_uploaded", payment.id)
     
     db.commit()
     db.refresh(proof)
@@ -243,22 +339,232 @@ async def upload_payment_proof(
         "message": "Preuve de paiement uploadée avec succès",
         "proof_id": str(proof.id),
         "file_hash": file_hash,
-        "status": "pending_validation",
-        "note": "Le stockage de fichiers sera implémenté avec MinIO/S3 en production"
+        "status": "pending_validation"
     }
 
+def collection_target(db: Session, payment_id: UUID, current_user: User):
+    """
+    Paiement et opérateur d'un encaissement mobile money (404 / 403 / 400 sinon)
+    """
+    payment = partitions.find_payment(db, payment_id)
+    
+    if not payment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Paiement non trouvé"
+        )
+    
+    if payment.user_id != current_user.id and current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès non autorisé"
+        )
+    
+    provider = registry.get(payment.method or "")
+    if provider is None or not provider.collects or not provider.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ce moyen de paiement ne permet pas l'encaissement automatique, envoyez une preuve"
+        )
+    
+    return payment, provider
+
+def collected_amount_matches(db: Session, payment: Payment, result: CollectionStatus) -> bool:
+    """
+    Encaissement conforme: montant et devise encaissés égaux à ceux du paiement (si
+    l'opérateur les renvoie), montant XOF du paiement égal au prix de sa cible
+    """
+    if result.amount is not None:
+        try:
+            collected = Decimal(str(result.amount))
+        except InvalidOperation:
+            return False
+        if collected != payment.amount or (result.currency and result.currency != payment.currency):
+            return False
+    expected = payment_targets.expected_amount_xof(db, payment.type, payment.target_id)
+    return payment_targets.amount_matches(expected, payment.amount_xof)
+
+def validate_collected(db: Session, payment: Payment, result: CollectionStatus) -> str:
+    """
+    Valider un paiement encaissé par l'opérateur (même effet qu'une validation admin)
+    
+    Un montant non conforme (voir collected_amount_matches) n'est pas validé: le
+    paiement est signalé à la file de revue. Retourne le statut du paiement après l'opération.
+    """
+    if not collected_amount_matches(db, payment, result):
+        notifications.notify_review(db, "amount_mismatch", payment.id)
+        db.commit()
+        return payment.status
+    
+    try:
+        row = PAYMENTS.transition(db, payment.id, PAYMENT_VALIDATED)
+    except (state_machine.InvalidTransition, state_machine.StaleState) as exc:
+        db.rollback()
+        current = getattr(exc, "current", None)
+        return current["status"] if current else PAYMENT_VALIDATED
+    
+    jobs.enqueue(db, "payments.validated", {"payment_id": str(row["id"])})
+    notifications.notify_payment_status(db, row["user_id"], "payment", row["id"], row["status"])
+    notifications.notify_review(db, "validated", row["id"])
+    db.commit()
+    return row["status"]
+
+def provider_unavailable(exc: ProviderError) -> HTTPException:
+    print(f"⚠️ Opérateur de paiement: {exc}")
+    if isinstance(exc, CircuitOpen):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Opérateur momentanément indisponible, réessayez dans quelques instants"
+        )
+    return HTTPException(
+        status_code=status.HTTP_502_BAD_GATEWAY,
+        detail="L'opérateur de paiement n'a pas répondu"
+    )
+
+@router.post("/{payment_id}/collect", response_model=CollectionResponse)
+async def request_collection(
+    payment_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Demander l'encaissement à l'opérateur mobile money (MTN MoMo, Moov Money)
+    
+    - **payment_id**: ID du paiement
+    
+    Le payeur confirme sur son téléphone; suivre l'état avec GET /payments/{payment_id}/collect.
+    Un nouvel appel avec le même paiement ne crée pas de seconde demande.
+    """
+    payment, provider = await run_in_threadpool(collection_target, db, payment_id, current_user)
+    
+    if payment.status != PAYMENT_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Encaissement impossible pour un paiement au statut {payment.status}"
+        )
+    
+    if not payment.payer_msisdn:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Numéro du payeur manquant (phone_number au checkout)"
+        )
+    
+    try:
+        result = await provider.request_to_pay(CollectionRequest(
+            payment_id=str(payment.id),
+            reference=payment.reference,
+            amount=str(payment.amount),
+            currency=payment.currency,
+            msisdn=payment.payer_msisdn
+        ))
+    except ProviderError as exc:
+        raise provider_unavailable(exc)
+    
+    return CollectionResponse(
+        payment_id=str(payment.id),
+        method=provider.name,
+        status=result.status,
+        reason=result.reason,
+        payment_status=payment.status
+    )
+
+@router.get("/{payment_id}/collect", response_model=CollectionResponse)
+async def get_collection_status(
+    payment_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    État de l'encaissement chez l'opérateur; le paiement est validé dès qu'il est réussi,
+    si le montant encaissé et le prix de la cible concordent (sinon: revue admin)
+    
+    - **payment_id**: ID du paiement
+    """
+    payment, provider = await run_in_threadpool(collection_target, db, payment_id, current_user)
+    
+    try:
+        result = await provider.collection_status(str(payment.id))
+    except ProviderError as exc:
+        raise provider_unavailable(exc)
+    
+    payment_status = payment.status
+    if result.status == "successful" and payment_status != PAYMENT_VALIDATED:
+        payment_status = await run_in_threadpool(validate_collected, db, payment, result)
+    
+    return CollectionResponse(
+        payment_id=str(payment.id),
+        method=provider.name,
+        status=result.status,
+        provider_reference=result.provider_reference,
+        reason=result.reason,
+        payment_status=payment_status
+    )
+
+@router.post("/webhooks/{provider_name}", response_model=WebhookAck)
+async def receive_payment_webhook(provider_name: str, request: Request):
+    """
+    Callback d'encaissement d'un opérateur (MTN MoMo, Moov Money)
+    
+    - **provider_name**: mtn_momo | moov_money
+    
+    Signé en HMAC-SHA256 de "<timestamp>.<corps>" (en-têtes X-Webhook-Timestamp et
+    X-Webhook-Signature). Acquitté dès son enregistrement; le paiement est validé par
+    le worker, par lots. Un renvoi de la même transaction est acquitté sans effet.
+    """
+    provider = registry.get(provider_name)
+    if provider is None or not provider.collects or not provider.webhook_secret:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Callbacks non configurés pour cet opérateur"
+        )
+    
+    body = await request.body()
+    if len(body) > WEBHOOK_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Callback trop volumineux"
+        )
+    
+    if not provider.verify_signature(
+        body, request.headers.get("X-Webhook-Timestamp"), request.headers.get("X-Webhook-Signature")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Signature invalide ou expirée"
+        )
+    
+    try:
+        payload = json.loads(body)
+        event = payment_webhooks.received_event(provider.name, provider.parse_callback(payload), payload)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Callback illisible"
+        )
+    
+    try:
+        created = await payment_webhooks.buffer.submit(event)
+    except SQLAlchemyError:
+        # Pas d'acquittement: l'opérateur renverra le callback
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Callback non enregistré, réessayez"
+        )
+    
+    return WebhookAck(received=True, duplicate=not created)
+
 @router.get("/{payment_id}", response_model=PaymentResponse)
 def get_payment(
     payment_id: UUID,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Récupérer les détails d'un paiement
     
     - **payment_id**: ID du paiement
     """
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = partitions.find_payment(db, payment_id)
     
     if not payment:
         raise HTTPException(
@@ -273,15 +579,4 @@ def get_payment(
             detail="Accès non autorisé"
         )
     
-    return PaymentResponse(
-        id=str(payment.id),
-        order_id=str(payment.order_id) if payment.order_id else None,
-        tournament_id=str(payment.tournament_id) if payment.tournament_id else None,
-        user_id=str(payment.user_id),
-        amount_xof=payment.amount_xof,
-        payment_method=payment.payment_method,
-        country_code=payment.country_code,
-        status=payment.status,
-        created_at=payment.created_at.isoformat(),
-        validated_at=payment.validated_at.isoformat() if payment.validated_at else None
-    )
+    return payment_response(payment)
@@ -1,17 +1,20 @@
 """
 Router Tournaments - Endpoints pour la gestion des tournois
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy import func, literal, or_, text
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 from datetime import datetime
 import secrets
 
 from app.database import get_db
-from app.dependencies.auth import get_current_user, require_organizer, get_optional_user
-from app.models import Tournament, TournamentRegistration, User, EntryFee
+from app.dependencies.auth import get_current_user, get_current_principal, require_organizer, get_optional_user, Principal
+from app.models import Tournament, TournamentRegistration, User
+from app.services import http_cache, leaderboard, reference_cache, results_import, room_assignment, upcoming_feed
 
 router = APIRouter()
 
@@ -58,6 +61,128 @@ class TournamentResponse(BaseModel):
 
 class RegisterTournamentRequest(BaseModel):
     ticket_code: Optional[str] = None
+    # Même code pour les joueurs d'une escouade: placés dans la même équipe
+    squad_code: Optional[str] = Field(default=None, max_length=32, pattern="^[A-Za-z0-9_-]+$")
+
+class AssignRoomsRequest(BaseModel):
+    rebuild: bool = False
+
+class RoomAssignmentResponse(BaseModel):
+    mode: str
+    team_size: int
+    room_capacity: int
+    registrants: int
+    rooms: int
+    added: int
+    removed: int
+    affected_rooms: List[int]
+
+class RoomSummary(BaseModel):
+    room_no: int
+    teams: int
+    players: int
+
+class RoomPlayer(BaseModel):
+    user_id: str
+    display_name: Optional[str]
+    uid_freefire: Optional[str]
+    country_code: Optional[str]
+    squad_code: Optional[str]
+    team_no: int
+    seat: int
+
+class RoomResponse(BaseModel):
+    room_no: int
+    players: List[RoomPlayer]
+
+class MyRoomResponse(BaseModel):
+    room_no: int
+    team_no: int
+    seat: int
+    teammates: List[RoomPlayer]
+
+class MatchResultEntry(BaseModel):
+    user_id: UUID
+    placement: int = Field(..., ge=1, le=100)
+    kills: int = Field(default=0, ge=0, le=100)
+
+class RecordMatchRequest(BaseModel):
+    match_no: int = Field(..., ge=1)
+    # 0: match sans répartition en salles
+    room_no: int = Field(default=0, ge=0)
+    results: List[MatchResultEntry] = Field(..., min_length=1, max_length=100)
+
+class RecordMatchResponse(BaseModel):
+    match_id: str
+    match_no: int
+    room_no: int
+    results: int
+    standings_updated: int
+
+class ImportRejection(BaseModel):
+    line: int
+    uid: str
+    reason: str
+
+class ResultsImportResponse(BaseModel):
+    rows: int
+    accepted: int
+    rejected: Dict[str, int]
+    matches: int
+    players: int
+    points_total: int
+    standings_updated: int
+    dry_run: bool
+    errors: List[ImportRejection]
+    timings: Dict[str, float]
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: str
+    display_name: Optional[str]
+    points: int
+    kills: int
+    wins: int
+    matches: int
+    best_placement: Optional[int]
+
+class LeaderboardResponse(BaseModel):
+    total: int
+    offset: int
+    entries: List[LeaderboardEntry]
+
+class MyRankResponse(BaseModel):
+    rank: int
+    total: int
+    around: List[LeaderboardEntry]
+
+class TournamentSearchResult(TournamentResponse):
+    rank: float
+
+class TournamentSearchResponse(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    results: List[TournamentSearchResult]
+
+def apply_list_filters(query, mode: Optional[str], status: Optional[str], visibility: Optional[str]):
+    """
+    Filtres communs à la liste et à la recherche (public + validé par défaut)
+    """
+    if visibility is None:
+        query = query.filter(Tournament.visibility == "public")
+    else:
+        query = query.filter(Tournament.visibility == visibility)
+    
+    if mode:
+        query = query.filter(Tournament.mode == mode)
+    
+    if status:
+        query = query.filter(Tournament.status == status)
+    else:
+        query = query.filter(Tournament.status == "valide")
+    
+    return query
 
 @router.get("", response_model=List[TournamentResponse])
 def list_tournaments(
@@ -75,33 +200,15 @@ def list_tournaments(
     
     Endpoint public, pas d'authentification requise
     """
-    query = db.query(Tournament)
-    
     # Par défaut, ne montrer que les tournois publics et validés
-    if visibility is None:
-        query = query.filter(Tournament.visibility == "public")
-    else:
-        query = query.filter(Tournament.visibility == visibility)
-    
-    if mode:
-        query = query.filter(Tournament.mode == mode)
-    
-    if status:
-        query = query.filter(Tournament.status == status)
-    else:
-        # Par défaut, montrer les tournois validés
-        query = query.filter(Tournament.status == "valide")
+    query = apply_list_filters(db.query(Tournament), mode, status, visibility)
     
     tournaments = query.order_by(Tournament.start_at.desc()).all()
     
     result = []
     for t in tournaments:
-        # Récupérer le montant du frais d'inscription si présent
-        entry_fee_amount = None
-        if t.entry_fee_id:
-            entry_fee = db.query(EntryFee).filter(EntryFee.id == t.entry_fee_id).first()
-            if entry_fee:
-                entry_fee_amount = float(entry_fee.amount)
+        # Montant du frais d'inscription (cache de référence, pas de requête par tournoi)
+        entry_fee_amount = reference_cache.entry_fee_amount(t.entry_fee_id)
         
         result.append(TournamentResponse(
             id=str(t.id),
@@ -122,6 +229,95 @@ def list_tournaments(
     return result
 
 
+@router.get("/upcoming")
+async def get_upcoming_tournaments(request: Request):
+    """
+    Prochains tournois publics validés (flux de l'écran d'accueil)
+    
+    Réponse pré-sérialisée servie depuis la mémoire du worker, reconstruite à
+    chaque tranche de temps ou dès qu'un tournoi est créé, validé ou rejeté.
+    Endpoint public, pas d'authentification requise
+    """
+    if upcoming_feed.is_fresh():
+        body, etag = upcoming_feed.get_feed()
+    else:
+        # Reconstruction (requête SQL) hors de la boucle événementielle
+        body, etag = await run_in_threadpool(upcoming_feed.get_feed)
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/search", response_model=TournamentSearchResponse)
+def search_tournaments(
+    q: str = Query(..., min_length=2, max_length=100),
+    mode: Optional[str] = None,
+    status: Optional[str] = None,
+    visibility: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """
+    Rechercher des tournois dans la description et la récompense
+    
+    - **q**: Texte recherché (plein texte, tolérant aux fautes de frappe)
+    - **mode**, **status**, **visibility**: Mêmes filtres que la liste
+    - **limit** / **offset**: Pagination
+    
+    Les résultats sont triés par pertinence puis par date de début.
+    Endpoint public, pas d'authentification requise
+    """
+    ts_query = func.websearch_to_tsquery("french", q)
+    # Correspondance plein texte (index GIN tsvector) ou floue (index GIN trigrammes)
+    matches = or_(
+        Tournament.search_vector.op("@@")(ts_query),
+        literal(q).op("<%")(Tournament.search_text)
+    )
+    rank = (
+        func.ts_rank_cd(Tournament.search_vector, ts_query)
+        + func.word_similarity(q, Tournament.search_text)
+    ).label("rank")
+    
+    query = apply_list_filters(db.query(Tournament), mode, status, visibility).filter(matches)
+    total = query.order_by(None).count()
+    
+    rows = (
+        query.add_columns(rank)
+        .order_by(rank.desc(), Tournament.start_at.asc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    
+    return TournamentSearchResponse(
+        total=total,
+        limit=limit,
+        offset=offset,
+        results=[
+            TournamentSearchResult(
+                id=str(t.id),
+                mode=t.mode,
+                description=t.description,
+                reward_text=t.reward_text,
+                start_at=t.start_at.isoformat(),
+                visibility=t.visibility,
+                status=t.status,
+                entry_fee_id=str(t.entry_fee_id) if t.entry_fee_id else None,
+                entry_fee_amount=reference_cache.entry_fee_amount(t.entry_fee_id),
+                contact_whatsapp=t.contact_whatsapp,
+                ticket_code=None,
+                created_by=str(t.created_by),
+                created_at=t.created_at.isoformat(),
+                rank=float(score or 0)
+            )
+            for t, score in rows
+        ]
+    )
+
+
 @router.get("/{tournament_id}", response_model=TournamentResponse)
 def get_tournament(
     tournament_id: UUID,
@@ -140,11 +336,7 @@ def get_tournament(
             detail="Tournoi non trouvé"
         )
     
-    entry_fee_amount = None
-    if tournament.entry_fee_id:
-        entry_fee = db.query(EntryFee).filter(EntryFee.id == tournament.entry_fee_id).first()
-        if entry_fee:
-            entry_fee_amount = float(entry_fee.amount)
+    entry_fee_amount = reference_cache.entry_fee_amount(tournament.entry_fee_id)
     
     return TournamentResponse(
         id=str(tournament.id),
@@ -193,14 +385,12 @@ def create_tournament(
     )
     
     db.add(tournament)
+    db.flush()
+    http_cache.invalidate(db, "tournaments", f"tournament:{tournament.id}")
     db.commit()
     db.refresh(tournament)
     
-    entry_fee_amount = None
-    if tournament.entry_fee_id:
-        entry_fee = db.query(EntryFee).filter(EntryFee.id == tournament.entry_fee_id).first()
-        if entry_fee:
-            entry_fee_amount = float(entry_fee.amount)
+    entry_fee_amount = reference_cache.entry_fee_amount(tournament.entry_fee_id)
     
     return TournamentResponse(
         id=str(tournament.id),
@@ -267,7 +457,8 @@ def register_to_tournament(
     registration = TournamentRegistration(
         tournament_id=tournament_id,
         user_id=current_user.id,
-        status="registered"
+        status="registered",
+        squad_code=request.squad_code.upper() if request.squad_code else None
     )
     
     db.add(registration)
@@ -278,7 +469,7 @@ def register_to_tournament(
 @router.get("/my/registrations")
 def get_my_registrations(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Récupérer mes inscriptions aux tournois
@@ -301,3 +492,303 @@ def get_my_registrations(
             })
     
     return result
+
+def get_managed_tournament(db: Session, tournament_id: UUID, user: User) -> Tournament:
+    """
+    Tournoi géré par l'utilisateur (créateur ou admin), 404 / 403 sinon
+    """
+    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    
+    if not tournament:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tournoi non trouvé"
+        )
+    
+    if tournament.created_by != user.id and user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seul l'organisateur du tournoi peut gérer les salles et les résultats"
+        )
+    
+    return tournament
+
+# Joueurs d'une salle avec leur profil (UID FreeFire pour l'invitation en salle)
+ROOM_PLAYERS_SQL = """
+    SELECT a.user_id, up.display_name, up.uid_freefire, up.country_code, r.squad_code,
+           a.room_no, a.team_no, a.seat
+    FROM tournament_room_assignments a
+    JOIN tournament_registrations r ON r.id = a.registration_id
+    LEFT JOIN user_profiles up ON up.user_id = a.user_id
+    WHERE a.tournament_id = :tournament_id AND a.room_no = :room_no
+    ORDER BY a.team_no, a.seat
+"""
+
+def room_player(row) -> RoomPlayer:
+    return RoomPlayer(
+        user_id=str(row.user_id),
+        display_name=row.display_name,
+        uid_freefire=row.uid_freefire,
+        country_code=row.country_code,
+        squad_code=row.squad_code,
+        team_no=row.team_no,
+        seat=row.seat
+    )
+
+@router.post("/{tournament_id}/rooms", response_model=RoomAssignmentResponse)
+def assign_tournament_rooms(
+    tournament_id: UUID,
+    request: AssignRoomsRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_organizer)
+):
+    """
+    Répartir les inscrits en salles (organisateur du tournoi ou admin)
+    
+    - **rebuild**: tout redistribuer (par défaut: seules les salles touchées par les
+      nouvelles inscriptions et les désinscriptions changent)
+    
+    Inscrits placés: payés (tournoi payant) ou inscrits (tournoi gratuit). Les
+    escouades (même squad_code) restent ensemble, les pays sont équilibrés entre salles.
+    """
+    tournament = get_managed_tournament(db, tournament_id, current_user)
+    
+    if tournament.mode not in room_assignment.MODE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Pas de format de salle pour le mode {tournament.mode}"
+        )
+    
+    summary = room_assignment.assign_rooms(db, tournament, rebuild=request.rebuild)
+    db.commit()
+    
+    return RoomAssignmentResponse(**summary)
+
+@router.get("/{tournament_id}/rooms", response_model=List[RoomSummary])
+def list_tournament_rooms(
+    tournament_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_organizer)
+):
+    """
+    Salles du tournoi avec leur remplissage (organisateur du tournoi ou admin)
+    """
+    get_managed_tournament(db, tournament_id, current_user)
+    
+    rows = db.execute(
+        text("""
+            SELECT room_no, count(DISTINCT team_no) AS teams, count(*) AS players
+            FROM tournament_room_assignments
+            WHERE tournament_id = :tournament_id
+            GROUP BY room_no
+            ORDER BY room_no
+        """),
+        {"tournament_id": tournament_id}
+    ).all()
+    
+    return [RoomSummary(room_no=row.room_no, teams=row.teams, players=row.players) for row in rows]
+
+@router.get("/{tournament_id}/rooms/me", response_model=MyRoomResponse)
+def get_my_room(
+    tournament_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Ma salle, mon équipe et mes coéquipiers
+    """
+    seat = db.execute(
+        text("""
+            SELECT room_no, team_no, seat FROM tournament_room_assignments
+            WHERE tournament_id = :tournament_id AND user_id = :user_id
+        """),
+        {"tournament_id": tournament_id, "user_id": current_user.id}
+    ).first()
+    
+    if not seat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Pas encore de salle attribuée"
+        )
+    
+    rows = db.execute(
+        text(ROOM_PLAYERS_SQL),
+        {"tournament_id": tournament_id, "room_no": seat.room_no}
+    ).all()
+    
+    return MyRoomResponse(
+        room_no=seat.room_no,
+        team_no=seat.team_no,
+        seat=seat.seat,
+        teammates=[room_player(row) for row in rows if row.team_no == seat.team_no]
+    )
+
+@router.get("/{tournament_id}/rooms/{room_no}", response_model=RoomResponse)
+def get_tournament_room(
+    tournament_id: UUID,
+    room_no: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_organizer)
+):
+    """
+    Joueurs d'une salle par équipe (organisateur du tournoi ou admin)
+    """
+    get_managed_tournament(db, tournament_id, current_user)
+    
+    rows = db.execute(
+        text(ROOM_PLAYERS_SQL),
+        {"tournament_id": tournament_id, "room_no": room_no}
+    ).all()
+    
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Salle non trouvée"
+        )
+    
+    return RoomResponse(room_no=room_no, players=[room_player(row) for row in rows])
+
+@router.post("/{tournament_id}/matches", response_model=RecordMatchResponse)
+def record_tournament_match(
+    tournament_id: UUID,
+    request: RecordMatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_organizer)
+):
+    """
+    Enregistrer les résultats d'un match (organisateur du tournoi ou admin)
+    
+    - **match_no** / **room_no**: un nouvel envoi pour le même match remplace ses résultats
+    - **results**: place et kills de chaque joueur (même place pour les coéquipiers)
+    
+    Points: barème du mode (points par place et par kill, voir /admin/scoring-rules).
+    Le classement en direct est mis à jour dans tous les workers au commit.
+    """
+    tournament = get_managed_tournament(db, tournament_id, current_user)
+    
+    user_ids = [result.user_id for result in request.results]
+    if len(set(user_ids)) != len(user_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Un joueur apparaît plusieurs fois dans les résultats"
+        )
+    
+    unregistered = leaderboard.unregistered_players(db, tournament, user_ids)
+    if unregistered:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Joueurs non inscrits au tournoi: {', '.join(unregistered)}"
+        )
+    
+    summary = leaderboard.record_match(
+        db,
+        tournament,
+        request.match_no,
+        request.room_no,
+        [leaderboard.MatchResult(str(r.user_id), r.placement, r.kills) for r in request.results],
+        recorded_by=current_user.id
+    )
+    db.commit()
+    
+    return RecordMatchResponse(**summary)
+
+@router.post("/{tournament_id}/results/import", response_model=ResultsImportResponse)
+def import_tournament_results(
+    tournament_id: UUID,
+    file: UploadFile = File(...),
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_organizer)
+):
+    """
+    Importer une feuille de résultats CSV ou XLSX (organisateur du tournoi ou admin)
+    
+    - **file**: une ligne par joueur et par match; colonnes match, salle (optionnelle),
+      uid (UID FreeFire), place, kills (optionnelle)
+    - **dry_run**: valider et calculer les points sans rien enregistrer
+    
+    Les lignes invalides (UID inconnu ou non inscrit, place hors bornes, joueur en
+    double) sont écartées et listées; les matchs importés remplacent leurs résultats
+    précédents.
+    """
+    tournament = get_managed_tournament(db, tournament_id, current_user)
+    
+    try:
+        summary = results_import.import_results(
+            db, tournament, file.file, file.filename or "", dry_run=dry_run, recorded_by=current_user.id
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    
+    if not dry_run:
+        db.commit()
+        print(f"📊 Résultats importés pour {tournament.id}: {summary['accepted']}/{summary['rows']} lignes, "
+              f"{summary['matches']} matchs ({summary['timings']})")
+    
+    return ResultsImportResponse(**summary)
+
+def leaderboard_entry(rank: int, standing: leaderboard.Standing) -> LeaderboardEntry:
+    return LeaderboardEntry(rank=rank, **standing._asdict())
+
+async def current_board(tournament_id: UUID) -> leaderboard.Leaderboard:
+    board = leaderboard.fresh_board(tournament_id)
+    if board is not None:
+        return board
+    
+    # Chargement ou rattrapage des révisions (requête SQL) hors de la boucle événementielle
+    try:
+        return await run_in_threadpool(leaderboard.get_board, tournament_id)
+    except LookupError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tournoi non trouvé"
+        )
+
+@router.get("/{tournament_id}/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(
+    tournament_id: UUID,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Classement du tournoi (par points, puis victoires, puis kills)
+    
+    Servi depuis la mémoire du worker, mis à jour à chaque match enregistré.
+    Les ex aequo partagent le même rang. Endpoint public, pas d'authentification requise
+    """
+    board = await current_board(tournament_id)
+    total, entries = board.page(offset, limit)
+    
+    return LeaderboardResponse(
+        total=total,
+        offset=offset,
+        entries=[leaderboard_entry(rank, standing) for rank, standing in entries]
+    )
+
+@router.get("/{tournament_id}/leaderboard/me", response_model=MyRankResponse)
+async def get_my_rank(
+    tournament_id: UUID,
+    radius: int = Query(5, ge=0, le=50),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Mon rang et les joueurs classés juste avant et juste après moi
+    """
+    board = await current_board(tournament_id)
+    position = board.around(current_user.id, radius)
+    
+    if position is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Pas encore classé dans ce tournoi"
+        )
+    
+    rank, total, entries = position
+    return MyRankResponse(
+        rank=rank,
+        total=total,
+        around=[leaderboard_entry(entry_rank, standing) for entry_rank, standing in entries]
+    )
@@ -0,0 +1,134 @@
+"""
+Lanceur de production - Gunicorn + workers Uvicorn
+Dimensionne le nombre de workers selon les CPU disponibles (affinité + quotas cgroup),
+précharge l'application, recycle les workers et draine les requêtes en cours sur SIGTERM.
+
+Usage: python -m app.server
+"""
+import math
+import multiprocessing
+import os
+from typing import Optional
+
+from gunicorn.app.base import BaseApplication
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    """
+    Lire la première ligne d'un fichier système (None si absent)
+    """
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """
+    Quota CPU imposé par le cgroup du conteneur (v2 puis v1), None si illimité
+    """
+    # cgroup v2: "max 100000" ou "200000 100000"
+    cpu_max = _read_first_line("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1: quota -1 = illimité
+    quota = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> int:
+    """
+    Nombre de CPU réellement utilisables par le processus
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Windows / macOS: pas d'affinité CPU
+        cpus = multiprocessing.cpu_count()
+
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return cpus
+
+
+def compute_workers() -> int:
+    """
+    Nombre de workers: WEB_CONCURRENCY si défini, sinon (2 x CPU) + 1 plafonné
+    """
+    explicit = os.getenv("WEB_CONCURRENCY")
+    if explicit:
+        return max(1, int(explicit))
+
+    # Les workers Uvicorn sont asynchrones: inutile de dépasser 2 x CPU + 1
+    workers = available_cpus() * 2 + 1
+    max_workers = int(os.getenv("MAX_WORKERS", "8"))
+    return max(1, min(workers, max_workers))
+
+
+def build_config() -> dict:
+    """
+    Configuration Gunicorn lue depuis les variables d'environnement
+    """
+    port = int(os.getenv("PORT", 8080))
+    return {
+        "bind": os.getenv("BIND", f"0.0.0.0:{port}"),
+        "workers": compute_workers(),
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        # Charger l'app une fois dans le master (fork copy-on-write)
+        "preload_app": os.getenv("PRELOAD_APP", "true").lower() == "true",
+        # Recycler les workers pour plafonner la croissance mémoire
+        "max_requests": int(os.getenv("MAX_REQUESTS", "10000")),
+        "max_requests_jitter": int(os.getenv("MAX_REQUESTS_JITTER", "1000")),
+        # SIGTERM: arrêter d'accepter puis drainer les requêtes en cours
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "60")),
+        # Keep-alive supérieur au timeout idle du proxy (nginx: 65s)
+        "keepalive": int(os.getenv("KEEPALIVE", "75")),
+        "backlog": int(os.getenv("BACKLOG", "2048")),
+        "accesslog": os.getenv("ACCESS_LOG", "-"),
+        "errorlog": "-",
+        "loglevel": os.getenv("LOG_LEVEL", "info"),
+        "forwarded_allow_ips": os.getenv("FORWARDED_ALLOW_IPS", "*"),
+    }
+
+
+class ProductionServer(BaseApplication):
+    """
+    Application Gunicorn embarquée (pas de fichier de config externe)
+    """
+
+    def __init__(self, app_uri: str, options: dict):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+        return import_app(self.app_uri)
+
+
+def main():
+    """
+    Point d'entrée du lanceur de production
+    """
+    config = build_config()
+    print(f"🚀 Démarrage production: {config['workers']} workers sur {config['bind']}")
+    ProductionServer(os.getenv("APP_MODULE", "app.main:app"), config).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,28 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from typing import Optional
 import secrets
+import time
 from datetime import datetime, timedelta
 
 from app.models import User, UserProfile, EmailVerification, PasswordReset
 from app.dependencies.auth import create_access_token
+from app.services import jobs, revocation
+
+# Durée mesurée d'un hachage au démarrage (secondes), None avant calibration
+bcrypt_cost_seconds: Optional[float] = None
+
+def calibrate_bcrypt() -> float:
+    """
+    Mesurer le coût d'un hachage (au démarrage du worker, exposé par /health)
+    
+    Les hachages s'exécutent dans le thread de la requête (endpoints synchrones,
+    threadpool de Starlette): bcrypt libère le GIL pendant le calcul.
+    """
+    global bcrypt_cost_seconds
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt())
+    bcrypt_cost_seconds = time.perf_counter() - start
+    return bcrypt_cost_seconds
 
 def hash_password(password: str) -> str:
     """
@@ -57,8 +75,7 @@ def create_user(
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    db.flush()  # Attribuer l'id sans commit intermédiaire
     
     # Créer le profil utilisateur si des infos sont fournies
     if display_name or uid_freefire or phone or country:
@@ -70,10 +87,12 @@ def create_user(
             country_code=country
         )
         db.add(profile)
-        db.commit()
     
-    # Créer un token de vérification email
-    create_email_verification_token(db, user)
+    # Le token de vérification email est créé par le worker (hors requête)
+    jobs.enqueue(db, "auth.email_verification", {"user_id": str(user.id)})
+    
+    db.commit()
+    db.refresh(user)
     
     return user
 
@@ -92,7 +111,7 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
 
 def create_email_verification_token(db: Session, user: User) -> EmailVerification:
     """
-    Créer un token de vérification email
+    Créer un token de vérification email (flush seulement: l'appelant commit)
     """
     token = secrets.token_urlsafe(32)
     expires_at = datetime.utcnow() + timedelta(hours=24)
@@ -105,8 +124,7 @@ def create_email_verification_token(db: Session, user: User) -> EmailVerificatio
     )
     
     db.add(email_verification)
-    db.commit()
-    db.refresh(email_verification)
+    db.flush()
     
     return email_verification
 
@@ -136,7 +154,7 @@ def verify_email_token(db: Session, token: str) -> bool:
 
 def create_password_reset_token(db: Session, email: str) -> Optional[PasswordReset]:
     """
-    Créer un token de réinitialisation de mot de passe
+    Créer un token de réinitialisation de mot de passe (flush seulement: l'appelant commit)
     """
     user = db.query(User).filter(User.email == email).first()
     if not user:
@@ -153,8 +171,7 @@ def create_password_reset_token(db: Session, email: str) -> Optional[PasswordRes
     )
     
     db.add(password_reset)
-    db.commit()
-    db.refresh(password_reset)
+    db.flush()
     
     return password_reset
 
@@ -178,6 +195,7 @@ def reset_password(db: Session, token: str, new_password: str) -> bool:
     user = db.query(User).filter(User.id == password_reset.user_id).first()
     if user:
         user.password_hash = hash_password(new_password)
+        revocation.revoke_user_tokens(db, user.id)
     
     db.commit()
     return True
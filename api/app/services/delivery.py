@@ -0,0 +1,353 @@
+"""
+Delivery Service - Livraison automatique des commandes payées
+Les commandes payées sont mises en file (table deliveries); app.delivery_worker réserve
+des lots, appelle le fournisseur de recharge en parallèle (concurrence et débit bornés)
+puis enregistre tous les résultats du lot en quelques requêtes ensemblistes.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import Order
+from app.services import notifications
+from app.services.topup_providers import RateLimiter, TopUpProvider, TopUpRequest, TopUpResult
+
+# Backoff exponentiel entre deux tentatives (secondes)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Une livraison "in_flight" depuis plus longtemps est reprise (worker arrêté brutalement)
+LEASE_SECONDS = 300
+
+
+def configured_provider() -> Optional[str]:
+    """
+    Fournisseur utilisé pour les nouvelles livraisons (None: livraison manuelle uniquement)
+    """
+    return os.getenv("TOPUP_PROVIDER") or None
+
+
+def enqueue_delivery(db: Session, order: Order) -> bool:
+    """
+    Mettre une commande payée en file de livraison (dans la transaction de l'appelant)
+
+    Sans effet si aucun fournisseur n'est configuré ou si la commande est déjà en file.
+    """
+    provider = configured_provider()
+    if provider is None:
+        return False
+
+    result = db.execute(
+        text("""
+            INSERT INTO deliveries (order_id, order_created_at, order_code, user_id, uid_freefire, sku, provider)
+            SELECT :order_id, :created_at, :order_code, :user_id, :uid_freefire, c.sku, :provider
+            FROM catalog_items c WHERE c.id = :catalog_item_id
+            ON CONFLICT (order_id) DO NOTHING
+        """),
+        {
+            "order_id": order.id,
+            "created_at": order.created_at,
+            "order_code": order.order_code,
+            "user_id": order.user_id,
+            "uid_freefire": order.uid_freefire,
+            "catalog_item_id": order.catalog_item_id,
+            "provider": provider,
+        }
+    )
+    return result.rowcount > 0
+
+
+def enqueue_orders(db: Session, orders: List[dict]) -> int:
+    """
+    Mettre en file un lot de commandes payées en une requête (lignes RETURNING de orders)
+    """
+    provider = configured_provider()
+    if provider is None or not orders:
+        return 0
+
+    result = db.execute(
+        text("""
+            INSERT INTO deliveries (order_id, order_created_at, order_code, user_id, uid_freefire, sku, provider)
+            SELECT v.id, v.created_at, v.order_code, v.user_id, v.uid_freefire, c.sku, :provider
+            FROM unnest(
+                CAST(:ids AS uuid[]), CAST(:created AS timestamptz[]), CAST(:codes AS text[]),
+                CAST(:user_ids AS uuid[]), CAST(:uids AS text[]), CAST(:items AS uuid[])
+            ) AS v(id, created_at, order_code, user_id, uid_freefire, catalog_item_id)
+            JOIN catalog_items c ON c.id = v.catalog_item_id
+            ON CONFLICT (order_id) DO NOTHING
+        """),
+        {
+            "ids": [str(order["id"]) for order in orders],
+            "created": [order["created_at"] for order in orders],
+            "codes": [order["order_code"] for order in orders],
+            "user_ids": [str(order["user_id"]) for order in orders],
+            "uids": [order["uid_freefire"] for order in orders],
+            "items": [str(order["catalog_item_id"]) for order in orders],
+            "provider": provider,
+        }
+    )
+    return result.rowcount
+
+
+def enqueue_paid_orders(db: Session, days: int = 30) -> int:
+    """
+    Mettre en file toutes les commandes payées sans livraison (rattrapage, une requête)
+    """
+    provider = configured_provider()
+    if provider is None:
+        return 0
+
+    result = db.execute(
+        text("""
+            INSERT INTO deliveries (order_id, order_created_at, order_code, user_id, uid_freefire, sku, provider)
+            SELECT o.id, o.created_at, o.order_code, o.user_id, o.uid_freefire, c.sku, :provider
+            FROM orders o
+            JOIN catalog_items c ON c.id = o.catalog_item_id
+            WHERE o.status = 'paid'
+              AND o.created_at >= now() - make_interval(days => :days)
+            ON CONFLICT (order_id) DO NOTHING
+        """),
+        {"provider": provider, "days": days}
+    )
+    return result.rowcount
+
+
+def claim_batch(db: Session, provider: str, worker_id: str, limit: int) -> List[dict]:
+    """
+    Réserver jusqu'à `limit` livraisons prêtes sans bloquer les autres workers
+
+    Une livraison abandonnée (bail expiré) est reprise tant qu'il lui reste des
+    tentatives; au-delà elle passe en 'failed' pour vérification par un admin
+    (la recharge a pu aboutir avant l'arrêt du worker).
+    """
+    rows = db.execute(
+        text("""
+            WITH exhausted AS (
+                UPDATE deliveries SET
+                    status = 'failed',
+                    locked_at = NULL,
+                    last_error = 'Bail expiré après ' || attempts || ' tentatives (recharge à vérifier)',
+                    updated_at = now()
+                WHERE id IN (
+                    SELECT id FROM deliveries
+                    WHERE provider = :provider
+                      AND status = 'in_flight'
+                      AND locked_at < now() - make_interval(secs => :lease)
+                      AND attempts >= max_attempts
+                    FOR UPDATE SKIP LOCKED
+                )
+            )
+            UPDATE deliveries SET
+                status = 'in_flight',
+                attempts = attempts + 1,
+                locked_at = now(),
+                locked_by = :worker_id,
+                updated_at = now()
+            WHERE id IN (
+                SELECT id FROM deliveries
+                WHERE provider = :provider
+                  AND (
+                    (status = 'queued' AND next_attempt_at <= now())
+                    OR (
+                      status = 'in_flight'
+                      AND locked_at < now() - make_interval(secs => :lease)
+                      AND attempts < max_attempts
+                    )
+                  )
+                ORDER BY next_attempt_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, order_code, uid_freefire, sku
+        """),
+        {"worker_id": worker_id, "provider": provider, "limit": limit, "lease": LEASE_SECONDS}
+    ).mappings().all()
+    db.commit()
+    return [dict(row) for row in rows]
+
+
+class Dispatcher:
+    """
+    Appels fournisseur d'un processus: pool de threads borné + limiteur de débit partagé
+    """
+
+    def __init__(self, provider: TopUpProvider):
+        self.provider = provider
+        self.limiter = RateLimiter(provider.rate_per_second)
+        self.executor = ThreadPoolExecutor(max_workers=provider.max_concurrency, thread_name_prefix="topup")
+
+    def _call(self, delivery: dict) -> TopUpResult:
+        self.limiter.acquire()
+        try:
+            return self.provider.top_up(TopUpRequest(
+                delivery_id=str(delivery["id"]),
+                order_code=delivery["order_code"],
+                uid_freefire=delivery["uid_freefire"],
+                sku=delivery["sku"]
+            ))
+        except Exception as exc:
+            # Exception inattendue de l'adaptateur: traitée comme transitoire
+            return TopUpResult("retry", error=f"{exc.__class__.__name__}: {exc}")
+
+    def dispatch(self, batch: List[dict]) -> List[Tuple[dict, TopUpResult]]:
+        """
+        Exécuter le lot en parallèle et retourner (livraison, résultat) dans l'ordre du lot
+        """
+        return list(zip(batch, self.executor.map(self._call, batch)))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+def apply_results(db: Session, worker_id: str, results: List[Tuple[dict, TopUpResult]]) -> Dict[str, int]:
+    """
+    Enregistrer les résultats d'un lot: au plus quatre requêtes quelle que soit sa taille
+
+    Seules les livraisons encore réservées par ce worker sont mises à jour: une livraison
+    reprise par un autre worker après expiration du bail garde l'état de sa nouvelle tentative.
+    """
+    delivered = [(d, r) for d, r in results if r.status == "delivered"]
+    retry = [(d, r) for d, r in results if r.status == "retry"]
+    failed = [(d, r) for d, r in results if r.status == "failed"]
+
+    if delivered:
+        orders = db.execute(
+            text("""
+                UPDATE deliveries d SET
+                    status = 'delivered', provider_reference = v.reference, delivered_at = now(),
+                    locked_at = NULL, last_error = NULL, updated_at = now()
+                FROM unnest(CAST(:ids AS uuid[]), CAST(:refs AS text[])) AS v(id, reference)
+                WHERE d.id = v.id AND d.status = 'in_flight' AND d.locked_by = :worker
+                RETURNING d.order_id, d.order_created_at, d.user_id
+            """),
+            {
+                "worker": worker_id,
+                "ids": [str(d["id"]) for d, _ in delivered],
+                "refs": [r.reference for _, r in delivered],
+            }
+        ).all()
+
+        if orders:
+            # created_at dans le filtre: seules les partitions concernées sont parcourues
+            db.execute(
+                text("""
+                    UPDATE orders SET status = 'delivered', delivered_at = now(), version = version + 1
+                    WHERE id = ANY(CAST(:order_ids AS uuid[]))
+                      AND created_at = ANY(CAST(:created AS timestamptz[]))
+                      AND status = 'paid'
+                """),
+                {"order_ids": [str(o.order_id) for o in orders], "created": [o.order_created_at for o in orders]}
+            )
+            db.execute(
+                text("""
+                    SELECT pg_notify(:channel, json_build_object(
+                        'user_id', t.user_id, 'kind', 'order', 'id', t.order_id, 'status', 'delivered'
+                    )::text)
+                    FROM unnest(CAST(:user_ids AS text[]), CAST(:order_ids AS text[])) AS t(user_id, order_id)
+                """),
+                {
+                    "channel": notifications.PAYMENT_EVENTS_CHANNEL,
+                    "user_ids": [str(o.user_id) for o in orders],
+                    "order_ids": [str(o.order_id) for o in orders],
+                }
+            )
+
+    if retry:
+        db.execute(
+            text("""
+                UPDATE deliveries d SET
+                    status = CASE WHEN d.attempts >= d.max_attempts THEN 'failed' ELSE 'queued' END,
+                    next_attempt_at = now() + make_interval(secs => LEAST(:base * power(2, d.attempts - 1), :max)),
+                    last_error = v.error, locked_at = NULL, locked_by = NULL, updated_at = now()
+                FROM unnest(CAST(:ids AS uuid[]), CAST(:errors AS text[])) AS v(id, error)
+                WHERE d.id = v.id AND d.status = 'in_flight' AND d.locked_by = :worker
+            """),
+            {
+                "worker": worker_id,
+                "ids": [str(d["id"]) for d, _ in retry],
+                "errors": [r.error for _, r in retry],
+                "base": RETRY_BASE_SECONDS,
+                "max": RETRY_MAX_SECONDS,
+            }
+        )
+
+    if failed:
+        db.execute(
+            text("""
+                UPDATE deliveries d SET
+                    status = 'failed', last_error = v.error, locked_at = NULL, updated_at = now()
+                FROM unnest(CAST(:ids AS uuid[]), CAST(:errors AS text[])) AS v(id, error)
+                WHERE d.id = v.id AND d.status = 'in_flight' AND d.locked_by = :worker
+            """),
+            {
+                "worker": worker_id,
+                "ids": [str(d["id"]) for d, _ in failed],
+                "errors": [r.error for _, r in failed],
+            }
+        )
+
+    db.commit()
+    return {"delivered": len(delivered), "retry": len(retry), "failed": len(failed)}
+
+
+def mark_manually_delivered(db: Session, order_id) -> bool:
+    """
+    Retirer une commande de la file après une livraison manuelle (admin)
+
+    La ligne reste verrouillée jusqu'au commit de l'appelant: un worker ne peut
+    plus la réserver entre la vérification et la mise à jour (SKIP LOCKED).
+    Retourne False si la recharge automatique est en cours ou a déjà abouti.
+    """
+    current = db.execute(
+        text("SELECT status FROM deliveries WHERE order_id = :order_id FOR UPDATE"),
+        {"order_id": order_id}
+    ).scalar()
+    if current is None:
+        return True
+    if current not in ("queued", "failed"):
+        return False
+
+    db.execute(
+        text("""
+            UPDATE deliveries SET status = 'delivered', provider_reference = 'manual',
+                delivered_at = now(), locked_at = NULL, updated_at = now()
+            WHERE order_id = :order_id
+        """),
+        {"order_id": order_id}
+    )
+    return True
+
+
+def requeue_failed(db: Session, delivery_id=None) -> int:
+    """
+    Remettre en file une livraison échouée (ou toutes si delivery_id est None)
+    """
+    result = db.execute(
+        text("""
+            UPDATE deliveries SET status = 'queued', attempts = 0, next_attempt_at = now(), updated_at = now()
+            WHERE status = 'failed' AND (CAST(:id AS uuid) IS NULL OR id = CAST(:id AS uuid))
+        """),
+        {"id": str(delivery_id) if delivery_id else None}
+    )
+    return result.rowcount
+
+
+def stats(db: Session) -> Dict[str, int]:
+    """
+    Nombre de livraisons par statut et retard de la plus ancienne en file (secondes)
+    """
+    counts = dict(db.execute(text("SELECT status, count(*) FROM deliveries GROUP BY status")).all())
+    lag = db.execute(text("""
+        SELECT COALESCE(EXTRACT(EPOCH FROM now() - min(created_at)), 0)
+        FROM deliveries WHERE status IN ('queued', 'in_flight')
+    """)).scalar()
+    return {
+        "queued": counts.get("queued", 0),
+        "in_flight": counts.get("in_flight", 0),
+        "delivered": counts.get("delivered", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_pending_seconds": int(lag or 0),
+    }
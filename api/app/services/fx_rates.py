@@ -0,0 +1,131 @@
+"""
+FX Rates - Taux de change gardés en mémoire par worker
+Les taux sont chargés en un snapshot immuable: une conversion lit toujours un jeu de
+taux cohérent, sans requête. Un changement de taux (admin) remplace le snapshot de
+chaque worker via l'invalidation "fx" (voir http_cache.invalidate).
+"""
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, NamedTuple, Optional
+
+from app.database import SessionLocal
+from app.models import FxRate
+
+BASE_CURRENCY = "XOF"
+
+# Filet de sécurité si une invalidation est manquée (coupure LISTEN)
+SNAPSHOT_TTL_SECONDS = 600
+
+# Décimales affichées / facturées par devise (XOF: pas de centimes)
+CURRENCY_DECIMALS = {"XOF": 0, "XAF": 0}
+DEFAULT_DECIMALS = 2
+
+
+class UnknownCurrency(Exception):
+    """Devise absente de la table fx_rates"""
+
+
+class RateSnapshot(NamedTuple):
+    """
+    Jeu de taux figé: rates[devise] = XOF pour une unité de la devise
+
+    version: horodatage de la dernière modification, renvoyé avec les prix convertis
+    et enregistré au checkout.
+    """
+    rates: Mapping[str, Decimal]
+    version: str
+    loaded_at: float
+
+    def rate(self, currency: str) -> Decimal:
+        try:
+            return self.rates[currency]
+        except KeyError:
+            raise UnknownCurrency(currency)
+
+    def factor(self, source: str, target: str) -> Decimal:
+        """
+        Multiplicateur d'un montant en `source` vers `target`
+        """
+        if source == target:
+            return Decimal(1)
+        return self.rate(source) / self.rate(target)
+
+
+_snapshot: Optional[RateSnapshot] = None
+_expires_at = 0.0
+_lock = threading.Lock()
+
+
+def _load() -> RateSnapshot:
+    db = SessionLocal()
+    try:
+        rows = db.query(FxRate.currency, FxRate.xof_per_unit, FxRate.updated_at).all()
+    finally:
+        db.close()
+    rates = {currency.strip(): Decimal(rate) for currency, rate, _ in rows}
+    rates.setdefault(BASE_CURRENCY, Decimal(1))
+    latest = max((updated_at for _, _, updated_at in rows if updated_at), default=None)
+    return RateSnapshot(
+        rates=MappingProxyType(rates),
+        version=latest.isoformat() if latest else "initial",
+        loaded_at=time.time()
+    )
+
+
+def snapshot() -> RateSnapshot:
+    """
+    Snapshot courant (rechargé par un seul thread à l'invalidation ou à l'expiration)
+    """
+    global _snapshot, _expires_at
+    current = _snapshot
+    if current is not None and time.time() < _expires_at:
+        return current
+    with _lock:
+        if _snapshot is None or time.time() >= _expires_at:
+            _snapshot = _load()
+            _expires_at = time.time() + SNAPSHOT_TTL_SECONDS
+        return _snapshot
+
+
+def invalidate() -> None:
+    """
+    Recharger les taux à la prochaine lecture (changement de taux)
+    """
+    global _expires_at
+    _expires_at = 0.0
+
+
+def quantum(currency: str) -> Decimal:
+    return Decimal(1).scaleb(-CURRENCY_DECIMALS.get(currency, DEFAULT_DECIMALS))
+
+
+def convert(amount, source: str, target: str, rates: Optional[RateSnapshot] = None) -> Decimal:
+    """
+    Convertir un montant, arrondi aux décimales de la devise cible
+    """
+    rates = rates or snapshot()
+    return (Decimal(amount) * rates.factor(source, target)).quantize(quantum(target), ROUND_HALF_UP)
+
+
+def convert_prices(
+    prices: Iterable[tuple],
+    target: str,
+    rates: Optional[RateSnapshot] = None
+) -> List[Decimal]:
+    """
+    Convertir une liste de prix (montant, devise) vers `target` en une passe
+
+    Un facteur par devise source, calculé une fois pour toute la liste.
+    """
+    rates = rates or snapshot()
+    step = quantum(target)
+    factors = {}
+    converted = []
+    for amount, source in prices:
+        factor = factors.get(source)
+        if factor is None:
+            factor = factors[source] = rates.factor(source, target)
+        converted.append((Decimal(amount) * factor).quantize(step, ROUND_HALF_UP))
+    return converted
@@ -0,0 +1,255 @@
+"""
+HTTP Cache - Politique de cache HTTP des endpoints publics et purge du cache nginx
+- Middleware: Cache-Control / ETag / Vary / Surrogate-Key par route, 304 sur If-None-Match
+- invalidate(): écritures admin -> caches des workers (NOTIFY) + rafraîchissement nginx
+"""
+import hashlib
+import os
+import re
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database import after_commit
+from app.services import fx_rates, notifications, reference_cache, scoring, upcoming_feed
+
+# Serveur nginx interne de rafraîchissement (vide: pas de purge, ex. en développement)
+CACHE_PURGE_URL = os.getenv("CACHE_PURGE_URL", "").rstrip("/")
+
+# Délai avant la purge, le temps que les autres workers reçoivent l'invalidation
+CACHE_PURGE_DELAY_SECONDS = float(os.getenv("CACHE_PURGE_DELAY", "0.5"))
+
+_UUID = r"[0-9a-fA-F-]{36}"
+
+
+class CachePolicy(NamedTuple):
+    """
+    Politique d'une route
+
+    - max_age: cache navigateur (secondes)
+    - s_maxage: cache partagé nginx / CDN (secondes), envoyé aussi en X-Accel-Expires
+    - stale: durée pendant laquelle une version périmée peut être servie pendant le rafraîchissement
+    - keys: surrogate keys; "{id}" est remplacé par l'identifiant de l'URL
+    """
+    max_age: int
+    s_maxage: int
+    stale: int
+    keys: Tuple[str, ...]
+
+
+# Routes GET publiques mises en cache (chemin côté API, sans le préfixe /api de nginx)
+POLICIES: List[Tuple[re.Pattern, CachePolicy]] = [
+    (re.compile(r"^/$"), CachePolicy(60, 300, 600, ("root",))),
+    (re.compile(r"^/catalog(/search)?$"), CachePolicy(30, 60, 300, ("catalog",))),
+    (re.compile(rf"^/catalog/(?P<id>{_UUID})$"), CachePolicy(30, 60, 300, ("catalog", "catalog:{id}"))),
+    (re.compile(r"^/tournaments(/upcoming|/search)?$"), CachePolicy(10, 30, 120, ("tournaments",))),
+    (re.compile(rf"^/tournaments/(?P<id>{_UUID})$"), CachePolicy(10, 30, 120, ("tournaments", "tournament:{id}"))),
+    # Micro-cache du classement en direct: nginx absorbe les rafraîchissements des spectateurs
+    (re.compile(rf"^/tournaments/(?P<id>{_UUID})/leaderboard$"), CachePolicy(2, 2, 10, ("leaderboard:{id}",))),
+    (re.compile(r"^/payments/methods$"), CachePolicy(3600, 86400, 86400, ("payment-methods",))),
+    (re.compile(r"^/payments/fx-rates$"), CachePolicy(60, 300, 600, ("fx",))),
+]
+
+# URLs canoniques rafraîchies dans nginx pour chaque surrogate key (les autres
+# variantes avec paramètres expirent d'elles-mêmes après s_maxage)
+PURGE_PATHS = {
+    "catalog": ["/catalog", "/catalog/search"],
+    "catalog:{id}": ["/catalog/{id}"],
+    "tournaments": ["/tournaments", "/tournaments/upcoming"],
+    "tournament:{id}": ["/tournaments/{id}"],
+    "fx": ["/payments/fx-rates"],
+}
+
+# URLs rafraîchies aussi pour chaque devise d'affichage (?currency=XXX, clé nginx
+# distincte): un nouveau taux ne laisse pas d'anciens prix convertis en cache
+CURRENCY_VARIANT_PATHS = frozenset(("/catalog", "/catalog/{id}"))
+
+
+def match_policy(path: str) -> Optional[Tuple[CachePolicy, Optional[str]]]:
+    for pattern, policy in POLICIES:
+        match = pattern.match(path)
+        if match:
+            return policy, match.groupdict().get("id")
+    return None
+
+
+def _header(headers: list, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class HTTPCacheMiddleware:
+    """
+    Middleware ASGI appliquant POLICIES aux réponses GET/HEAD 200
+
+    Requêtes authentifiées: Cache-Control private (jamais stockées par nginx).
+    L'ETag est calculé sur le corps si l'endpoint n'en fournit pas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        matched = match_policy(scope["path"])
+        if matched is None:
+            return await self.app(scope, receive, send)
+
+        policy, item_id = matched
+        request_headers = scope["headers"]
+        authenticated = _header(request_headers, b"authorization") is not None
+        if_none_match = _header(request_headers, b"if-none-match")
+
+        start_message = None
+        body = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            content = b"".join(body)
+            headers = list(start_message["headers"])
+            status = start_message["status"]
+
+            if status == 200:
+                etag = _header(headers, b"etag")
+                if etag is None and scope["method"] == "GET":
+                    etag = ('W/"' + hashlib.sha1(content).hexdigest()[:16] + '"').encode()
+                    headers.append((b"etag", etag))
+                headers = self._apply_policy(headers, policy, item_id, authenticated)
+
+                if if_none_match is not None and etag is not None and etag in [t.strip() for t in if_none_match.split(b",")]:
+                    headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type")]
+                    await send({"type": "http.response.start", "status": 304, "headers": headers})
+                    return await send({"type": "http.response.body", "body": b""})
+
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": content})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _apply_policy(headers: list, policy: CachePolicy, item_id: Optional[str], authenticated: bool) -> list:
+        existing_vary = [part.strip() for k, v in headers if k.lower() == b"vary" for part in v.decode().split(",")]
+        vary = ", ".join(dict.fromkeys(["Accept-Encoding", *existing_vary]))
+        headers = [(k, v) for k, v in headers if k.lower() not in (b"cache-control", b"vary")]
+
+        if authenticated:
+            headers.append((b"cache-control", b"private, max-age=0, must-revalidate"))
+        else:
+            headers.append((b"cache-control", (
+                f"public, max-age={policy.max_age}, s-maxage={policy.s_maxage}, "
+                f"stale-while-revalidate={policy.stale}, stale-if-error={policy.stale}"
+            ).encode()))
+            # nginx ne lit pas s-maxage: X-Accel-Expires fixe la durée en cache (masqué au client)
+            headers.append((b"x-accel-expires", str(policy.s_maxage).encode()))
+            keys = [key.replace("{id}", item_id or "") for key in policy.keys]
+            headers.append((b"surrogate-key", " ".join(keys).encode()))
+
+        headers.append((b"vary", vary.encode()))
+        return headers
+
+
+# Purge asynchrone: un seul thread, les requêtes admin n'attendent pas nginx
+_purge_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-purge")
+
+
+def purge_paths(keys: Iterable[str], currencies: Iterable[str] = ()) -> List[str]:
+    """
+    URLs à rafraîchir pour des surrogate keys ("catalog", "tournament:<uuid>", ...),
+    avec les variantes ?currency= des URLs de CURRENCY_VARIANT_PATHS
+    """
+    currencies = list(currencies)
+    paths = []
+    for key in keys:
+        name, _, item_id = key.partition(":")
+        template = f"{name}:{{id}}" if item_id else name
+        for path in PURGE_PATHS.get(template, []):
+            url = path.replace("{id}", item_id)
+            paths.append(url)
+            if path in CURRENCY_VARIANT_PATHS:
+                paths.extend(f"{url}?currency={currency}" for currency in currencies)
+    return list(dict.fromkeys(paths))
+
+
+def _display_currencies() -> List[str]:
+    """
+    Devises connues (snapshot rechargé après une invalidation "fx"); aucune si la base est injoignable
+    """
+    try:
+        return sorted(fx_rates.snapshot().rates)
+    except Exception as exc:
+        print(f"⚠️ Devises indisponibles pour la purge: {exc}")
+        return []
+
+
+def _refresh_nginx(keys: List[str]) -> None:
+    """
+    Rafraîchir les entrées nginx: le serveur interne contourne le cache et réécrit l'entrée
+    """
+    time.sleep(CACHE_PURGE_DELAY_SECONDS)
+    for path in purge_paths(keys, _display_currencies()):
+        try:
+            urllib.request.urlopen(CACHE_PURGE_URL + path, timeout=5).read()
+        except Exception as exc:
+            print(f"⚠️ Purge cache {path} impossible: {exc}")
+
+
+def _apply_local(keys: Iterable[str]) -> None:
+    """
+    Invalider les caches applicatifs de ce worker
+    """
+    for key in keys:
+        if key.startswith("catalog"):
+            reference_cache.invalidate_catalog()
+        elif key.startswith("tournament"):
+            upcoming_feed.invalidate()
+        elif key == "fx":
+            fx_rates.invalidate()
+        elif key == "scoring":
+            scoring.invalidate()
+
+
+def _on_event(event_data: dict) -> None:
+    _apply_local(event_data.get("keys", []))
+
+
+def invalidate(db: Session, *keys: str) -> None:
+    """
+    Invalider des surrogate keys après une écriture admin (effectif au commit de l'appelant)
+
+    - NOTIFY cache_invalidations: chaque worker vide ses caches applicatifs
+    - puis rafraîchissement des URLs correspondantes dans le cache nginx
+    """
+    keys = list(keys)
+    notifications.notify(db, notifications.CACHE_INVALIDATIONS_CHANNEL, {"scope": "all", "keys": keys})
+
+    def apply():
+        _apply_local(keys)
+        if CACHE_PURGE_URL:
+            _purge_executor.submit(_refresh_nginx, keys)
+
+    # Abandonné si l'écriture admin est annulée (rollback)
+    after_commit(db, apply)
+
+
+def start() -> None:
+    """
+    Écouter les invalidations des autres workers (au démarrage de chaque worker)
+    """
+    notifications.hub.add_listener(notifications.CACHE_INVALIDATIONS_CHANNEL, _on_event)
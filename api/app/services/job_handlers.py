@@ -0,0 +1,213 @@
+"""
+Job Handlers - Effets de bord exécutés hors requête par le worker
+Chaque handler reçoit une session dédiée; le worker commit après succès
+"""
+import io
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.models import User, UserProfile, PaymentProof, TournamentRegistration, TokenRevocation
+from app.services import auth_service, delivery, jobs, mailer, notifications, partitions, proof_images, storage
+from app.services import payment_webhooks, proof_similarity, revenue_rollups
+from app.services import state_machine
+from app.services.jobs import job_handler
+from app.services.state_machine import ORDERS, ORDER_PAID, ORDER_PENDING
+
+
+@job_handler("auth.email_verification")
+def create_email_verification(db: Session, payload: dict) -> None:
+    """
+    Générer le token de vérification email d'un nouvel utilisateur et mettre l'email en file
+    """
+    user = db.query(User).filter(User.id == payload["user_id"]).first()
+    if user and not user.email_verified_at:
+        verification = auth_service.create_email_verification_token(db, user)
+        profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
+        mailer.queue_email(db, user.email, "verify_email", {
+            "display_name": profile.display_name if profile else None,
+            "link": f"{mailer.FRONTEND_URL}/verify-email?token={verification.token}",
+            "expires_hours": round((verification.expires_at - datetime.utcnow()).total_seconds() / 3600),
+        })
+
+
+@job_handler("auth.password_reset")
+def create_password_reset(db: Session, payload: dict) -> None:
+    """
+    Générer le token de réinitialisation de mot de passe et mettre l'email en file
+    """
+    password_reset = auth_service.create_password_reset_token(db, payload["email"])
+    if password_reset:
+        mailer.queue_email(db, payload["email"], "password_reset", {
+            "link": f"{mailer.FRONTEND_URL}/reset-password?token={password_reset.token}",
+            "expires_hours": max(1, round((password_reset.expires_at - datetime.utcnow()).total_seconds() / 3600)),
+        })
+
+
+@job_handler("payments.validated")
+def cascade_payment_validation(db: Session, payload: dict) -> None:
+    """
+    Propager la validation d'un paiement à la commande ou à l'inscription tournoi
+    """
+    payment = partitions.find_payment(db, payload["payment_id"])
+    if not payment:
+        return
+
+    # Paiement de commande: la commande passe à payée (une seule fois, même si le job est rejoué)
+    if payment.type == "order":
+        try:
+            ORDERS.transition(db, payment.target_id, ORDER_PAID, source=ORDER_PENDING)
+        except (state_machine.NotFound, state_machine.InvalidTransition, state_machine.StaleState) as exc:
+            print(f"⚠️ Commande {payment.target_id} non passée à payée: {exc}")
+        else:
+            order = partitions.find_order(db, payment.target_id)
+            notifications.notify_payment_status(db, order.user_id, "order", order.id, order.status)
+            # Recharge automatique par app.delivery_worker (si un fournisseur est configuré)
+            delivery.enqueue_delivery(db, order)
+
+    # Paiement de frais d'inscription: l'inscription passe à payée
+    if payment.type == "entry_fee":
+        # Seule une inscription non payée change (pas de réactivation d'une annulation)
+        registration = db.query(TournamentRegistration).filter(
+            TournamentRegistration.tournament_id == payment.target_id,
+            TournamentRegistration.user_id == payment.user_id,
+            TournamentRegistration.status == "registered"
+        ).first()
+        if registration:
+            registration.status = "paid"
+            registration.payment_id = payment.id
+            notifications.notify_payment_status(
+                db, registration.user_id, "registration", registration.id, registration.status
+            )
+
+
+@job_handler("payments.webhooks")
+def apply_payment_webhooks(db: Session, payload: dict) -> None:
+    """
+    Appliquer un lot de callbacks opérateurs (validation + cascade ensemblistes),
+    puis se replanifier si le lot était plein
+    """
+    summary = payment_webhooks.apply_pending(db)
+    if summary["events"]:
+        print(f"📨 Lot de {summary['events']} callbacks: {summary}")
+    if summary["events"] == payment_webhooks.APPLY_BATCH_SIZE:
+        payment_webhooks.schedule_apply(db)
+
+
+@job_handler("proofs.renditions")
+def generate_proof_renditions(db: Session, payload: dict) -> None:
+    """
+    Générer le rendu de revue et la miniature d'une preuve uploadée, puis l'indexer
+    par empreinte perceptuelle (signalement des quasi-doublons)
+
+    Les erreurs de stockage sont relancées (nouvelle tentative du worker); une
+    image illisible est marquée failed sans nouvelle tentative.
+    """
+    proof = db.query(PaymentProof).filter(PaymentProof.id == payload["proof_id"]).first()
+    if not proof or proof.renditions_status == "done":
+        return
+
+    if not proof.mime.startswith("image/"):
+        proof.renditions_status = "unsupported"
+        return
+
+    content = storage.get_object(proof.file_url)
+    if content is None:
+        proof.renditions_status = "failed"
+        return
+
+    try:
+        review, thumbnail, phash = proof_images.make_renditions(content)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        print(f"⚠️ Preuve {proof.id} illisible: {exc}")
+        proof.renditions_status = "failed"
+        return
+
+    prefix = proof.file_url.rsplit("/", 1)[0]
+    review_key = f"{prefix}/review.jpg"
+    thumbnail_key = f"{prefix}/thumbnail.jpg"
+    storage.put_object(review_key, review.data, "image/jpeg")
+    storage.put_object(thumbnail_key, thumbnail.data, "image/jpeg")
+
+    proof.rendition_url = review_key
+    proof.rendition_bytes = len(review.data)
+    proof.rendition_width = review.width
+    proof.rendition_height = review.height
+    proof.thumbnail_url = thumbnail_key
+    proof.thumbnail_bytes = len(thumbnail.data)
+    proof.renditions_status = "done"
+    proof_similarity.index_proof(db, proof, phash)
+
+
+# Preuves historiques indexées par exécution du job de rattrapage
+PHASH_BACKFILL_BATCH = 200
+
+
+@job_handler("proofs.phash_backfill")
+def backfill_proof_phash(db: Session, payload: dict) -> None:
+    """
+    Calculer l'empreinte des preuves images antérieures à l'indexation, des plus
+    anciennes aux plus récentes, puis se replanifier tant qu'il en reste
+
+    payload: {"after": created_at ISO de la dernière preuve traitée}
+    """
+    query = db.query(PaymentProof).filter(
+        PaymentProof.mime.like("image/%"),
+        PaymentProof.phash.is_(None)
+    )
+    if payload.get("after"):
+        query = query.filter(PaymentProof.created_at > datetime.fromisoformat(payload["after"]))
+    proofs = query.order_by(PaymentProof.created_at).limit(PHASH_BACKFILL_BATCH).all()
+
+    for proof in proofs:
+        # Le rendu de revue suffit (dHash insensible à la taille) et se lit plus vite
+        content = storage.get_object(proof.rendition_url or proof.file_url)
+        if content is None:
+            continue
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                image.draft("RGB", (proof_images.REVIEW_MAX_SIDE, proof_images.REVIEW_MAX_SIDE))
+                phash = proof_images.dhash(ImageOps.exif_transpose(image))
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+            print(f"⚠️ Preuve {proof.id} illisible: {exc}")
+            continue
+        proof_similarity.index_proof(db, proof, phash)
+        # Visible des recherches suivantes du même lot
+        db.flush()
+
+    if len(proofs) == PHASH_BACKFILL_BATCH:
+        jobs.enqueue(db, "proofs.phash_backfill", {"after": proofs[-1].created_at.isoformat()})
+
+
+@job_handler("maintenance.partitions")
+def maintain_partitions(db: Session, payload: dict) -> None:
+    """
+    Job quotidien: créer les partitions mensuelles futures puis se replanifier
+    """
+    partitions.ensure_future_partitions(db)
+    jobs.enqueue(db, "maintenance.partitions", run_at=datetime.utcnow() + timedelta(days=1))
+
+
+@job_handler("maintenance.token_revocations")
+def purge_token_revocations(db: Session, payload: dict) -> None:
+    """
+    Job quotidien: supprimer les révocations dont les tokens ont expiré puis se replanifier
+    """
+    db.query(TokenRevocation).filter(TokenRevocation.expires_at < datetime.utcnow()).delete()
+    jobs.enqueue(db, "maintenance.token_revocations", run_at=datetime.utcnow() + timedelta(days=1))
+
+
+@job_handler("analytics.revenue_rollup")
+def refresh_revenue_rollups(db: Session, payload: dict) -> None:
+    """
+    Job périodique: recalculer les jours de revenu touchés depuis le watermark puis se replanifier
+    """
+    revenue_rollups.refresh(db)
+    # Passages précédents: une ligne par minute dans jobs sinon
+    db.execute(text("DELETE FROM jobs WHERE kind = 'analytics.revenue_rollup' AND status = 'done'"))
+    jobs.enqueue(
+        db, "analytics.revenue_rollup",
+        run_at=datetime.utcnow() + timedelta(seconds=revenue_rollups.REFRESH_INTERVAL_SECONDS)
+    )
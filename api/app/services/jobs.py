@@ -0,0 +1,158 @@
+"""
+Jobs Service - File de tâches en arrière-plan adossée à PostgreSQL
+Les routers enfilent les jobs dans leur propre transaction, le worker (app.worker) les exécute
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, List, Optional
+from datetime import datetime
+
+from app.models import Job
+
+# Registre des handlers: kind -> fonction(db, payload)
+HANDLERS: Dict[str, Callable[[Session, dict], None]] = {}
+
+# Backoff exponentiel entre deux tentatives (secondes)
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+
+# Un job "running" depuis plus longtemps est considéré abandonné (worker tué)
+LEASE_SECONDS = 300
+
+
+def job_handler(kind: str):
+    """
+    Décorateur pour enregistrer le handler d'un type de job
+    """
+    def decorator(func: Callable[[Session, dict], None]):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    queue: str = "default",
+    run_at: Optional[datetime] = None,
+    max_attempts: int = 5
+) -> Job:
+    """
+    Enfiler un job dans la transaction de l'appelant (pas de commit ici)
+
+    Le job n'est visible par le worker qu'après le commit de l'appelant:
+    si la requête échoue et fait un rollback, le job disparaît avec elle.
+    """
+    job = Job(
+        queue=queue,
+        kind=kind,
+        payload=payload or {},
+        max_attempts=max_attempts
+    )
+    if run_at is not None:
+        job.run_at = run_at
+
+    db.add(job)
+    return job
+
+
+def claim_jobs(db: Session, worker_id: str, queue: str = "default", limit: int = 10) -> List[dict]:
+    """
+    Réserver jusqu'à `limit` jobs prêts sans bloquer les autres workers
+
+    Un job abandonné (bail expiré) est repris tant qu'il lui reste des tentatives;
+    au-delà il passe en 'failed' dans la même requête (handler qui tue le worker).
+    """
+    rows = db.execute(
+        text("""
+            WITH exhausted AS (
+                UPDATE jobs SET
+                    status = 'failed',
+                    locked_at = NULL,
+                    last_error = 'Bail expiré après ' || attempts || ' tentatives (worker arrêté pendant le job)',
+                    updated_at = now()
+                WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE queue = :queue
+                      AND status = 'running'
+                      AND locked_at < now() - make_interval(secs => :lease)
+                      AND attempts >= max_attempts
+                    FOR UPDATE SKIP LOCKED
+                )
+            )
+            UPDATE jobs SET
+                status = 'running',
+                attempts = attempts + 1,
+                locked_at = now(),
+                locked_by = :worker_id,
+                updated_at = now()
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE queue = :queue
+                  AND (
+                    (status = 'queued' AND run_at <= now())
+                    OR (
+                      status = 'running'
+                      AND locked_at < now() - make_interval(secs => :lease)
+                      AND attempts < max_attempts
+                    )
+                  )
+                ORDER BY run_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, kind, payload, attempts, max_attempts
+        """),
+        {"worker_id": worker_id, "queue": queue, "limit": limit, "lease": LEASE_SECONDS}
+    ).mappings().all()
+    db.commit()
+    return [dict(row) for row in rows]
+
+
+def mark_done(db: Session, job_id, worker_id: str) -> bool:
+    """
+    Marquer un job comme terminé (dans la transaction du handler)
+
+    Retourne False si le bail a été repris par un autre worker entre-temps:
+    l'appelant annule alors le travail du handler, refait par le nouveau détenteur.
+    """
+    result = db.execute(
+        text("""
+            UPDATE jobs SET status = 'done', locked_at = NULL, last_error = NULL, updated_at = now()
+            WHERE id = :id AND locked_by = :worker_id AND status = 'running'
+        """),
+        {"id": job_id, "worker_id": worker_id}
+    )
+    return result.rowcount == 1
+
+
+def mark_failed(db: Session, job: dict, error: str, worker_id: str) -> None:
+    """
+    Replanifier un job en échec avec backoff, ou l'abandonner après max_attempts
+    (sans effet si le bail a été repris par un autre worker)
+    """
+    if job["attempts"] >= job["max_attempts"]:
+        db.execute(
+            text("""
+                UPDATE jobs SET status = 'failed', locked_at = NULL, last_error = :error, updated_at = now()
+                WHERE id = :id AND locked_by = :worker_id AND status = 'running'
+            """),
+            {"id": job["id"], "error": error, "worker_id": worker_id}
+        )
+    else:
+        delay = min(RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1), RETRY_MAX_SECONDS)
+        db.execute(
+            text("""
+                UPDATE jobs SET
+                    status = 'queued',
+                    locked_at = NULL,
+                    locked_by = NULL,
+                    last_error = :error,
+                    run_at = now() + make_interval(secs => :delay),
+                    updated_at = now()
+                WHERE id = :id AND locked_by = :worker_id AND status = 'running'
+            """),
+            {"id": job["id"], "error": error, "delay": delay, "worker_id": worker_id}
+        )
+    db.commit()
@@ -0,0 +1,109 @@
+"""
+JWT Backends - Implémentations interchangeables de l'encodage / décodage JWT
+Sélection via la variable d'environnement JWT_BACKEND (jose par défaut)
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Type
+
+
+class TokenExpired(Exception):
+    """Signature valide mais token expiré"""
+
+
+class TokenInvalid(Exception):
+    """Token mal formé ou signature invalide"""
+
+
+class JWTBackend(ABC):
+    """
+    Interface commune des backends JWT
+    """
+    name = "base"
+
+    @abstractmethod
+    def encode(self, payload: dict, secret: str, algorithm: str) -> str:
+        """
+        Signer le payload
+        """
+
+    @abstractmethod
+    def decode(self, token: str, secret: str, algorithms: List[str]) -> dict:
+        """
+        Vérifier signature et expiration (TokenExpired / TokenInvalid sinon)
+        """
+
+
+class JoseBackend(JWTBackend):
+    """
+    python-jose (dépendance historique du projet)
+    """
+    name = "jose"
+
+    def __init__(self):
+        from jose import jwt, JWTError
+        self.jwt = jwt
+        self.error = JWTError
+
+    def encode(self, payload: dict, secret: str, algorithm: str) -> str:
+        return self.jwt.encode(payload, secret, algorithm=algorithm)
+
+    def decode(self, token: str, secret: str, algorithms: List[str]) -> dict:
+        try:
+            return self.jwt.decode(token, secret, algorithms=algorithms)
+        except self.jwt.ExpiredSignatureError:
+            raise TokenExpired()
+        except self.error:
+            raise TokenInvalid()
+
+
+class PyJWTBackend(JWTBackend):
+    """
+    PyJWT (optionnel: pip install PyJWT)
+    """
+    name = "pyjwt"
+
+    def __init__(self):
+        import jwt
+        self.jwt = jwt
+
+    def encode(self, payload: dict, secret: str, algorithm: str) -> str:
+        return self.jwt.encode(payload, secret, algorithm=algorithm)
+
+    def decode(self, token: str, secret: str, algorithms: List[str]) -> dict:
+        try:
+            return self.jwt.decode(token, secret, algorithms=algorithms)
+        except self.jwt.ExpiredSignatureError:
+            raise TokenExpired()
+        except self.jwt.InvalidTokenError:
+            raise TokenInvalid()
+
+
+BACKENDS: Dict[str, Type[JWTBackend]] = {
+    JoseBackend.name: JoseBackend,
+    PyJWTBackend.name: PyJWTBackend,
+}
+
+
+def get_backend(name: str = None) -> JWTBackend:
+    """
+    Instancier le backend demandé (JWT_BACKEND par défaut)
+    """
+    name = name or os.getenv("JWT_BACKEND", JoseBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f"Backend JWT inconnu: {name} (disponibles: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+def available_backends() -> List[str]:
+    """
+    Backends dont la bibliothèque est installée
+    """
+    available = []
+    for name, backend in BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            continue
+        available.append(name)
+    return available
@@ -0,0 +1,509 @@
+"""
+Leaderboard - Classement en direct des tournois
+Les résultats des matchs sont cumulés par joueur dans tournament_standings
+(révision croissante par mise à jour). Chaque worker garde en mémoire, par
+tournoi consulté, une skip list indexable triée par score: top N, rang d'un
+joueur et joueurs autour de lui en O(log n). Seuls les cumuls modifiés depuis la
+dernière lecture sont rechargés, sur NOTIFY leaderboard_updates.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Tournament
+from app.services import notifications, scoring
+
+# Classements gardés en mémoire par worker (les moins récemment consultés sont libérés)
+MAX_BOARDS = int(os.getenv("LEADERBOARD_MAX_BOARDS", "64"))
+
+# Vérification périodique des révisions, filet de sécurité si un NOTIFY est perdu (secondes)
+BOARD_TTL_SECONDS = float(os.getenv("LEADERBOARD_TTL", "30"))
+
+# Niveaux de la skip list: 2^20 joueurs par tournoi avant dégradation
+MAX_LEVELS = 20
+
+
+class _Last:
+    """
+    Clé de la sentinelle de fin, supérieure à toutes les autres
+    """
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * levels
+        # Nombre d'éléments franchis en suivant next[level]
+        self.width = [1] * levels
+
+
+class RankIndex:
+    """
+    Skip list indexable: insertion, suppression, rang et accès par position en
+    O(log n) en moyenne. Les clés sont uniques et comparables entre elles.
+    """
+
+    def __init__(self):
+        self.tail = _Node(_Last(), 0)
+        self.head = _Node(None, MAX_LEVELS)
+        self.head.next = [self.tail] * MAX_LEVELS
+        self.size = 0
+        self.random = random.Random()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _levels(self) -> int:
+        levels = 1
+        while levels < MAX_LEVELS and self.random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def insert(self, key) -> None:
+        chain = [self.head] * MAX_LEVELS
+        steps_at_level = [0] * MAX_LEVELS
+        node = self.head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._levels()
+        new = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key) -> None:
+        chain = [self.head] * MAX_LEVELS
+        node = self.head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is self.tail or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def bisect_left(self, key) -> int:
+        """
+        Nombre de clés strictement inférieures à `key`
+        """
+        node = self.head
+        position = 0
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def slice(self, start: int, count: int) -> list:
+        """
+        `count` clés à partir de la position `start` (0 = la plus petite)
+        """
+        if start >= self.size or count <= 0:
+            return []
+        node = self.head
+        remaining = start + 1
+        for level in reversed(range(MAX_LEVELS)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not self.tail and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Standing(NamedTuple):
+    """
+    Cumul d'un joueur dans un tournoi
+    """
+    user_id: str
+    display_name: Optional[str]
+    points: int
+    kills: int
+    wins: int
+    matches: int
+    best_placement: Optional[int]
+
+    @property
+    def score(self) -> Tuple[int, int, int]:
+        # Ordre croissant de la skip list = meilleur d'abord; égalité: victoires puis kills
+        return (-self.points, -self.wins, -self.kills)
+
+    @property
+    def key(self) -> tuple:
+        return self.score + (self.user_id,)
+
+
+class Leaderboard:
+    """
+    Classement d'un tournoi dans ce worker
+
+    - lock: protège la skip list (lectures et mises à jour, sections courtes)
+    - refresh_lock: un seul rechargement à la fois (single-flight)
+    """
+
+    def __init__(self, tournament_id: str):
+        self.tournament_id = tournament_id
+        self.index = RankIndex()
+        self.standings: Dict[str, Standing] = {}
+        self.revision = 0
+        self.loaded = False
+        self.stale = True
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def is_fresh(self) -> bool:
+        return self.loaded and not self.stale and time.time() - self.checked_at < BOARD_TTL_SECONDS
+
+    def refresh(self) -> None:
+        """
+        Appliquer les cumuls modifiés depuis la dernière révision lue (bloquant)
+
+        Lève LookupError si le tournoi n'existe pas.
+        """
+        with self.refresh_lock:
+            if self.is_fresh():
+                return
+            # Un NOTIFY reçu pendant la lecture remet stale à True
+            self.stale = False
+            checked_at = time.time()
+            try:
+                rows = self._load(self.revision)
+            except Exception:
+                self.stale = True
+                raise
+            with self.lock:
+                for row in rows:
+                    self._apply(row)
+            self.loaded = True
+            self.checked_at = checked_at
+
+    def _load(self, revision: int) -> list:
+        db = SessionLocal()
+        try:
+            if not self.loaded:
+                exists = db.execute(
+                    text("SELECT 1 FROM tournaments WHERE id = :tournament_id"),
+                    {"tournament_id": self.tournament_id}
+                ).first()
+                if exists is None:
+                    raise LookupError(self.tournament_id)
+            return db.execute(
+                text("""
+                    SELECT s.user_id, up.display_name, s.points, s.kills, s.wins, s.matches,
+                           s.best_placement, s.revision
+                    FROM tournament_standings s
+                    LEFT JOIN user_profiles up ON up.user_id = s.user_id
+                    WHERE s.tournament_id = :tournament_id AND s.revision > :revision
+                    ORDER BY s.revision
+                """),
+                {"tournament_id": self.tournament_id, "revision": revision}
+            ).all()
+        finally:
+            db.close()
+
+    def _apply(self, row) -> None:
+        user_id = str(row.user_id)
+        previous = self.standings.pop(user_id, None)
+        if previous is not None:
+            self.index.remove(previous.key)
+        # Joueur retiré de tous les matchs (résultats corrigés): sort du classement
+        if row.matches > 0:
+            standing = Standing(
+                user_id, row.display_name, row.points, row.kills, row.wins, row.matches, row.best_placement
+            )
+            self.standings[user_id] = standing
+            self.index.insert(standing.key)
+        self.revision = max(self.revision, row.revision)
+
+    def _ranked(self, start: int, keys: list) -> List[Tuple[int, Standing]]:
+        """
+        Rangs « compétition » (1, 2, 2, 4) d'une tranche commençant à la position `start`
+        """
+        entries = []
+        rank = 0
+        previous = None
+        for offset, key in enumerate(keys):
+            score = key[:3]
+            if score != previous:
+                # Premier de la tranche: des ex aequo peuvent le précéder
+                rank = start + offset + 1 if previous is not None else self.index.bisect_left(score) + 1
+                previous = score
+            entries.append((rank, self.standings[key[3]]))
+        return entries
+
+    def page(self, offset: int, limit: int) -> Tuple[int, List[Tuple[int, Standing]]]:
+        """
+        (nombre de joueurs classés, entrées [offset, offset + limit))
+        """
+        with self.lock:
+            return len(self.index), self._ranked(offset, self.index.slice(offset, limit))
+
+    def around(self, user_id: str, radius: int) -> Optional[Tuple[int, int, List[Tuple[int, Standing]]]]:
+        """
+        (rang du joueur, nombre de joueurs classés, `radius` joueurs de part et d'autre),
+        None si le joueur n'est pas classé
+        """
+        with self.lock:
+            standing = self.standings.get(str(user_id))
+            if standing is None:
+                return None
+            position = self.index.bisect_left(standing.key)
+            start = max(0, position - radius)
+            entries = self._ranked(start, self.index.slice(start, position - start + radius + 1))
+            rank = self.index.bisect_left(standing.score) + 1
+            return rank, len(self.index), entries
+
+
+_boards: "OrderedDict[str, Leaderboard]" = OrderedDict()
+_boards_lock = threading.Lock()
+
+
+def fresh_board(tournament_id) -> Optional[Leaderboard]:
+    """
+    Classement servable sans accès base, None s'il faut (re)charger (non bloquant)
+    """
+    board = _boards.get(str(tournament_id))
+    if board is not None and board.is_fresh():
+        return board
+    return None
+
+
+def get_board(tournament_id) -> Leaderboard:
+    """
+    Classement à jour du tournoi (bloquant, à exécuter hors de la boucle asyncio)
+
+    Lève LookupError si le tournoi n'existe pas.
+    """
+    key = str(tournament_id)
+    board = _boards.get(key)
+    if board is None:
+        # Chargé avant d'entrer dans le LRU: un id inconnu n'évince aucun classement
+        board = Leaderboard(key)
+        board.refresh()
+        with _boards_lock:
+            board = _boards.setdefault(key, board)
+            _boards.move_to_end(key)
+            while len(_boards) > MAX_BOARDS:
+                _boards.popitem(last=False)
+        return board
+
+    board.refresh()
+    with _boards_lock:
+        if key in _boards:
+            _boards.move_to_end(key)
+    return board
+
+
+def _on_event(event: dict) -> None:
+    board = _boards.get(str(event.get("tournament_id")))
+    if board is not None:
+        board.stale = True
+
+
+def _mark_all_stale() -> None:
+    # Après une reconnexion LISTEN: des mises à jour ont pu être manquées
+    for board in list(_boards.values()):
+        board.stale = True
+
+
+def start() -> None:
+    """
+    Écouter les mises à jour des classements (au démarrage de chaque worker)
+    """
+    notifications.hub.add_listener(notifications.LEADERBOARD_CHANNEL, _on_event, on_connect=_mark_all_stale)
+
+
+class MatchResult(NamedTuple):
+    user_id: str
+    placement: int
+    kills: int
+
+
+def unregistered_players(db: Session, tournament: Tournament, user_ids: Sequence) -> List[str]:
+    """
+    Joueurs sans inscription active au tournoi parmi `user_ids`
+    """
+    rows = db.execute(
+        text("""
+            SELECT u.user_id FROM unnest(CAST(:user_ids AS uuid[])) AS u(user_id)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM tournament_registrations r
+                WHERE r.tournament_id = :tournament_id AND r.user_id = u.user_id
+                  AND r.status IN ('registered', 'paid')
+            )
+        """),
+        {"tournament_id": tournament.id, "user_ids": [str(user_id) for user_id in user_ids]}
+    ).all()
+    return [str(row.user_id) for row in rows]
+
+
+def lock_standings(db: Session, tournament_id) -> None:
+    """
+    Sérialiser les écritures de résultats d'un tournoi (jusqu'au commit de l'appelant)
+
+    Les révisions d'un tournoi sont ainsi validées dans l'ordre: aucun worker ne
+    peut lire une révision plus récente avant une plus ancienne.
+    """
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+        {"key": f"leaderboard:{tournament_id}"}
+    )
+
+
+def update_standings(db: Session, tournament_id, user_ids: Sequence[str], event: Optional[dict] = None) -> None:
+    """
+    Recalculer les cumuls des joueurs concernés et prévenir les workers (au commit)
+    """
+    db.execute(
+        text("""
+            INSERT INTO tournament_standings
+                (tournament_id, user_id, points, kills, wins, matches, best_placement, revision, updated_at)
+            SELECT :tournament_id, u.user_id,
+                   coalesce(sum(r.points), 0), coalesce(sum(r.kills), 0),
+                   count(*) FILTER (WHERE r.placement = 1), count(r.match_id), min(r.placement),
+                   nextval('tournament_standings_revision_seq'), now()
+            FROM unnest(CAST(:user_ids AS uuid[])) AS u(user_id)
+            LEFT JOIN tournament_results r ON r.tournament_id = :tournament_id AND r.user_id = u.user_id
+            GROUP BY u.user_id
+            ON CONFLICT (tournament_id, user_id) DO UPDATE SET
+                points = EXCLUDED.points,
+                kills = EXCLUDED.kills,
+                wins = EXCLUDED.wins,
+                matches = EXCLUDED.matches,
+                best_placement = EXCLUDED.best_placement,
+                revision = EXCLUDED.revision,
+                updated_at = EXCLUDED.updated_at
+        """),
+        {"tournament_id": tournament_id, "user_ids": list(user_ids)}
+    )
+    notifications.notify(db, notifications.LEADERBOARD_CHANNEL, {
+        "tournament_id": str(tournament_id),
+        **(event or {}),
+    })
+
+
+def save_matches(db: Session, tournament_id, matches: Sequence[Tuple[int, int]], recorded_by=None) -> Dict[Tuple[int, int], str]:
+    """
+    Créer ou retoucher les matchs (match_no, room_no): id de chaque match
+    """
+    rows = db.execute(
+        text("""
+            INSERT INTO tournament_matches (tournament_id, match_no, room_no, recorded_by)
+            SELECT :tournament_id, v.match_no, v.room_no, :recorded_by
+            FROM unnest(CAST(:match_nos AS integer[]), CAST(:room_nos AS integer[])) AS v(match_no, room_no)
+            ON CONFLICT (tournament_id, match_no, room_no)
+            DO UPDATE SET recorded_by = EXCLUDED.recorded_by, updated_at = now()
+            RETURNING id, match_no, room_no
+        """),
+        {
+            "tournament_id": tournament_id,
+            "match_nos": [int(match_no) for match_no, _ in matches],
+            "room_nos": [int(room_no) for _, room_no in matches],
+            "recorded_by": recorded_by,
+        }
+    ).all()
+    return {(row.match_no, row.room_no): str(row.id) for row in rows}
+
+
+def clear_results(db: Session, match_ids: Sequence[str]) -> List[str]:
+    """
+    Supprimer les résultats précédents des matchs: joueurs dont le cumul change
+    """
+    return [
+        str(user_id) for user_id in db.execute(
+            text("DELETE FROM tournament_results WHERE match_id = ANY(CAST(:match_ids AS uuid[])) RETURNING user_id"),
+            {"match_ids": list(match_ids)}
+        ).scalars()
+    ]
+
+
+def record_match(
+    db: Session,
+    tournament: Tournament,
+    match_no: int,
+    room_no: int,
+    results: Sequence[MatchResult],
+    recorded_by=None
+) -> dict:
+    """
+    Enregistrer (ou corriger) les résultats d'un match, dans la transaction de l'appelant
+
+    Les résultats précédents du match sont remplacés; seuls les cumuls des joueurs
+    concernés (anciens et nouveaux) sont recalculés.
+    """
+    lock_standings(db, tournament.id)
+    match_id = save_matches(db, tournament.id, [(match_no, room_no)], recorded_by)[(match_no, room_no)]
+    previous = clear_results(db, [match_id])
+
+    points = scoring.score(
+        scoring.rule_for(tournament.mode),
+        [result.placement for result in results],
+        [result.kills for result in results]
+    )
+    db.execute(
+        text("""
+            INSERT INTO tournament_results (match_id, tournament_id, user_id, placement, kills, points)
+            SELECT :match_id, :tournament_id, v.user_id, v.placement, v.kills, v.points
+            FROM unnest(
+                CAST(:users AS uuid[]), CAST(:placements AS smallint[]),
+                CAST(:kills AS smallint[]), CAST(:points AS integer[])
+            ) AS v(user_id, placement, kills, points)
+        """),
+        {
+            "match_id": match_id,
+            "tournament_id": tournament.id,
+            "users": [str(result.user_id) for result in results],
+            "placements": [result.placement for result in results],
+            "kills": [result.kills for result in results],
+            "points": points.tolist(),
+        }
+    )
+
+    affected = sorted(set(previous) | {str(result.user_id) for result in results})
+    update_standings(db, tournament.id, affected, {"match_no": match_no, "room_no": room_no})
+
+    return {
+        "match_id": match_id,
+        "match_no": match_no,
+        "room_no": room_no,
+        "results": len(results),
+        "standings_updated": len(affected),
+    }
@@ -0,0 +1,130 @@
+"""
+Lifecycle Service - Préchauffage du worker et état de disponibilité (readiness)
+Le worker ne se déclare prêt qu'après avoir ouvert son pool de connexions, chargé
+les caches de référence et calibré bcrypt: les premières requêtes ne paient plus
+ces coûts.
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.services import auth_service, fx_rates, http_cache, leaderboard, partitions, reference_cache, revocation, upcoming_feed
+
+# Connexions ouvertes à l'avance dans le pool SQLAlchemy
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "5"))
+
+# Durée de validité du résultat de la sonde base de données (secondes)
+READY_PROBE_TTL_SECONDS = float(os.getenv("READY_PROBE_TTL", "2"))
+
+# Délai maximal de la sonde (ms), pour ne jamais bloquer l'orchestrateur
+READY_PROBE_TIMEOUT_MS = 1000
+
+
+class _State:
+    """
+    État du processus (un par worker)
+    """
+
+    def __init__(self):
+        self.warmed_up = False
+        self.shutting_down = False
+        self.started_at = time.time()
+        self.probe_ok = False
+        self.probe_error: Optional[str] = None
+        self.probe_checked_at = 0.0
+        self.probe_lock = threading.Lock()
+
+
+state = _State()
+
+
+def _step(name: str, func) -> None:
+    start = time.perf_counter()
+    try:
+        func()
+    except Exception as exc:
+        print(f"⚠️ Warmup {name} impossible: {exc}")
+        return
+    print(f"🔥 Warmup {name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def _open_pool() -> None:
+    """
+    Ouvrir plusieurs connexions en même temps puis les rendre au pool
+    """
+    size = min(WARMUP_CONNECTIONS, engine.pool.size())
+    connections = []
+    try:
+        for _ in range(size):
+            conn = engine.connect()
+            connections.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def warmup() -> None:
+    """
+    Préparer le worker (bloquant, à exécuter hors de la boucle asyncio)
+
+    Chaque étape est tolérante aux erreurs: une base indisponible au démarrage
+    laisse le worker non prêt (sonde en échec) sans l'empêcher de démarrer.
+    """
+    _step("pool", _open_pool)
+    _step("partitions", partitions.ensure_runway)
+    _step("caches", reference_cache.prime)
+    _step("taux de change", fx_rates.snapshot)
+    _step("flux tournois", upcoming_feed.get_feed)
+    _step("bcrypt", auth_service.calibrate_bcrypt)
+    _step("révocations", revocation.start)
+    _step("invalidations cache", http_cache.start)
+    _step("classements", leaderboard.start)
+    state.warmed_up = True
+
+
+def shutdown() -> None:
+    """
+    Sortir du load balancer puis libérer les ressources du worker
+    """
+    state.shutting_down = True
+    engine.dispose()
+
+
+def is_fresh_probe() -> bool:
+    """
+    Le dernier résultat de la sonde est-il encore valide (lecture sans I/O) ?
+    """
+    return time.time() - state.probe_checked_at < READY_PROBE_TTL_SECONDS
+
+
+def probe_database() -> bool:
+    """
+    Sonde base de données mise en cache READY_PROBE_TTL_SECONDS
+
+    Un seul thread exécute la sonde; les requêtes concurrentes réutilisent le
+    dernier résultat au lieu de s'empiler sur le pool.
+    """
+    if is_fresh_probe():
+        return state.probe_ok
+    if not state.probe_lock.acquire(blocking=False):
+        return state.probe_ok
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(f"SET LOCAL statement_timeout = {READY_PROBE_TIMEOUT_MS}"))
+            conn.execute(text("SELECT 1"))
+        state.probe_ok = True
+        state.probe_error = None
+    except Exception as exc:
+        state.probe_ok = False
+        state.probe_error = str(exc).splitlines()[0] if str(exc) else exc.__class__.__name__
+    finally:
+        state.probe_checked_at = time.time()
+        state.probe_lock.release()
+    return state.probe_ok
+
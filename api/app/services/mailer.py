@@ -0,0 +1,425 @@
+"""
+Mailer - Emails transactionnels (vérification d'adresse, réinitialisation de mot de passe)
+Les jobs rendent l'email (templates Jinja2 de app/templates/emails) et l'insèrent dans
+email_outbox, dans leur transaction: aucune requête HTTP n'attend le serveur SMTP.
+app.mail_worker réserve des lots et les envoie sur des connexions SMTP gardées
+ouvertes entre les lots (pool), puis enregistre tous les résultats du lot en quelques
+requêtes ensemblistes, avec backoff exponentiel pour les échecs transitoires.
+"""
+import math
+import os
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, TemplateNotFound, select_autoescape
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import EmailOutbox
+
+# Serveur SMTP (MailHog en développement, voir docker-compose.yml)
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_FROM = os.getenv("SMTP_FROM", "noreply@freefire-mvp.local")
+
+# Chiffrement: "starttls", "ssl" (port 465) ou vide (serveur local)
+SMTP_TLS = os.getenv("SMTP_TLS", "").lower()
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT", "10"))
+
+# Connexions SMTP ouvertes en parallèle par worker
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+
+# Messages envoyés sur une connexion avant de la renouveler (limite par session des serveurs)
+SMTP_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", "100"))
+
+# Une connexion inactive depuis plus longtemps est vérifiée (NOOP) avant réutilisation
+SMTP_IDLE_CHECK_SECONDS = 30
+
+# Une connexion inactive depuis plus longtemps est fermée (le serveur l'aurait coupée)
+SMTP_IDLE_CLOSE_SECONDS = 120
+
+# Application web (liens des emails)
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000").rstrip("/")
+
+# Backoff exponentiel entre deux tentatives (secondes)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Un email "sending" depuis plus longtemps que le bail est repris (worker arrêté
+# brutalement). Le bail couvre le pire cas d'un lot, voir lease_seconds.
+LEASE_MIN_SECONDS = 300
+LEASE_MARGIN_SECONDS = 60
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates" / "emails"
+
+SUBJECTS = {
+    "verify_email": "Confirmez votre adresse email",
+    "password_reset": "Réinitialisation de votre mot de passe",
+}
+
+
+class SendResult(NamedTuple):
+    """
+    Issue d'un envoi: sent, retry (transitoire) ou failed (refus définitif)
+    """
+    status: str
+    error: Optional[str] = None
+
+
+_environment: Optional[Environment] = None
+
+
+def templates() -> Environment:
+    global _environment
+    if _environment is None:
+        _environment = Environment(
+            loader=FileSystemLoader(str(TEMPLATES_DIR)),
+            autoescape=select_autoescape(["html"]),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+    return _environment
+
+
+def render(template: str, context: dict) -> Tuple[str, str, Optional[str]]:
+    """
+    (sujet, texte, html) d'un email; le HTML est facultatif
+    """
+    environment = templates()
+    context = {"frontend_url": FRONTEND_URL, **context}
+    body_text = environment.get_template(f"{template}.txt").render(context)
+    try:
+        body_html = environment.get_template(f"{template}.html").render(context)
+    except TemplateNotFound:
+        body_html = None
+    return SUBJECTS[template], body_text, body_html
+
+
+def queue_email(db: Session, to_address: str, template: str, context: dict) -> EmailOutbox:
+    """
+    Rendre et mettre en file un email (dans la transaction de l'appelant, pas de commit ici)
+    """
+    subject, body_text, body_html = render(template, context)
+    email = EmailOutbox(
+        template=template,
+        to_address=to_address,
+        subject=subject,
+        body_text=body_text,
+        body_html=body_html
+    )
+    db.add(email)
+    return email
+
+
+def build_message(email: dict) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = SMTP_FROM
+    message["To"] = email["to_address"]
+    message["Subject"] = email["subject"]
+    message["Date"] = formatdate(localtime=False)
+    message["Message-ID"] = make_msgid(idstring=str(email["id"]).replace("-", ""), domain=SMTP_FROM.rpartition("@")[2] or None)
+    message.set_content(email["body_text"])
+    if email.get("body_html"):
+        message.add_alternative(email["body_html"], subtype="html")
+    return message
+
+
+class _Connection:
+    __slots__ = ("smtp", "last_used", "sent")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPPool:
+    """
+    Connexions SMTP authentifiées gardées ouvertes entre les lots (une par thread d'envoi)
+    """
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self.size = size
+        self.idle: List[_Connection] = []
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _connect(self) -> _Connection:
+        if SMTP_TLS == "ssl":
+            smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+            if SMTP_TLS == "starttls":
+                smtp.starttls(context=ssl.create_default_context())
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        with self.lock:
+            self.opened += 1
+        return _Connection(smtp)
+
+    def acquire(self, fresh: bool = False) -> _Connection:
+        """
+        Connexion prête (réutilisée si possible, nouvelle si `fresh`);
+        lève OSError / SMTPException si le serveur est injoignable
+        """
+        if fresh:
+            return self._connect()
+        while True:
+            with self.lock:
+                connection = self.idle.pop() if self.idle else None
+            if connection is None:
+                return self._connect()
+            idle_for = time.monotonic() - connection.last_used
+            if idle_for > SMTP_IDLE_CLOSE_SECONDS:
+                self._close(connection)
+                continue
+            if idle_for > SMTP_IDLE_CHECK_SECONDS:
+                try:
+                    if connection.smtp.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP refusé")
+                except (smtplib.SMTPException, OSError):
+                    self._close(connection)
+                    continue
+            with self.lock:
+                self.reused += 1
+            return connection
+
+    def release(self, connection: _Connection, broken: bool = False) -> None:
+        if broken or connection.sent >= SMTP_MESSAGES_PER_CONNECTION:
+            self._close(connection)
+            return
+        connection.last_used = time.monotonic()
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(connection)
+                return
+        self._close(connection)
+
+    def _close(self, connection: _Connection) -> None:
+        try:
+            connection.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.smtp.close()
+
+    def close_idle(self, max_idle: float = SMTP_IDLE_CLOSE_SECONDS) -> None:
+        """
+        Fermer les connexions inactives (worker sans travail)
+        """
+        now = time.monotonic()
+        with self.lock:
+            expired = [c for c in self.idle if now - c.last_used > max_idle]
+            self.idle = [c for c in self.idle if now - c.last_used <= max_idle]
+        for connection in expired:
+            self._close(connection)
+
+    def close(self) -> None:
+        self.close_idle(max_idle=-1)
+
+
+def _classify(exc: Exception) -> Tuple[SendResult, bool]:
+    """
+    (résultat, connexion à abandonner) d'une exception d'envoi
+    """
+    error = f"{exc.__class__.__name__}: {exc}"[:1000]
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        permanent = bool(codes) and all(500 <= code < 600 for code in codes)
+        return SendResult("failed" if permanent else "retry", error), False
+    if isinstance(exc, smtplib.SMTPResponseException):
+        # 421: le serveur ferme la session; 4xx: transitoire; 5xx: refus définitif du message
+        broken = exc.smtp_code == 421
+        permanent = 500 <= exc.smtp_code < 600
+        return SendResult("failed" if permanent else "retry", error), broken
+    return SendResult("retry", error), True
+
+
+class Sender:
+    """
+    Envoi d'un lot: les messages sont répartis entre les connexions du pool et
+    envoyés à la suite sur chaque connexion (pas de poignée de main par message)
+    """
+
+    def __init__(self, pool_size: int = SMTP_POOL_SIZE):
+        self.pool = SMTPPool(pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="smtp")
+
+    def _send_chunk(self, chunk: List[dict]) -> List[Tuple[dict, SendResult]]:
+        results = []
+        connection = None
+        for index, email in enumerate(chunk):
+            message = build_message(email)
+            for attempt in (1, 2):
+                if connection is None:
+                    try:
+                        # Nouvel essai après une coupure: les autres connexions du pool sont suspectes
+                        connection = self.pool.acquire(fresh=attempt == 2)
+                    except OSError as exc:
+                        # Serveur injoignable: le reste du lot est replanifié sans autre tentative
+                        error = f"{exc.__class__.__name__}: {exc}"[:1000]
+                        results.extend((pending, SendResult("retry", error)) for pending in chunk[index:])
+                        return results
+                try:
+                    connection.smtp.send_message(message)
+                except OSError as exc:
+                    result, broken = _classify(exc)
+                    if broken:
+                        self.pool.release(connection, broken=True)
+                        connection = None
+                        # Connexion du pool coupée par le serveur: un nouvel essai immédiat
+                        if attempt == 1:
+                            continue
+                    results.append((email, result))
+                else:
+                    connection.sent += 1
+                    results.append((email, SendResult("sent")))
+                break
+            if connection is not None and connection.sent >= SMTP_MESSAGES_PER_CONNECTION:
+                self.pool.release(connection)
+                connection = None
+        if connection is not None:
+            self.pool.release(connection)
+        return results
+
+    def send_batch(self, batch: List[dict]) -> List[Tuple[dict, SendResult]]:
+        """
+        Envoyer le lot et retourner (email, résultat) pour chaque email
+        """
+        chunks = [batch[i::self.pool.size] for i in range(self.pool.size) if batch[i::self.pool.size]]
+        results = []
+        for chunk_results in self.executor.map(self._send_chunk, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+
+def lease_seconds(batch_size: int, pool_size: int = SMTP_POOL_SIZE) -> int:
+    """
+    Bail d'un lot: chaque connexion envoie batch / pool messages à la suite, chacun
+    pouvant attendre deux fois le timeout SMTP (envoi puis nouvel essai sur une
+    connexion neuve). Les workers partagent la même configuration: le bail d'un
+    worker est aussi celui qu'il applique aux emails abandonnés par les autres.
+    """
+    per_connection = math.ceil(batch_size / max(1, pool_size))
+    return max(LEASE_MIN_SECONDS, int(per_connection * 2 * SMTP_TIMEOUT_SECONDS) + LEASE_MARGIN_SECONDS)
+
+
+def claim_batch(db: Session, worker_id: str, limit: int, lease: int) -> List[dict]:
+    """
+    Réserver jusqu'à `limit` emails prêts sans bloquer les autres workers (bail: lease secondes)
+
+    Un email abandonné (bail expiré) est repris tant qu'il lui reste des tentatives;
+    au-delà il passe en 'failed' (pas de renvois répétés à chaque arrêt du worker).
+    """
+    rows = db.execute(
+        text("""
+            WITH exhausted AS (
+                UPDATE email_outbox SET
+                    status = 'failed',
+                    locked_at = NULL,
+                    last_error = 'Bail expiré après ' || attempts || ' tentatives',
+                    updated_at = now()
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE status = 'sending'
+                      AND locked_at < now() - make_interval(secs => :lease)
+                      AND attempts >= max_attempts
+                    FOR UPDATE SKIP LOCKED
+                )
+            )
+            UPDATE email_outbox SET
+                status = 'sending',
+                attempts = attempts + 1,
+                locked_at = now(),
+                locked_by = :worker_id,
+                updated_at = now()
+            WHERE id IN (
+                SELECT id FROM email_outbox
+                WHERE (status = 'queued' AND next_attempt_at <= now())
+                   OR (
+                     status = 'sending'
+                     AND locked_at < now() - make_interval(secs => :lease)
+                     AND attempts < max_attempts
+                   )
+                ORDER BY next_attempt_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, to_address, subject, body_text, body_html
+        """),
+        {"worker_id": worker_id, "limit": limit, "lease": lease}
+    ).mappings().all()
+    db.commit()
+    return [dict(row) for row in rows]
+
+
+def apply_results(db: Session, worker_id: str, results: List[Tuple[dict, SendResult]]) -> Dict[str, int]:
+    """
+    Enregistrer les résultats d'un lot: au plus trois requêtes quelle que soit sa taille
+
+    Seuls les emails encore réservés par ce worker sont mis à jour: un email repris par
+    un autre worker après expiration du bail garde l'état de sa nouvelle tentative.
+    """
+    sent = [email for email, result in results if result.status == "sent"]
+    retry = [(email, result) for email, result in results if result.status == "retry"]
+    failed = [(email, result) for email, result in results if result.status == "failed"]
+
+    if sent:
+        db.execute(
+            text("""
+                UPDATE email_outbox SET
+                    status = 'sent', sent_at = now(), locked_at = NULL, last_error = NULL, updated_at = now()
+                WHERE id = ANY(CAST(:ids AS uuid[])) AND status = 'sending' AND locked_by = :worker
+            """),
+            {"ids": [str(email["id"]) for email in sent], "worker": worker_id}
+        )
+
+    if retry:
+        db.execute(
+            text("""
+                UPDATE email_outbox e SET
+                    status = CASE WHEN e.attempts >= e.max_attempts THEN 'failed' ELSE 'queued' END,
+                    next_attempt_at = now() + make_interval(secs => LEAST(:base * power(2, e.attempts - 1), :max)),
+                    last_error = v.error, locked_at = NULL, locked_by = NULL, updated_at = now()
+                FROM unnest(CAST(:ids AS uuid[]), CAST(:errors AS text[])) AS v(id, error)
+                WHERE e.id = v.id AND e.status = 'sending' AND e.locked_by = :worker
+            """),
+            {
+                "worker": worker_id,
+                "ids": [str(email["id"]) for email, _ in retry],
+                "errors": [result.error for _, result in retry],
+                "base": RETRY_BASE_SECONDS,
+                "max": RETRY_MAX_SECONDS,
+            }
+        )
+
+    if failed:
+        db.execute(
+            text("""
+                UPDATE email_outbox e SET
+                    status = 'failed', last_error = v.error, locked_at = NULL, updated_at = now()
+                FROM unnest(CAST(:ids AS uuid[]), CAST(:errors AS text[])) AS v(id, error)
+                WHERE e.id = v.id AND e.status = 'sending' AND e.locked_by = :worker
+            """),
+            {
+                "worker": worker_id,
+                "ids": [str(email["id"]) for email, _ in failed],
+                "errors": [result.error for _, result in failed],
+            }
+        )
+
+    db.commit()
+    return {"sent": len(sent), "retry": len(retry), "failed": len(failed)}
@@ -0,0 +1,234 @@
+"""
+Notifications Service - Événements temps réel via PostgreSQL LISTEN/NOTIFY
+Les routers émettent NOTIFY dans leur transaction (livré au commit); chaque worker
+garde une seule connexion LISTEN et redistribue les événements aux abonnés SSE.
+"""
+import asyncio
+import json
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import psycopg2
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import DATABASE_URL
+
+# Canal des changements de statut paiements / commandes
+PAYMENT_EVENTS_CHANNEL = "payment_events"
+
+# Canal de la file de revue des paiements (diffusé à tous les admins connectés)
+REVIEW_EVENTS_CHANNEL = "review_events"
+
+# Canal de synchronisation des révocations de tokens entre workers
+TOKEN_REVOCATIONS_CHANNEL = "token_revocations"
+
+# Canal d'invalidation des caches applicatifs (catalogue, tournois) entre workers
+CACHE_INVALIDATIONS_CHANNEL = "cache_invalidations"
+
+# Canal des mises à jour de classement (résultats de match enregistrés)
+LEADERBOARD_CHANNEL = "leaderboard_updates"
+
+# Intervalle des commentaires keep-alive des flux SSE (secondes)
+SSE_HEARTBEAT_SECONDS = 15
+
+# Événements en attente par abonné avant d'ignorer les plus récents (client lent)
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def notify(db: Session, channel: str, event: dict) -> None:
+    """
+    Émettre un événement, envoyé aux écouteurs seulement au commit de la transaction
+    """
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": json.dumps(event, default=str)}
+    )
+
+
+def notify_many(db: Session, channel: str, events: List[dict]) -> None:
+    """
+    Émettre un lot d'événements en une seule requête (traitements de masse)
+    """
+    if not events:
+        return
+    db.execute(
+        text("SELECT pg_notify(:channel, e) FROM unnest(CAST(:events AS text[])) AS e"),
+        {"channel": channel, "events": [json.dumps(event, default=str) for event in events]}
+    )
+
+
+def notify_payment_status(db: Session, user_id, kind: str, target_id, status: str) -> None:
+    """
+    Changement de statut d'un paiement ou d'une commande pour son propriétaire
+    """
+    notify(db, PAYMENT_EVENTS_CHANNEL, {
+        "user_id": str(user_id),
+        "kind": kind,
+        "id": str(target_id),
+        "status": status,
+    })
+
+
+def notify_review(db: Session, action: str, payment_id, admin_id=None) -> None:
+    """
+    Changement dans la file de revue (claimed, released, validated, rejected, proof_uploaded)
+    """
+    notify(db, REVIEW_EVENTS_CHANNEL, {
+        "audience": "admins",
+        "action": action,
+        "payment_id": str(payment_id),
+        "admin_id": str(admin_id) if admin_id else None,
+    })
+
+
+class NotificationHub:
+    """
+    Connexion LISTEN unique par processus, diffusion vers les files asyncio des abonnés
+
+    Chaque canal déclare le champ de l'événement servant de clé de routage, par
+    exemple l'id de l'utilisateur propriétaire du paiement.
+    """
+
+    def __init__(self, channels: Dict[str, str]):
+        self.channels = channels
+        self.subscribers: Dict[Tuple[str, str], Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self.listeners: Dict[str, List[Tuple[Callable[[dict], None], Optional[Callable[[], None]]]]] = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, channel: str, key: str) -> asyncio.Queue:
+        """
+        S'abonner aux événements d'une clé sur un canal (à appeler depuis la boucle asyncio)
+        """
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        with self.lock:
+            self.subscribers.setdefault((channel, key), set()).add(entry)
+            self._ensure_started()
+        return queue
+
+    def unsubscribe(self, channel: str, key: str, queue: asyncio.Queue) -> None:
+        with self.lock:
+            entries = self.subscribers.get((channel, key), set())
+            for entry in [e for e in entries if e[1] is queue]:
+                entries.discard(entry)
+            if not entries:
+                self.subscribers.pop((channel, key), None)
+
+    def add_listener(
+        self,
+        channel: str,
+        callback: Callable[[dict], None],
+        on_connect: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        Enregistrer un callback synchrone (exécuté dans le thread d'écoute)
+
+        `on_connect` est appelé après chaque (re)connexion pour rattraper les
+        événements manqués pendant une coupure.
+        """
+        with self.lock:
+            self.listeners.setdefault(channel, []).append((callback, on_connect))
+            self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._listen_forever, name="pg-listen", daemon=True)
+            self.thread.start()
+
+    def _listen_forever(self) -> None:
+        """
+        Boucle du thread d'écoute, reconnexion automatique en cas de coupure
+        """
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(DATABASE_URL)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    for channel in self.channels:
+                        cursor.execute(f'LISTEN "{channel}"')
+
+                with self.lock:
+                    reloads = [on_connect for entries in self.listeners.values() for _, on_connect in entries if on_connect]
+                for reload in reloads:
+                    reload()
+
+                while True:
+                    if select.select([conn], [], [], 15) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        self._dispatch(notification.channel, notification.payload)
+            except Exception as exc:
+                print(f"⚠️ LISTEN interrompu: {exc}")
+                time.sleep(2)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+
+        key = str(event.get(self.channels.get(channel, "")))
+        with self.lock:
+            targets = list(self.subscribers.get((channel, key), ()))
+            callbacks = [callback for callback, _ in self.listeners.get(channel, ())]
+
+        for callback in callbacks:
+            callback(event)
+
+        for loop, queue in targets:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def _offer(queue: asyncio.Queue, event: dict) -> None:
+    # Un client trop lent perd des événements plutôt que de bloquer la diffusion
+    if not queue.full():
+        queue.put_nowait(event)
+
+
+hub = NotificationHub({
+    PAYMENT_EVENTS_CHANNEL: "user_id",
+    REVIEW_EVENTS_CHANNEL: "audience",
+    TOKEN_REVOCATIONS_CHANNEL: "user_id",
+    CACHE_INVALIDATIONS_CHANNEL: "scope",
+    LEADERBOARD_CHANNEL: "tournament_id",
+})
+
+
+def sse_response(request, channel: str, key: str, event_field: str) -> StreamingResponse:
+    """
+    Réponse Server-Sent Events pour les événements d'une clé sur un canal
+
+    - **event_field**: champ de l'événement utilisé comme nom d'événement SSE
+    """
+    queue = hub.subscribe(channel, key)
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Commentaire SSE: garde la connexion ouverte à travers les proxys
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event.get(event_field, 'message')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(channel, key, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
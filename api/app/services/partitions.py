@@ -0,0 +1,119 @@
+"""
+Partitions Service - Maintenance des partitions mensuelles de orders et payments
+et recherches ciblant une seule partition grâce aux tables de clés globales
+
+Usage: python -m app.services.partitions detach payments 2025-01
+"""
+import sys
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import SessionLocal, engine
+from app.models import Order, OrderKey, Payment, PaymentKey
+
+PARTITIONED_TABLES = ("orders", "payments")
+
+# Nombre de mois futurs pour lesquels les partitions doivent exister
+MONTHS_AHEAD = 3
+
+
+def ensure_future_partitions(db: Session, months_ahead: int = MONTHS_AHEAD) -> None:
+    """
+    Créer les partitions du mois courant et des `months_ahead` mois suivants
+    """
+    # Job quotidien et démarrage de plusieurs workers: un seul CREATE TABLE à la fois
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('maintenance.partitions'))"))
+    for table in PARTITIONED_TABLES:
+        db.execute(
+            text("SELECT ensure_monthly_partitions(:parent, now()::date, :months)"),
+            {"parent": table, "months": months_ahead}
+        )
+
+
+def ensure_runway() -> None:
+    """
+    Filet de sécurité au démarrage (warmup): partitions futures et job de maintenance
+
+    Sans partition DEFAULT, un INSERT hors des partitions existantes échoue: si le
+    job quotidien a épuisé ses tentatives ou a été supprimé, chaque démarrage
+    recrée les partitions et replanifie le job.
+    """
+    db = SessionLocal()
+    try:
+        ensure_future_partitions(db)
+        db.execute(text("""
+            INSERT INTO jobs (queue, kind, payload)
+            SELECT 'default', 'maintenance.partitions', '{}'::jsonb
+            WHERE NOT EXISTS (
+              SELECT 1 FROM jobs WHERE kind = 'maintenance.partitions' AND status IN ('queued','running')
+            )
+        """))
+        db.commit()
+    finally:
+        db.close()
+
+
+def detach_partition(table: str, month: str) -> str:
+    """
+    Détacher la partition d'un mois (YYYY-MM) sans bloquer les lectures/écritures
+
+    DETACH ... CONCURRENTLY ne peut pas s'exécuter dans une transaction:
+    on utilise une connexion en autocommit. La table détachée reste en base
+    (archivage / pg_dump puis DROP à la discrétion de l'opérateur).
+    """
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"Table non partitionnée: {table}")
+
+    year, mon = month.split("-")
+    partition = f"{table}_y{int(year):04d}m{int(mon):02d}"
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{partition}" CONCURRENTLY'))
+    return partition
+
+
+def find_order(db: Session, order_id) -> Optional[Order]:
+    """
+    Retrouver une commande par son id en ne lisant qu'une partition
+    """
+    key = db.query(OrderKey).filter(OrderKey.id == order_id).first()
+    if not key:
+        return None
+    return db.query(Order).filter(
+        Order.id == key.id,
+        Order.created_at == key.created_at
+    ).first()
+
+
+def find_order_by_code(db: Session, order_code: str) -> Optional[Order]:
+    """
+    Retrouver une commande par son code en ne lisant qu'une partition
+    """
+    key = db.query(OrderKey).filter(OrderKey.order_code == order_code).first()
+    if not key:
+        return None
+    return db.query(Order).filter(
+        Order.id == key.id,
+        Order.created_at == key.created_at
+    ).first()
+
+
+def find_payment(db: Session, payment_id) -> Optional[Payment]:
+    """
+    Retrouver un paiement par son id en ne lisant qu'une partition
+    """
+    key = db.query(PaymentKey).filter(PaymentKey.id == payment_id).first()
+    if not key:
+        return None
+    return db.query(Payment).filter(
+        Payment.id == key.id,
+        Payment.created_at == key.created_at
+    ).first()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "detach":
+        print("Usage: python -m app.services.partitions detach <orders|payments> <YYYY-MM>")
+        sys.exit(1)
+    print(f"Partition détachée: {detach_partition(sys.argv[2], sys.argv[3])}")
@@ -0,0 +1,504 @@
+"""
+Payment Providers - Registre des moyens de paiement et adaptateurs des opérateurs
+Le registre est construit une fois par worker: méthodes par pays précalculées pour
+/payments/methods. Les opérateurs avec API d'encaissement (MTN MoMo, Moov Money)
+ont chacun un client HTTP asynchrone poolé, avec timeouts, nouvelles tentatives,
+disjoncteur et latence mesurée par opération. Les services de transfert (Remitly,
+WorldRemit, ...) restent manuels: preuve uploadée puis revue admin.
+
+Configuration par opérateur: PAYMENT_<NOM>_URL (vide: encaissement désactivé),
+_API_KEY, _TIMEOUT, _RETRIES, _MAX_CONNECTIONS, _WEBHOOK_SECRET (vide: callbacks refusés).
+Serveur factice: python -m app.mock_providers
+"""
+import asyncio
+import bisect
+import hashlib
+import hmac
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+# Pays de l'Afrique de l'Ouest couverts par les opérateurs mobile money
+MTN_COUNTRIES = ("BJ", "CI", "TG", "BF", "ML", "NE", "SN", "GW", "NG")
+MOOV_COUNTRIES = ("BJ", "CI", "TG", "BF", "ML", "NE", "SN")
+
+# Écart maximal entre l'horodatage signé d'un callback et l'heure du serveur (rejeu)
+WEBHOOK_TOLERANCE_SECONDS = 300
+
+
+class ProviderError(Exception):
+    """Appel opérateur en échec après les nouvelles tentatives"""
+
+
+class CircuitOpen(ProviderError):
+    """Disjoncteur ouvert: l'opérateur n'est plus appelé pendant un moment"""
+
+
+class CollectionRequest(NamedTuple):
+    """
+    Demande d'encaissement (le payeur valide sur son téléphone)
+
+    payment_id sert de clé d'idempotence chez l'opérateur.
+    """
+    payment_id: str
+    reference: str
+    amount: str
+    currency: str
+    msisdn: str
+
+
+class CollectionStatus(NamedTuple):
+    """
+    État d'un encaissement: pending | successful | failed
+
+    amount / currency: montant encaissé, quand l'opérateur le renvoie.
+    """
+    status: str
+    provider_reference: Optional[str] = None
+    reason: Optional[str] = None
+    amount: Optional[str] = None
+    currency: Optional[str] = None
+
+
+class CallbackEvent(NamedTuple):
+    """
+    Callback d'encaissement d'un opérateur, normalisé
+
+    transaction_id: identifiant de l'opérateur, clé de dédoublonnage des renvois.
+    Le paiement est désigné par payment_id (clé d'idempotence envoyée) et/ou sa référence.
+    """
+    transaction_id: str
+    status: str
+    payment_id: Optional[str] = None
+    payment_reference: Optional[str] = None
+    amount: Optional[str] = None
+    currency: Optional[str] = None
+    msisdn: Optional[str] = None
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur: ouvert après `threshold` échecs consécutifs, un appel d'essai
+    (semi-ouvert) est autorisé après `reset_seconds`
+    """
+
+    def __init__(self, threshold: int = 5, reset_seconds: float = 30.0):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            # Échec en semi-ouvert: nouvelle période d'ouverture
+            self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    """
+    Histogramme de latence d'une opération (bornes en secondes, cumul par tranche)
+    """
+    BOUNDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+    def __init__(self):
+        self.buckets = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, ok: bool) -> None:
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if not ok:
+            self.errors += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Borne supérieure de la tranche contenant le quantile q
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float("inf") else None
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else None,
+            "p50_le_seconds": self.quantile(0.5),
+            "p95_le_seconds": self.quantile(0.95),
+            "p99_le_seconds": self.quantile(0.99),
+            "buckets": {
+                ("+Inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(self.BOUNDS, self.buckets)
+            },
+        }
+
+
+class PaymentProvider:
+    """
+    Moyen de paiement proposé aux utilisateurs (manuel par défaut: preuve + revue admin)
+    """
+    collects = False
+
+    def __init__(self, name: str, display_name: str, countries: Tuple[str, ...]):
+        self.name = name
+        self.display_name = display_name
+        self.countries = countries
+
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    async def start(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "display_name": self.display_name,
+            "countries": list(self.countries),
+            "collects": self.collects,
+            "enabled": self.enabled,
+        }
+
+
+class HttpPaymentProvider(PaymentProvider, ABC):
+    """
+    Opérateur avec API d'encaissement: client httpx poolé propre à l'opérateur
+
+    Chaque opérateur implémente request_to_pay, collection_status et parse_callback.
+    """
+    collects = True
+    timeout = 10.0
+    retries = 2
+    max_connections = 20
+    backoff_seconds = 0.2
+
+    def __init__(self, name: str, display_name: str, countries: Tuple[str, ...]):
+        super().__init__(name, display_name, countries)
+        prefix = f"PAYMENT_{name.upper()}_"
+        self.base_url = os.getenv(prefix + "URL", "").rstrip("/")
+        self.api_key = os.getenv(prefix + "API_KEY", "")
+        self.timeout = float(os.getenv(prefix + "TIMEOUT", self.timeout))
+        self.retries = int(os.getenv(prefix + "RETRIES", self.retries))
+        self.max_connections = int(os.getenv(prefix + "MAX_CONNECTIONS", self.max_connections))
+        self.webhook_secret = os.getenv(prefix + "WEBHOOK_SECRET", "")
+        self.breaker = CircuitBreaker(
+            threshold=int(os.getenv(prefix + "BREAKER_THRESHOLD", "5")),
+            reset_seconds=float(os.getenv(prefix + "BREAKER_RESET", "30"))
+        )
+        self.latency: Dict[str, LatencyStats] = {}
+        self.client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    async def start(self) -> None:
+        """
+        Ouvrir le pool de connexions (dans la boucle asyncio du worker)
+        """
+        if not self.enabled or self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.default_headers(),
+            timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 3.0)),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+        )
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def default_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    async def call(self, operation: str, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Appel avec nouvelles tentatives (timeouts, erreurs réseau, 429, 5xx) et disjoncteur
+
+        Les réponses 4xx (hors 429) sont retournées à l'adaptateur sans nouvelle tentative.
+        """
+        if self.client is None:
+            raise ProviderError(f"{self.name}: encaissement non configuré")
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name}: disjoncteur ouvert")
+
+        stats = self.latency.setdefault(operation, LatencyStats())
+        error = None
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except httpx.HTTPError as exc:
+                error = f"{exc.__class__.__name__}: {exc}"
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    stats.observe(time.perf_counter() - started, ok=True)
+                    self.breaker.record_success()
+                    return response
+                error = f"HTTP {response.status_code}"
+            stats.observe(time.perf_counter() - started, ok=False)
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff_seconds * 2 ** attempt)
+
+        self.breaker.record_failure()
+        raise ProviderError(f"{self.name} {operation}: {error}")
+
+    @abstractmethod
+    async def request_to_pay(self, request: CollectionRequest) -> CollectionStatus:
+        """
+        Demander l'encaissement (idempotent par payment_id)
+        """
+
+    @abstractmethod
+    async def collection_status(self, payment_id: str) -> CollectionStatus:
+        """
+        État de l'encaissement chez l'opérateur
+        """
+
+    def sign(self, body: bytes, timestamp: str) -> str:
+        """
+        Signature d'un callback: HMAC-SHA256 hexadécimal de "<timestamp>.<corps>"
+        """
+        message = timestamp.encode() + b"." + body
+        return hmac.new(self.webhook_secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def verify_signature(self, body: bytes, timestamp: Optional[str], signature: Optional[str]) -> bool:
+        """
+        Vérifier la signature et la fraîcheur d'un callback (comparaison à temps constant)
+        """
+        if not self.webhook_secret or not timestamp or not signature:
+            return False
+        try:
+            if abs(time.time() - int(timestamp)) > WEBHOOK_TOLERANCE_SECONDS:
+                return False
+        except ValueError:
+            return False
+        expected = self.sign(body, timestamp)
+        return hmac.compare_digest(expected, signature.removeprefix("sha256="))
+
+    @abstractmethod
+    def parse_callback(self, payload: dict) -> CallbackEvent:
+        """
+        Normaliser le corps d'un callback (ValueError si inexploitable)
+        """
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "webhooks": bool(self.webhook_secret),
+            "circuit": self.breaker.state,
+            "latency": {operation: stats.snapshot() for operation, stats in self.latency.items()},
+        }
+
+
+class MtnMomoProvider(HttpPaymentProvider):
+    """
+    MTN MoMo API, produit Collection (requesttopay)
+    """
+    target_environment = os.getenv("PAYMENT_MTN_MOMO_ENVIRONMENT", "sandbox")
+
+    def __init__(self):
+        super().__init__("mtn_momo", "MTN Mobile Money", MTN_COUNTRIES)
+
+    def default_headers(self) -> Dict[str, str]:
+        return {
+            **super().default_headers(),
+            "X-Target-Environment": self.target_environment,
+            "Ocp-Apim-Subscription-Key": os.getenv("PAYMENT_MTN_MOMO_SUBSCRIPTION_KEY", ""),
+        }
+
+    async def request_to_pay(self, request: CollectionRequest) -> CollectionStatus:
+        response = await self.call(
+            "request_to_pay", "POST", "/collection/v1_0/requesttopay",
+            headers={"X-Reference-Id": request.payment_id},
+            json={
+                "amount": request.amount,
+                "currency": request.currency,
+                "externalId": request.reference,
+                "payer": {"partyIdType": "MSISDN", "partyId": request.msisdn.lstrip("+")},
+                "payerMessage": f"Paiement {request.reference}",
+                "payeeNote": request.reference,
+            }
+        )
+        # 409: demande déjà créée avec ce X-Reference-Id (nouvel essai du client)
+        if response.status_code in (202, 409):
+            return CollectionStatus("pending")
+        return CollectionStatus("failed", reason=f"HTTP {response.status_code}: {response.text[:200]}")
+
+    async def collection_status(self, payment_id: str) -> CollectionStatus:
+        response = await self.call("status", "GET", f"/collection/v1_0/requesttopay/{payment_id}")
+        if response.status_code == 404:
+            return CollectionStatus("failed", reason="Demande inconnue de l'opérateur")
+        data = response.json()
+        status = {"SUCCESSFUL": "successful", "FAILED": "failed"}.get(data.get("status"), "pending")
+        return CollectionStatus(
+            status, data.get("financialTransactionId"), data.get("reason"),
+            amount=data.get("amount"), currency=data.get("currency")
+        )
+
+    def parse_callback(self, payload: dict) -> CallbackEvent:
+        # Le callback reprend le corps de GET requesttopay; referenceId = X-Reference-Id envoyé
+        payment_id = payload.get("referenceId")
+        reference = payload.get("externalId")
+        if not payment_id and not reference:
+            raise ValueError("referenceId ou externalId manquant")
+        status = {"SUCCESSFUL": "successful", "FAILED": "failed"}.get(payload.get("status"), "pending")
+        # Pas de financialTransactionId sur un échec: un seul échec retenu par demande
+        transaction_id = payload.get("financialTransactionId") or f"{payment_id or reference}:{status}"
+        return CallbackEvent(
+            transaction_id=str(transaction_id),
+            status=status,
+            payment_id=payment_id,
+            payment_reference=reference,
+            amount=payload.get("amount"),
+            currency=payload.get("currency"),
+            msisdn=(payload.get("payer") or {}).get("partyId")
+        )
+
+
+class MoovMoneyProvider(HttpPaymentProvider):
+    """
+    Moov Money (Flooz), API marchand de paiement
+    """
+
+    def __init__(self):
+        super().__init__("moov_money", "Moov Money", MOOV_COUNTRIES)
+
+    async def request_to_pay(self, request: CollectionRequest) -> CollectionStatus:
+        response = await self.call(
+            "request_to_pay", "POST", "/v1/payments",
+            json={
+                "reference": request.payment_id,
+                "amount": request.amount,
+                "currency": request.currency,
+                "msisdn": request.msisdn,
+                "description": f"Paiement {request.reference}",
+            }
+        )
+        if response.status_code in (200, 201, 202, 409):
+            return CollectionStatus("pending")
+        return CollectionStatus("failed", reason=f"HTTP {response.status_code}: {response.text[:200]}")
+
+    async def collection_status(self, payment_id: str) -> CollectionStatus:
+        response = await self.call("status", "GET", f"/v1/payments/{payment_id}")
+        if response.status_code == 404:
+            return CollectionStatus("failed", reason="Transaction inconnue de l'opérateur")
+        data = response.json()
+        status = {"SUCCESS": "successful", "FAILED": "failed", "CANCELLED": "failed"}.get(
+            str(data.get("status", "")).upper(), "pending"
+        )
+        return CollectionStatus(
+            status, data.get("transaction_id"), data.get("message"),
+            amount=data.get("amount"), currency=data.get("currency")
+        )
+
+    def parse_callback(self, payload: dict) -> CallbackEvent:
+        # reference = identifiant du paiement envoyé à la création
+        payment_id = payload.get("reference")
+        if not payment_id:
+            raise ValueError("reference manquante")
+        status = {"SUCCESS": "successful", "FAILED": "failed", "CANCELLED": "failed"}.get(
+            str(payload.get("status", "")).upper(), "pending"
+        )
+        transaction_id = payload.get("transaction_id") or f"{payment_id}:{status}"
+        return CallbackEvent(
+            transaction_id=str(transaction_id),
+            status=status,
+            payment_id=payment_id,
+            amount=payload.get("amount"),
+            currency=payload.get("currency"),
+            msisdn=payload.get("msisdn")
+        )
+
+
+def build_providers() -> List[PaymentProvider]:
+    """
+    Moyens de paiement dans l'ordre d'affichage
+    """
+    return [
+        MtnMomoProvider(),
+        MoovMoneyProvider(),
+        PaymentProvider("remitly", "Remitly", ("FR",)),
+        PaymentProvider("worldremit", "WorldRemit", ("FR",)),
+        PaymentProvider("western_union", "Western Union", ("FR",)),
+        PaymentProvider("ria", "RIA Money Transfer", ("FR",)),
+        PaymentProvider("moneygram", "MoneyGram", ("FR",)),
+        PaymentProvider("taptap_send", "Taptap Send", ("FR",)),
+    ]
+
+
+class ProviderRegistry:
+    """
+    Moyens de paiement par nom et listes par pays, précalculées à la construction
+    """
+
+    def __init__(self, providers: List[PaymentProvider]):
+        self.providers: Dict[str, PaymentProvider] = {provider.name: provider for provider in providers}
+        methods: Dict[str, List[Dict[str, str]]] = {}
+        for provider in providers:
+            for country in provider.countries:
+                methods.setdefault(country, []).append({"id": provider.name, "name": provider.display_name})
+        self.methods_by_country: Dict[str, Tuple[Dict[str, str], ...]] = {
+            country: tuple(entries) for country, entries in methods.items()
+        }
+
+    def get(self, name: str) -> Optional[PaymentProvider]:
+        return self.providers.get(name)
+
+    def methods(self, country: str) -> Optional[Tuple[Dict[str, str], ...]]:
+        return self.methods_by_country.get(country)
+
+    def supports(self, country: str, method: str) -> bool:
+        provider = self.providers.get(method)
+        return provider is not None and country in provider.countries
+
+    async def start(self) -> None:
+        for provider in self.providers.values():
+            await provider.start()
+
+    async def aclose(self) -> None:
+        for provider in self.providers.values():
+            await provider.aclose()
+
+    def stats(self) -> List[dict]:
+        return [provider.stats() for provider in self.providers.values()]
+
+
+registry = ProviderRegistry(build_providers())
@@ -0,0 +1,68 @@
+"""
+Payment Targets - Montant dû pour la cible d'un paiement (commande, inscription)
+Le montant d'un paiement est déclaré par le client au checkout: ce n'est pas le prix.
+Le checkout et chaque validation automatique (rapprochement de relevé, encaissement
+opérateur, callbacks) le comparent au prix de la cible converti en XOF: total de la
+commande, frais d'inscription du tournoi.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def round_xof(amount) -> Decimal:
+    """
+    Montant XOF entier (pas de centimes en franc CFA)
+    """
+    return Decimal(amount).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+
+
+def expected_amounts_xof(db: Session, targets: Iterable[Tuple[str, object]]) -> Dict[str, Decimal]:
+    """
+    Montant dû en XOF par cible (type, target_id), en une requête
+
+    Clés: str(target_id). Les cibles introuvables, les tournois sans frais et les
+    devises sans taux sont absents: aucun paiement ne peut les valider automatiquement.
+    """
+    order_ids, tournament_ids = set(), set()
+    for payment_type, target_id in targets:
+        if payment_type == "order":
+            order_ids.add(str(target_id))
+        elif payment_type == "entry_fee":
+            tournament_ids.add(str(target_id))
+    if not order_ids and not tournament_ids:
+        return {}
+
+    rows = db.execute(
+        text("""
+            SELECT o.id AS target_id, o.total_amount * r.xof_per_unit AS amount_xof
+            FROM order_keys k
+            JOIN orders o ON o.id = k.id AND o.created_at = k.created_at
+            JOIN fx_rates r ON r.currency = o.currency
+            WHERE k.id = ANY(CAST(:order_ids AS uuid[]))
+            UNION ALL
+            SELECT t.id, f.amount * r.xof_per_unit
+            FROM tournaments t
+            JOIN entry_fees f ON f.id = t.entry_fee_id
+            JOIN fx_rates r ON r.currency = f.currency
+            WHERE t.id = ANY(CAST(:tournament_ids AS uuid[]))
+        """),
+        {"order_ids": list(order_ids), "tournament_ids": list(tournament_ids)}
+    ).all()
+    return {str(row.target_id): round_xof(row.amount_xof) for row in rows}
+
+
+def expected_amount_xof(db: Session, payment_type: str, target_id) -> Optional[Decimal]:
+    """
+    Montant dû en XOF pour une cible (None: introuvable ou sans montant)
+    """
+    return expected_amounts_xof(db, [(payment_type, target_id)]).get(str(target_id))
+
+
+def amount_matches(expected: Optional[Decimal], amount_xof) -> bool:
+    """
+    Le montant XOF du paiement couvre-t-il exactement le prix de sa cible ?
+    """
+    return expected is not None and amount_xof is not None and round_xof(amount_xof) == expected
@@ -0,0 +1,478 @@
+"""
+Payment Webhooks - Callbacks d'encaissement des opérateurs (MTN MoMo, Moov Money)
+Réception (API): signature vérifiée, callback normalisé puis écrit dans
+payment_webhook_events avec ceux reçus au même moment (un INSERT et un commit par
+lot, voir WebhookBuffer). Le renvoi d'une même transaction est ignoré par la
+contrainte unique (opérateur, transaction). La réponse 200 part après le commit.
+
+Application (worker, job payments.webhooks): les événements en attente sont réservés
+par lots (SKIP LOCKED), rapprochés des paiements en une requête, puis les paiements
+confirmés sont validés en une requête ensembliste avec la cascade vers les commandes
+et les inscriptions, dans la même transaction. Un callback ne valide que si le montant
+encaissé est celui du paiement et si ce montant couvre le prix de la cible (total de
+la commande, frais d'inscription); un callback sans montant part en revue admin.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.services import delivery, notifications, payment_targets
+from app.services.payment_providers import CallbackEvent
+from app.services.reconciliation import parse_amount
+from app.services.state_machine import ORDERS, ORDER_PAID, PAYMENTS, PAYMENT_REVIEWABLE, PAYMENT_VALIDATED
+
+# Commit groupé côté API: un lot part dès qu'il est plein ou après ce délai
+FLUSH_MAX_EVENTS = 500
+FLUSH_MAX_DELAY_SECONDS = 0.01
+
+# Événements appliqués par job (et par transaction)
+APPLY_BATCH_SIZE = 1000
+
+# Un paiement modifié entre lecture et validation est retenté au lot suivant
+MAX_APPLY_ATTEMPTS = 5
+RETRY_DELAY_SECONDS = 5
+
+# Issues d'un événement (colonne outcome)
+OUTCOME_VALIDATED = "validated"
+OUTCOME_ALREADY_VALIDATED = "already_validated"
+OUTCOME_DUPLICATE = "duplicate"
+OUTCOME_FAILED = "failed"
+OUTCOME_PENDING = "pending"
+OUTCOME_UNKNOWN_PAYMENT = "unknown_payment"
+OUTCOME_METHOD_MISMATCH = "method_mismatch"
+OUTCOME_AMOUNT_MISMATCH = "amount_mismatch"
+OUTCOME_NEEDS_REVIEW = "needs_review"
+OUTCOME_NOT_REVIEWABLE = "not_reviewable"
+OUTCOME_CONFLICT = "conflict"
+
+# Issues signalées aux admins: argent encaissé qui ne valide pas le paiement
+ANOMALIES = frozenset((OUTCOME_AMOUNT_MISMATCH, OUTCOME_NEEDS_REVIEW, OUTCOME_NOT_REVIEWABLE, OUTCOME_CONFLICT))
+
+# Montant maximal d'une colonne NUMERIC(12,2)
+MAX_AMOUNT = Decimal("9999999999.99")
+
+
+class ReceivedEvent(NamedTuple):
+    """
+    Callback normalisé, prêt à être enregistré (longueurs bornées aux colonnes)
+    """
+    provider: str
+    transaction_id: str
+    status: str
+    payment_id: Optional[str]
+    payment_reference: Optional[str]
+    amount: Optional[Decimal]
+    currency: Optional[str]
+    msisdn: Optional[str]
+    payload: str
+
+
+def _clip(value, length: int) -> Optional[str]:
+    return str(value)[:length] if value not in (None, "") else None
+
+
+def received_event(provider: str, event: CallbackEvent, payload: dict) -> ReceivedEvent:
+    """
+    Normaliser un callback parsé par l'opérateur (ValueError si le paiement n'est pas désigné)
+    """
+    payment_id = None
+    if event.payment_id:
+        try:
+            payment_id = str(uuid.UUID(str(event.payment_id)))
+        except ValueError:
+            pass
+    reference = _clip(event.payment_reference, 40)
+    if payment_id is None and reference is None:
+        raise ValueError("Paiement non désigné")
+    transaction_id = _clip(event.transaction_id, 120)
+    if transaction_id is None:
+        raise ValueError("Transaction non identifiée")
+
+    amount = parse_amount(str(event.amount)) if event.amount is not None else None
+    if amount is not None and (not amount.is_finite() or abs(amount) > MAX_AMOUNT):
+        amount = None
+
+    return ReceivedEvent(
+        provider=provider,
+        transaction_id=transaction_id,
+        status=event.status,
+        payment_id=payment_id,
+        payment_reference=reference,
+        amount=amount,
+        currency=_clip(event.currency, 3),
+        msisdn=_clip(event.msisdn, 32),
+        payload=json.dumps(payload, default=str)
+    )
+
+
+def schedule_apply(db: Session, run_at: Optional[datetime] = None) -> None:
+    """
+    Planifier le job d'application s'il n'y en a pas déjà un en file (dans la transaction de l'appelant)
+    """
+    db.execute(
+        text("""
+            INSERT INTO jobs (queue, kind, payload, run_at)
+            SELECT 'default', 'payments.webhooks', '{}'::jsonb, COALESCE(CAST(:run_at AS timestamptz), now())
+            WHERE NOT EXISTS (
+                SELECT 1 FROM jobs WHERE kind = 'payments.webhooks' AND status = 'queued'
+            )
+        """),
+        {"run_at": run_at}
+    )
+
+
+def record_events(events: List[ReceivedEvent]) -> List[bool]:
+    """
+    Enregistrer un lot de callbacks en un INSERT et un commit
+
+    Retourne, pour chaque callback, True s'il est nouveau (False: renvoi déjà enregistré).
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("""
+                INSERT INTO payment_webhook_events
+                    (provider, transaction_id, payment_id, payment_reference, status, amount, currency, msisdn, payload)
+                SELECT v.provider, v.transaction_id, v.payment_id, v.payment_reference, v.status,
+                       v.amount, v.currency, v.msisdn, CAST(v.payload AS jsonb)
+                FROM unnest(
+                    CAST(:providers AS text[]), CAST(:transactions AS text[]), CAST(:payment_ids AS uuid[]),
+                    CAST(:references AS text[]), CAST(:statuses AS text[]), CAST(:amounts AS numeric[]),
+                    CAST(:currencies AS text[]), CAST(:msisdns AS text[]), CAST(:payloads AS text[])
+                ) AS v(provider, transaction_id, payment_id, payment_reference, status, amount, currency, msisdn, payload)
+                ON CONFLICT (provider, transaction_id) DO NOTHING
+                RETURNING provider, transaction_id
+            """),
+            {
+                "providers": [event.provider for event in events],
+                "transactions": [event.transaction_id for event in events],
+                "payment_ids": [event.payment_id for event in events],
+                "references": [event.payment_reference for event in events],
+                "statuses": [event.status for event in events],
+                "amounts": [event.amount for event in events],
+                "currencies": [event.currency for event in events],
+                "msisdns": [event.msisdn for event in events],
+                "payloads": [event.payload for event in events],
+            }
+        ).all()
+        if rows:
+            schedule_apply(db)
+        db.commit()
+    finally:
+        db.close()
+
+    # Doublons dans un même lot: seule la première occurrence est nouvelle
+    inserted = {(row.provider, row.transaction_id) for row in rows}
+    result = []
+    for event in events:
+        key = (event.provider, event.transaction_id)
+        result.append(key in inserted)
+        inserted.discard(key)
+    return result
+
+
+class WebhookBuffer:
+    """
+    Callbacks reçus par ce worker en attente d'écriture (commit groupé)
+
+    Chaque requête attend le commit de son lot avant de répondre: un callback
+    acquitté est durable, mais les callbacks simultanés partagent un INSERT et un
+    commit au lieu d'une transaction chacun.
+    """
+
+    def __init__(self, max_events: int = FLUSH_MAX_EVENTS, max_delay: float = FLUSH_MAX_DELAY_SECONDS):
+        self.max_events = max_events
+        self.max_delay = max_delay
+        self.pending: List[Tuple[ReceivedEvent, asyncio.Future]] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.recorded = 0
+        self.duplicates = 0
+
+    async def start(self) -> None:
+        """
+        Démarrer l'écrivain (dans la boucle asyncio du worker)
+        """
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def submit(self, event: ReceivedEvent) -> bool:
+        """
+        Enregistrer un callback avec le lot en cours; True s'il est nouveau
+        """
+        if self.task is None:
+            # Hors lifespan (scripts): écriture directe
+            return (await run_in_threadpool(record_events, [event]))[0]
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((event, future))
+        if len(self.pending) == 1 or len(self.pending) >= self.max_events:
+            self.wakeup.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self.wakeup.wait()
+            if len(self.pending) < self.max_events:
+                # Laisser les requêtes simultanées rejoindre le lot
+                await asyncio.sleep(self.max_delay)
+            self.wakeup.clear()
+            batch, self.pending = self.pending[:self.max_events], self.pending[self.max_events:]
+            if self.pending:
+                self.wakeup.set()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[ReceivedEvent, asyncio.Future]]) -> None:
+        if not batch:
+            return
+        try:
+            created = await run_in_threadpool(record_events, [event for event, _ in batch])
+        except Exception as exc:
+            print(f"⚠️ Callbacks non enregistrés ({len(batch)}): {exc}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        self.flushes += 1
+        self.recorded += sum(created)
+        self.duplicates += len(created) - sum(created)
+        for (_, future), is_new in zip(batch, created):
+            if not future.done():
+                future.set_result(is_new)
+
+    async def aclose(self) -> None:
+        """
+        Arrêter l'écrivain après avoir écrit les callbacks encore en attente
+        """
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        batch, self.pending = self.pending, []
+        await self._flush(batch)
+
+    def stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "recorded": self.recorded,
+            "duplicates": self.duplicates,
+            "pending": len(self.pending),
+        }
+
+
+buffer = WebhookBuffer()
+
+
+def _resolve_payments(db: Session, events: List[dict]) -> Tuple[Dict, Dict]:
+    """
+    Paiements visés par un lot d'événements, en une requête (par id et par référence)
+    """
+    ids = list({str(event["payment_id"]) for event in events if event["payment_id"]})
+    references = list({event["payment_reference"] for event in events if event["payment_reference"]})
+    rows = db.execute(
+        text("""
+            SELECT p.id, p.reference, p.created_at, p.version, p.status, p.type, p.target_id,
+                   p.user_id, p.method, p.amount, p.currency, p.amount_xof
+            FROM payment_keys k
+            JOIN payments p ON p.id = k.id AND p.created_at = k.created_at
+            WHERE k.id = ANY(CAST(:ids AS uuid[])) OR k.reference = ANY(CAST(:references AS text[]))
+        """),
+        {"ids": ids, "references": references}
+    ).mappings().all()
+    by_id = {row["id"]: dict(row) for row in rows}
+    by_reference = {row["reference"]: by_id[row["id"]] for row in rows}
+    return by_id, by_reference
+
+
+def _classify(event: dict, payment: Optional[dict], selected: Dict, expected: Dict[str, Decimal]) -> Optional[str]:
+    """
+    Issue d'un événement, None si le paiement est à valider
+
+    expected: montant dû en XOF par cible (payment_targets.expected_amounts_xof).
+    """
+    if payment is None:
+        return OUTCOME_UNKNOWN_PAYMENT
+    if payment["method"] != event["provider"]:
+        return OUTCOME_METHOD_MISMATCH
+    if event["status"] == "failed":
+        return OUTCOME_FAILED
+    if event["status"] != "successful":
+        return OUTCOME_PENDING
+    if payment["id"] in selected:
+        return OUTCOME_DUPLICATE
+    if payment["status"] == PAYMENT_VALIDATED:
+        return OUTCOME_ALREADY_VALIDATED
+    if payment["status"] not in PAYMENT_REVIEWABLE:
+        return OUTCOME_NOT_REVIEWABLE
+    if event["amount"] is None:
+        return OUTCOME_NEEDS_REVIEW
+    if event["amount"] != payment["amount"]:
+        return OUTCOME_AMOUNT_MISMATCH
+    if event["currency"] and event["currency"] != payment["currency"]:
+        return OUTCOME_AMOUNT_MISMATCH
+    # Le montant du paiement est déclaré par le client: il doit couvrir le prix de la cible
+    if not payment_targets.amount_matches(expected.get(str(payment["target_id"])), payment["amount_xof"]):
+        return OUTCOME_AMOUNT_MISMATCH
+    return None
+
+
+def cascade_validations(db: Session, payments: List[dict]) -> dict:
+    """
+    Propager un lot de paiements validés aux commandes et aux inscriptions, en
+    requêtes ensemblistes (équivalent du job payments.validated pour un lot)
+
+    Comme ORDERS.transition_many, seules les inscriptions encore non payées
+    ('registered') changent: un callback tardif ne réactive pas une inscription annulée.
+    """
+    order_payments = [payment for payment in payments if payment["type"] == "order"]
+    fee_payments = [payment for payment in payments if payment["type"] == "entry_fee"]
+
+    orders = []
+    if order_payments:
+        keys = db.execute(
+            text("SELECT id, created_at FROM order_keys WHERE id = ANY(CAST(:ids AS uuid[]))"),
+            {"ids": [str(payment["target_id"]) for payment in order_payments]}
+        ).all()
+        orders = ORDERS.transition_many(db, [(key.id, key.created_at, None) for key in keys], ORDER_PAID)
+        delivery.enqueue_orders(db, orders)
+
+    registrations = []
+    if fee_payments:
+        registrations = db.execute(
+            text("""
+                UPDATE tournament_registrations r SET status = 'paid', payment_id = v.payment_id
+                FROM unnest(
+                    CAST(:tournaments AS uuid[]), CAST(:users AS uuid[]), CAST(:payments AS uuid[])
+                ) AS v(tournament_id, user_id, payment_id)
+                WHERE r.tournament_id = v.tournament_id AND r.user_id = v.user_id
+                  AND r.status = 'registered'
+                RETURNING r.id, r.user_id, r.status
+            """),
+            {
+                "tournaments": [str(payment["target_id"]) for payment in fee_payments],
+                "users": [str(payment["user_id"]) for payment in fee_payments],
+                "payments": [str(payment["id"]) for payment in fee_payments],
+            }
+        ).mappings().all()
+
+    notifications.notify_many(db, notifications.PAYMENT_EVENTS_CHANNEL, [
+        {"user_id": str(row["user_id"]), "kind": "order", "id": str(row["id"]), "status": row["status"]}
+        for row in orders
+    ] + [
+        {"user_id": str(row["user_id"]), "kind": "registration", "id": str(row["id"]), "status": row["status"]}
+        for row in registrations
+    ])
+    return {"orders": len(orders), "registrations": len(registrations)}
+
+
+def apply_pending(db: Session, limit: int = APPLY_BATCH_SIZE) -> dict:
+    """
+    Appliquer un lot d'événements en attente (dans la transaction du job)
+
+    Retourne le résumé du lot: events (réservés), outcomes par issue, retry (événements
+    laissés en attente après un conflit), orders / registrations passées à payées.
+    """
+    events = [dict(row) for row in db.execute(
+        text("""
+            SELECT id, provider, payment_id, payment_reference, status, amount, currency, attempts
+            FROM payment_webhook_events
+            WHERE processed_at IS NULL
+            ORDER BY id
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        """),
+        {"limit": limit}
+    ).mappings().all()]
+    if not events:
+        return {"events": 0, "outcomes": {}, "retry": 0, "orders": 0, "registrations": 0}
+
+    by_id, by_reference = _resolve_payments(db, events)
+    expected = payment_targets.expected_amounts_xof(
+        db, [(payment["type"], payment["target_id"]) for payment in by_id.values()]
+    )
+    outcomes: Dict[int, Optional[str]] = {}
+    resolved: Dict[int, Optional[uuid.UUID]] = {}
+    selected: Dict[uuid.UUID, dict] = {}
+    for event in events:
+        payment = by_id.get(event["payment_id"]) or by_reference.get(event["payment_reference"])
+        resolved[event["id"]] = payment["id"] if payment else None
+        outcome = _classify(event, payment, selected, expected)
+        if outcome is None:
+            selected[payment["id"]] = event
+            outcome = OUTCOME_VALIDATED
+        outcomes[event["id"]] = outcome
+
+    # Une seule requête pour tout le lot; le callback de l'opérateur vaut validation,
+    # y compris si un admin examinait la preuve (réservation levée)
+    updated = PAYMENTS.transition_many(
+        db,
+        [(payment_id, by_id[payment_id]["created_at"], by_id[payment_id]["version"]) for payment_id in selected],
+        PAYMENT_VALIDATED,
+        values={"claimed_by": "NULL", "claim_expires_at": "NULL"}
+    )
+    updated_ids = {row["id"] for row in updated}
+
+    retry = 0
+    for payment_id, event in selected.items():
+        if payment_id not in updated_ids:
+            # Modifié entre lecture et validation (admin, GET /collect): retenté au lot suivant
+            if event["attempts"] + 1 >= MAX_APPLY_ATTEMPTS:
+                outcomes[event["id"]] = OUTCOME_CONFLICT
+            else:
+                outcomes[event["id"]] = None
+                retry += 1
+
+    cascade = cascade_validations(db, updated)
+    notifications.notify_many(db, notifications.PAYMENT_EVENTS_CHANNEL, [
+        {"user_id": str(row["user_id"]), "kind": "payment", "id": str(row["id"]), "status": row["status"]}
+        for row in updated
+    ])
+    notifications.notify_many(db, notifications.REVIEW_EVENTS_CHANNEL, [
+        {"audience": "admins", "action": "validated", "payment_id": str(row["id"]), "admin_id": None}
+        for row in updated
+    ] + [
+        {"audience": "admins", "action": "webhook_anomaly", "payment_id": str(resolved[event_id]),
+         "admin_id": None, "outcome": outcome}
+        for event_id, outcome in outcomes.items() if outcome in ANOMALIES
+    ])
+
+    db.execute(
+        text("""
+            UPDATE payment_webhook_events e SET
+                attempts = e.attempts + 1,
+                processed_at = CASE WHEN v.outcome IS NULL THEN NULL ELSE now() END,
+                outcome = v.outcome,
+                payment_id = COALESCE(e.payment_id, v.payment_id)
+            FROM unnest(
+                CAST(:ids AS bigint[]), CAST(:outcomes AS text[]), CAST(:payment_ids AS uuid[])
+            ) AS v(id, outcome, payment_id)
+            WHERE e.id = v.id
+        """),
+        {
+            "ids": list(outcomes),
+            "outcomes": list(outcomes.values()),
+            "payment_ids": [str(resolved[event_id]) if resolved[event_id] else None for event_id in outcomes],
+        }
+    )
+    if retry:
+        schedule_apply(db, run_at=datetime.utcnow() + timedelta(seconds=RETRY_DELAY_SECONDS))
+
+    counts: Dict[str, int] = {}
+    for outcome in outcomes.values():
+        if outcome is not None:
+            counts[outcome] = counts.get(outcome, 0) + 1
+    return {"events": len(events), "outcomes": counts, "retry": retry, **cascade}
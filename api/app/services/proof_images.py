@@ -0,0 +1,105 @@
+"""
+Proof Images - Réduction des preuves de paiement pour la revue admin
+Les captures d'écran plein format (jusqu'à 5 MB) sont ré-encodées en JPEG à taille
+bornée: un rendu de revue lisible et une miniature pour la liste. Une empreinte
+perceptuelle (dHash 64 bits) est calculée au passage pour repérer les captures
+recadrées ou recompressées déjà utilisées.
+"""
+import io
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+# Rendu de revue: texte d'une capture mobile lisible, poids borné
+REVIEW_MAX_SIDE = 1280
+REVIEW_MAX_BYTES = 250 * 1024
+
+# Miniature de la liste des paiements en attente
+THUMBNAIL_MAX_SIDE = 240
+THUMBNAIL_MAX_BYTES = 24 * 1024
+
+# Qualités JPEG essayées dans l'ordre jusqu'à passer sous la limite de poids
+QUALITY_STEPS = (82, 72, 62, 50, 40)
+
+# Refuser les images décompressées démesurées (bombe de décompression)
+Image.MAX_IMAGE_PIXELS = 40_000_000
+
+
+# dHash: comparaison des pixels voisins d'une vignette 9x8 en niveaux de gris
+HASH_SIZE = 8
+
+
+class Rendition(NamedTuple):
+    data: bytes
+    width: int
+    height: int
+
+
+class Renditions(NamedTuple):
+    review: Rendition
+    thumbnail: Rendition
+    phash: int
+
+
+def _encode(image: Image.Image, max_bytes: int) -> bytes:
+    """
+    Encoder en JPEG progressif en baissant la qualité, puis la taille, jusqu'à max_bytes
+    """
+    while True:
+        for quality in QUALITY_STEPS:
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue()
+        if max(image.size) <= 64:
+            return buffer.getvalue()
+        image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+
+
+def _downscale(source: Image.Image, max_side: int, max_bytes: int) -> Rendition:
+    image = source.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    data = _encode(image, max_bytes)
+    width, height = Image.open(io.BytesIO(data)).size
+    return Rendition(data, width, height)
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    Empreinte perceptuelle 64 bits (non signée): stable au redimensionnement et à la
+    recompression, quelques bits de différence pour un léger recadrage
+    """
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def make_renditions(content: bytes) -> Renditions:
+    """
+    Produire (rendu de revue, miniature, empreinte) à partir de l'image originale
+
+    L'orientation EXIF est appliquée puis les métadonnées sont supprimées;
+    la transparence est aplatie sur fond blanc.
+    """
+    with Image.open(io.BytesIO(content)) as original:
+        original.seek(0)  # GIF animé: première image
+        # JPEG: décodage directement à l'échelle réduite (1/2, 1/4, 1/8) au lieu du plein format
+        original.draft("RGB", (REVIEW_MAX_SIDE, REVIEW_MAX_SIDE))
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        review = _downscale(image, REVIEW_MAX_SIDE, REVIEW_MAX_BYTES)
+        thumbnail = _downscale(image, THUMBNAIL_MAX_SIDE, THUMBNAIL_MAX_BYTES)
+        phash = dhash(image)
+    return Renditions(review, thumbnail, phash)
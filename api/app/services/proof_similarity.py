@@ -0,0 +1,128 @@
+"""
+Proof Similarity - Détection des preuves de paiement quasi identiques
+Le SHA-256 ne repère que les ré-uploads à l'octet près; l'empreinte perceptuelle
+(dHash, voir proof_images) repère aussi les captures recadrées ou recompressées.
+
+Index: hachage multi-index. L'empreinte 64 bits est découpée en 4 bandes de 16 bits,
+chacune indexée (B-tree). Deux empreintes à distance de Hamming <= k ont au moins une
+bande à distance <= k // 4 (principe des tiroirs): on énumère les voisins de chaque
+bande, on lit les quelques candidats par index puis on filtre sur la distance exacte.
+Le coût dépend du nombre de candidats, pas du nombre total de preuves.
+"""
+import itertools
+import os
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import PaymentProof
+from app.services import notifications
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Distance de Hamming (sur 64 bits) en dessous de laquelle deux preuves sont suspectes
+DUPLICATE_DISTANCE = int(os.getenv("PROOF_DUPLICATE_DISTANCE", "6"))
+
+# Distance maximale acceptée par la recherche (au-delà, trop de voisins par bande)
+MAX_SEARCH_DISTANCE = 11
+
+
+def to_signed(phash: int) -> int:
+    """
+    Empreinte non signée -> BIGINT PostgreSQL
+    """
+    return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+
+def bands(phash: int) -> List[int]:
+    """
+    Découpage de l'empreinte (non signée) en bandes de 16 bits, poids fort en premier
+    """
+    return [(phash >> (BAND_BITS * (BANDS - 1 - i))) & BAND_MASK for i in range(BANDS)]
+
+
+def _neighbors(value: int, radius: int) -> List[int]:
+    """
+    Valeurs d'une bande à distance de Hamming <= radius (17 pour 1, 137 pour 2)
+    """
+    result = [value]
+    for distance in range(1, radius + 1):
+        for bits in itertools.combinations(range(BAND_BITS), distance):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            result.append(flipped)
+    return result
+
+
+def find_similar(
+    db: Session,
+    phash: int,
+    max_distance: int = DUPLICATE_DISTANCE,
+    exclude_proof_id=None,
+    exclude_payment_id=None,
+    limit: int = 20
+) -> List[dict]:
+    """
+    Preuves à distance <= max_distance de l'empreinte, les plus proches d'abord
+    """
+    radius = max_distance // BANDS
+    params = {
+        "phash": to_signed(phash),
+        "max_distance": max_distance,
+        "proof_id": exclude_proof_id,
+        "payment_id": exclude_payment_id,
+        "limit": limit,
+    }
+    conditions = []
+    for i, band in enumerate(bands(phash)):
+        params[f"b{i}"] = _neighbors(band, radius)
+        conditions.append(f"phash_b{i} = ANY(:b{i})")
+
+    rows = db.execute(
+        text(f"""
+            SELECT id, payment_id, created_at, distance FROM (
+                SELECT id, payment_id, created_at,
+                       bit_count(CAST(phash # :phash AS bit(64))) AS distance
+                FROM payment_proofs
+                WHERE ({" OR ".join(conditions)})
+                  AND (CAST(:proof_id AS uuid) IS NULL OR id <> CAST(:proof_id AS uuid))
+                  AND (CAST(:payment_id AS uuid) IS NULL OR payment_id <> CAST(:payment_id AS uuid))
+            ) candidates
+            WHERE distance <= :max_distance
+            ORDER BY distance, created_at
+            LIMIT :limit
+        """),
+        params
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def index_proof(db: Session, proof: PaymentProof, phash: int) -> Optional[dict]:
+    """
+    Enregistrer l'empreinte d'une preuve et la rapprocher des preuves antérieures
+
+    Les autres preuves du même paiement sont ignorées (preuve complémentaire légitime).
+    Retourne la preuve antérieure la plus proche si elle est suspecte.
+    """
+    proof.phash = to_signed(phash)
+    proof.phash_b0, proof.phash_b1, proof.phash_b2, proof.phash_b3 = bands(phash)
+
+    matches = [
+        match for match in find_similar(
+            db, phash, exclude_proof_id=proof.id, exclude_payment_id=proof.payment_id, limit=5
+        )
+        if proof.created_at is None or match["created_at"] <= proof.created_at
+    ]
+    if not matches:
+        return None
+
+    closest = matches[0]
+    proof.near_duplicate_of = closest["id"]
+    proof.near_duplicate_distance = closest["distance"]
+    notifications.notify_review(db, "duplicate_suspected", proof.payment_id)
+    print(f"🔁 Preuve {proof.id} proche de {closest['id']} (distance {closest['distance']})")
+    return closest
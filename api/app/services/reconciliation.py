@@ -0,0 +1,355 @@
+"""
+Reconciliation Service - Rapprochement des relevés opérateurs (MTN MoMo, Moov Money)
+Le relevé CSV est lu ligne à ligne (mémoire bornée quelle que soit sa taille) et
+comparé à un index en mémoire des paiements de la fenêtre, construit en une requête.
+Les correspondances exactes (référence, montant, numéro) sont validées par lots via
+la machine à états, après contrôle du montant XOF contre le prix de la cible (le
+montant du paiement est déclaré par le client); les écarts sont écrits dans un rapport CSV.
+"""
+import csv
+import io
+import itertools
+import tempfile
+import time
+import unicodedata
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services import jobs, notifications, payment_targets, storage
+from app.services.state_machine import PAYMENTS, PAYMENT_REVIEWABLE, PAYMENT_VALIDATED
+
+# En-têtes reconnus par champ, dans l'ordre de préférence (normalisés: minuscules, sans accents)
+STATEMENT_FORMATS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "mtn_momo": {
+        "reference": ("external transaction id", "external id", "reference", "message", "note"),
+        "amount": ("amount", "montant"),
+        "msisdn": ("from", "from msisdn", "msisdn", "payer"),
+        "status": ("status", "statut"),
+        "transaction_id": ("financial transaction id", "id", "transaction id"),
+    },
+    "moov_money": {
+        "reference": ("reference", "ref", "motif", "message", "description"),
+        "amount": ("montant", "amount"),
+        "msisdn": ("msisdn", "numero", "expediteur", "sender", "from"),
+        "status": ("statut", "etat", "status"),
+        "transaction_id": ("transaction id", "id transaction", "txn id", "id"),
+    },
+}
+
+# Statuts opérateur d'une transaction aboutie (les autres lignes sont ignorées)
+SUCCESS_STATUSES = frozenset(("successful", "success", "succes", "completed", "reussi", "valide", "ok"))
+
+# Paiements validés par requête (et par commit)
+BATCH_SIZE = 1000
+
+# Écarts renvoyés directement dans la réponse (le rapport complet est stocké)
+SAMPLE_SIZE = 50
+
+# Les numéros sont comparés sur leurs derniers chiffres (indicatif pays et préfixes variables)
+MSISDN_SUFFIX_DIGITS = 8
+
+# Un paiement réservé par un admin (bail actif) n'est pas validé automatiquement
+CLAIM_GUARD = "claimed_by IS NULL OR claim_expires_at < now()"
+
+REPORT_COLUMNS = ("line", "kind", "reference", "transaction_id", "amount", "msisdn", "payment_id", "detail")
+
+
+class IndexedPayment(NamedTuple):
+    id: object
+    created_at: datetime
+    version: int
+    status: str
+    amount: Decimal
+    msisdn: Optional[str]
+    type: str
+    target_id: object
+    amount_xof: Optional[Decimal]
+
+
+class StatementRow(NamedTuple):
+    line: int
+    reference: str
+    amount: Optional[Decimal]
+    msisdn: Optional[str]
+    status: Optional[str]
+    transaction_id: Optional[str]
+
+
+def _normalize_header(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode()
+    return " ".join(value.lower().replace("_", " ").split())
+
+
+def normalize_reference(value: str) -> str:
+    return "".join(value.split()).upper()
+
+
+def msisdn_key(value: Optional[str]) -> Optional[str]:
+    """
+    Derniers chiffres d'un numéro (+229 01 97 00 00 00 == 0197000000 == 97000000)
+    """
+    if not value:
+        return None
+    digits = "".join(c for c in value if c.isdigit())
+    return digits[-MSISDN_SUFFIX_DIGITS:] if len(digits) >= MSISDN_SUFFIX_DIGITS else None
+
+
+def parse_amount(value: str) -> Optional[Decimal]:
+    """
+    Montant d'un relevé: "1 500", "1500.00", "1,500", "1.500,00"
+    """
+    value = value.replace(" ", "").replace("\u00a0", "").replace("\u202f", "")
+    if not value:
+        return None
+    if "," in value and "." in value:
+        # Le dernier séparateur est le séparateur décimal
+        if value.rfind(",") > value.rfind("."):
+            value = value.replace(".", "").replace(",", ".")
+        else:
+            value = value.replace(",", "")
+    elif "," in value:
+        whole, _, fraction = value.rpartition(",")
+        value = value.replace(",", "") if len(fraction) == 3 else f"{whole.replace(',', '')}.{fraction}"
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+def iter_statement(stream: BinaryIO, operator: str) -> Iterator[StatementRow]:
+    """
+    Lire un relevé ligne à ligne (séparateur détecté: virgule, point-virgule, tabulation)
+
+    Lève ValueError si les colonnes référence / montant sont introuvables.
+    """
+    aliases = STATEMENT_FORMATS[operator]
+    reader_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    header_line = reader_stream.readline()
+    if not header_line.strip():
+        raise ValueError("Relevé vide")
+    try:
+        dialect = csv.Sniffer().sniff(header_line, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.reader(itertools.chain([header_line], reader_stream), dialect)
+    headers = [_normalize_header(h) for h in next(reader)]
+
+    positions: Dict[str, Optional[int]] = {}
+    for field, names in aliases.items():
+        positions[field] = next((headers.index(name) for name in names if name in headers), None)
+    missing = [field for field in ("reference", "amount") if positions[field] is None]
+    if missing:
+        raise ValueError(f"Colonnes introuvables dans le relevé {operator}: {', '.join(missing)}")
+
+    def cell(row: List[str], field: str) -> Optional[str]:
+        position = positions[field]
+        if position is None or position >= len(row):
+            return None
+        return row[position].strip() or None
+
+    for line, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        status = cell(row, "status")
+        yield StatementRow(
+            line=line,
+            reference=normalize_reference(cell(row, "reference") or ""),
+            amount=parse_amount(cell(row, "amount") or ""),
+            msisdn=cell(row, "msisdn"),
+            status=_normalize_header(status) if status else None,
+            transaction_id=cell(row, "transaction_id"),
+        )
+
+
+def build_index(db: Session, method: str, days: int) -> Dict[str, IndexedPayment]:
+    """
+    Paiements de la méthode sur la fenêtre, indexés par référence (une requête)
+    """
+    rows = db.execute(
+        text("""
+            SELECT p.id, p.created_at, p.version, p.status, p.reference, p.amount,
+                   p.type, p.target_id, p.amount_xof,
+                   COALESCE(p.payer_msisdn, up.phone_msisdn) AS msisdn
+            FROM payments p
+            LEFT JOIN user_profiles up ON up.user_id = p.user_id
+            WHERE p.method = :method
+              AND p.created_at >= now() - make_interval(days => :days)
+        """),
+        {"method": method, "days": days}
+    )
+    return {
+        normalize_reference(row.reference): IndexedPayment(
+            row.id, row.created_at, row.version, row.status, row.amount, msisdn_key(row.msisdn),
+            row.type, row.target_id, row.amount_xof
+        )
+        for row in rows
+    }
+
+
+class Reconciliation:
+    """
+    Un passage sur un relevé: classement des lignes, validations par lots, rapport d'écarts
+    """
+
+    def __init__(self, db: Session, operator: str, days: int = 7, dry_run: bool = False):
+        if operator not in STATEMENT_FORMATS:
+            raise ValueError(f"Opérateur inconnu: {operator} (disponibles: {', '.join(STATEMENT_FORMATS)})")
+        self.db = db
+        self.operator = operator
+        self.days = days
+        self.dry_run = dry_run
+        self.counts: Dict[str, int] = {}
+        self.sample: List[dict] = []
+        self.pending: List[Tuple[StatementRow, IndexedPayment]] = []
+        self.seen: set = set()
+        # Rapport en mémoire tant qu'il est petit, sur disque au-delà
+        self.report = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode="w+", newline="")
+        self.writer = csv.writer(self.report)
+        self.writer.writerow(REPORT_COLUMNS)
+
+    def _count(self, kind: str) -> None:
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def _mismatch(self, kind: str, row: StatementRow, payment: Optional[IndexedPayment] = None, detail: str = ""):
+        self._count(kind)
+        values = (
+            row.line, kind, row.reference, row.transaction_id or "",
+            "" if row.amount is None else str(row.amount), row.msisdn or "",
+            str(payment.id) if payment else "", detail
+        )
+        self.writer.writerow(values)
+        if len(self.sample) < SAMPLE_SIZE:
+            self.sample.append(dict(zip(REPORT_COLUMNS, values)))
+
+    def classify(self, row: StatementRow, index: Dict[str, IndexedPayment]) -> None:
+        self._count("rows")
+        if row.status is not None and row.status not in SUCCESS_STATUSES:
+            self._count("ignored")
+            return
+        if not row.reference or row.amount is None:
+            self._mismatch("invalid_row", row, detail="Référence ou montant illisible")
+            return
+        if row.reference in self.seen:
+            self._mismatch("duplicate_in_statement", row)
+            return
+        self.seen.add(row.reference)
+
+        payment = index.get(row.reference)
+        if payment is None:
+            self._mismatch("unknown_reference", row)
+        elif payment.status == PAYMENT_VALIDATED:
+            self._count("already_validated")
+        elif payment.status not in PAYMENT_REVIEWABLE:
+            self._mismatch("not_reviewable", row, payment, detail=payment.status)
+        elif row.amount != payment.amount:
+            self._mismatch("amount_mismatch", row, payment, detail=f"attendu {payment.amount}")
+        elif payment.msisdn and msisdn_key(row.msisdn) and msisdn_key(row.msisdn) != payment.msisdn:
+            self._mismatch("msisdn_mismatch", row, payment, detail=f"attendu …{payment.msisdn}")
+        else:
+            self.pending.append((row, payment))
+            if len(self.pending) >= BATCH_SIZE:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Valider le lot en attente en une requête, puis jobs et notifications du lot
+
+        Le relevé confirme le montant du paiement, pas le prix: un paiement dont le
+        montant XOF ne couvre pas exactement sa cible reste en examen manuel.
+        """
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        expected = payment_targets.expected_amounts_xof(
+            self.db, [(payment.type, payment.target_id) for _, payment in batch]
+        )
+        checked = []
+        for row, payment in batch:
+            due = expected.get(str(payment.target_id))
+            if payment_targets.amount_matches(due, payment.amount_xof):
+                checked.append((row, payment))
+            else:
+                self._mismatch(
+                    "target_amount_mismatch", row, payment,
+                    detail=f"dû {due} XOF" if due is not None else "Cible introuvable"
+                )
+        batch = checked
+        if not batch:
+            return
+        if self.dry_run:
+            self.counts["validated"] = self.counts.get("validated", 0) + len(batch)
+            return
+
+        updated = PAYMENTS.transition_many(
+            self.db,
+            [(payment.id, payment.created_at, payment.version) for _, payment in batch],
+            PAYMENT_VALIDATED,
+            guard=CLAIM_GUARD,
+            values={"claimed_by": "NULL", "claim_expires_at": "NULL"}
+        )
+        updated_ids = {row["id"] for row in updated}
+
+        # Même chemin que la validation manuelle: cascade commande / inscription par le worker
+        for row in updated:
+            jobs.enqueue(self.db, "payments.validated", {"payment_id": str(row["id"])})
+        notifications.notify_many(self.db, notifications.PAYMENT_EVENTS_CHANNEL, [
+            {"user_id": str(row["user_id"]), "kind": "payment", "id": str(row["id"]), "status": row["status"]}
+            for row in updated
+        ])
+        notifications.notify_many(self.db, notifications.REVIEW_EVENTS_CHANNEL, [
+            {"audience": "admins", "action": "validated", "payment_id": str(row["id"]), "admin_id": None}
+            for row in updated
+        ])
+        self.db.commit()
+
+        self.counts["validated"] = self.counts.get("validated", 0) + len(updated)
+        for row, payment in batch:
+            if payment.id not in updated_ids:
+                self._mismatch("conflict", row, payment, detail="Modifié ou en cours d'examen")
+
+    def run(self, stream: BinaryIO) -> dict:
+        started = time.perf_counter()
+        index = build_index(self.db, self.operator, self.days)
+        for row in iter_statement(stream, self.operator):
+            self.classify(row, index)
+        self.flush()
+
+        mismatches = {
+            kind: count for kind, count in self.counts.items()
+            if kind not in ("rows", "ignored", "already_validated", "validated")
+        }
+        report_key = None
+        if mismatches:
+            self.report.seek(0)
+            report_key = (
+                f"reconciliations/{self.operator}/"
+                f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}{'-dry-run' if self.dry_run else ''}.csv"
+            )
+            storage.put_object(report_key, self.report.read().encode("utf-8"), "text/csv")
+        self.report.close()
+
+        return {
+            "operator": self.operator,
+            "dry_run": self.dry_run,
+            "rows": self.counts.get("rows", 0),
+            "validated": self.counts.get("validated", 0),
+            "already_validated": self.counts.get("already_validated", 0),
+            "ignored": self.counts.get("ignored", 0),
+            "mismatches": mismatches,
+            "sample": self.sample,
+            "report_key": report_key,
+            "duration_ms": int((time.perf_counter() - started) * 1000),
+        }
+
+
+def reconcile_statement(db: Session, stream: BinaryIO, operator: str, days: int = 7, dry_run: bool = False) -> dict:
+    """
+    Rapprocher un relevé opérateur et retourner le résumé (voir Reconciliation)
+    """
+    return Reconciliation(db, operator, days=days, dry_run=dry_run).run(stream)
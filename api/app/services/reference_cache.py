@@ -0,0 +1,115 @@
+"""
+Reference Cache - Données de référence gardées en mémoire par worker
+Montants des frais d'inscription et liste par défaut du catalogue: lus à chaque
+page tournois / boutique, modifiés rarement. Préchargés au démarrage (warmup).
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from app.database import SessionLocal
+from app.models import CatalogItem, EntryFee
+
+# Durée de vie des frais d'inscription (pas d'endpoint d'écriture: seed / SQL)
+ENTRY_FEES_TTL_SECONDS = 300
+
+# Durée de vie de la liste catalogue (invalidée explicitement par les écritures admin)
+CATALOG_TTL_SECONDS = 60
+
+
+class _Entry:
+    """
+    Valeur en cache avec son instant d'expiration
+    """
+
+    def __init__(self):
+        self.value = None
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+
+    def fresh(self) -> bool:
+        return self.value is not None and time.time() < self.expires_at
+
+
+_entry_fees = _Entry()
+_catalog = _Entry()
+
+
+def _load_entry_fees() -> Dict[UUID, float]:
+    db = SessionLocal()
+    try:
+        return {fee.id: float(fee.amount) for fee in db.query(EntryFee.id, EntryFee.amount).all()}
+    finally:
+        db.close()
+
+
+def _load_catalog() -> List[CatalogItem]:
+    db = SessionLocal()
+    try:
+        items = db.query(CatalogItem).order_by(CatalogItem.price_amount.asc()).all()
+        # Objets détachés: utilisables après fermeture de la session
+        db.expunge_all()
+        return items
+    finally:
+        db.close()
+
+
+def _get(entry: _Entry, loader, ttl: int):
+    """
+    Lire une entrée; un seul thread recharge à l'expiration (les autres attendent)
+    """
+    if entry.fresh():
+        return entry.value
+    with entry.lock:
+        if not entry.fresh():
+            entry.value = loader()
+            entry.expires_at = time.time() + ttl
+        return entry.value
+
+
+def entry_fee_amounts() -> Dict[UUID, float]:
+    """
+    Montant de chaque frais d'inscription, par id
+    """
+    return _get(_entry_fees, _load_entry_fees, ENTRY_FEES_TTL_SECONDS)
+
+
+def entry_fee_amount(fee_id) -> Optional[float]:
+    """
+    Montant d'un frais d'inscription (None si absent ou id vide)
+    """
+    if not fee_id:
+        return None
+    amounts = entry_fee_amounts()
+    if fee_id not in amounts:
+        # Frais créé depuis le dernier chargement
+        invalidate_entry_fees()
+        amounts = entry_fee_amounts()
+    return amounts.get(fee_id)
+
+
+def catalog_items() -> List[CatalogItem]:
+    """
+    Tous les produits du catalogue triés par prix croissant (liste /catalog sans filtre)
+    """
+    return _get(_catalog, _load_catalog, CATALOG_TTL_SECONDS)
+
+
+def invalidate_entry_fees() -> None:
+    _entry_fees.expires_at = 0.0
+
+
+def invalidate_catalog() -> None:
+    """
+    Forcer le rechargement du catalogue (création / modification / suppression admin)
+    """
+    _catalog.expires_at = 0.0
+
+
+def prime() -> None:
+    """
+    Charger toutes les données de référence (au démarrage du worker)
+    """
+    entry_fee_amounts()
+    catalog_items()
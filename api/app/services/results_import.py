@@ -0,0 +1,325 @@
+"""
+Results Import - Import des feuilles de résultats de match (CSV / XLSX)
+La feuille est lue ligne à ligne en colonnes (match, salle, UID, place, kills),
+les UID FreeFire sont résolus en une requête parmi les inscrits du tournoi, puis
+validation et calcul des points sont vectorisés (NumPy) sur toute la feuille.
+Les résultats sont écrits par COPY; les matchs importés remplacent leurs
+résultats précédents et seuls les cumuls des joueurs concernés sont recalculés.
+"""
+import csv
+import io
+import itertools
+import time
+import unicodedata
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import Tournament
+from app.services import leaderboard, scoring
+
+# En-têtes reconnus par champ, dans l'ordre de préférence (normalisés: minuscules, sans accents)
+SHEET_COLUMNS = {
+    "match_no": ("match", "match no", "numero match", "partie", "game"),
+    "room_no": ("room", "room no", "salle", "numero salle"),
+    "uid": ("uid", "uid freefire", "free fire uid", "player uid", "id joueur"),
+    "placement": ("placement", "place", "rank", "classement", "position", "top"),
+    "kills": ("kills", "kill", "eliminations", "elims", "frags"),
+}
+REQUIRED_COLUMNS = ("match_no", "uid", "placement")
+
+# Lignes acceptées par feuille
+MAX_ROWS = 200_000
+
+# Bornes des valeurs (et de la clé de dédoublonnage match / salle / joueur sur 64 bits)
+MAX_MATCH_NO = 10_000
+MAX_ROOM_NO = 100_000
+MAX_PLACEMENT = 100
+MAX_KILLS = 100
+
+# Lignes rejetées renvoyées dans la réponse
+SAMPLE_SIZE = 50
+
+XLSX_MAGIC = b"PK\x03\x04"
+
+
+class SheetColumns(NamedTuple):
+    """
+    Feuille lue en colonnes (-1: cellule vide ou illisible)
+    """
+    lines: np.ndarray
+    match_no: np.ndarray
+    room_no: np.ndarray
+    uids: List[str]
+    placement: np.ndarray
+    kills: np.ndarray
+
+
+def _normalize_header(value) -> str:
+    value = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode()
+    return " ".join(value.lower().replace("_", " ").replace("°", " ").split())
+
+
+def _integer(value) -> int:
+    """
+    Cellule entière: 3, 3.0 (XLSX), "3", " 3 "; -1 si vide ou illisible
+    """
+    if value is None:
+        return -1
+    if isinstance(value, (int, float)):
+        return int(value) if value == int(value) else -1
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        number = float(value.replace(",", "."))
+    except ValueError:
+        return -1
+    return int(number) if number.is_integer() else -1
+
+
+def _optional_integer(row: Sequence, position: Optional[int]) -> int:
+    """
+    Colonne facultative (salle, kills): 0 si absente ou vide
+    """
+    if position is None or row[position] in (None, ""):
+        return 0
+    return _integer(row[position])
+
+
+def _uid(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        # UID numérique lu comme nombre dans un XLSX
+        value = int(value)
+    return str(value).strip() if value is not None else ""
+
+
+def iter_rows(stream: BinaryIO, filename: str = "") -> Iterator[Sequence]:
+    """
+    Lignes de la feuille (en-tête compris), XLSX détecté par son en-tête zip
+    """
+    head = stream.read(4)
+    stream.seek(0)
+    if head == XLSX_MAGIC or filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+        return
+
+    reader_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    header_line = reader_stream.readline()
+    try:
+        dialect = csv.Sniffer().sniff(header_line, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(itertools.chain([header_line], reader_stream), dialect)
+
+
+def read_sheet(stream: BinaryIO, filename: str = "") -> SheetColumns:
+    """
+    Lire la feuille en colonnes, sans la charger entière en mémoire
+
+    Lève ValueError si la feuille est vide, trop longue ou sans les colonnes requises.
+    """
+    rows = iter_rows(stream, filename)
+    header = next(rows, None)
+    if not header or not any(header):
+        raise ValueError("Feuille vide")
+
+    headers = [_normalize_header(cell) for cell in header]
+    positions: Dict[str, Optional[int]] = {}
+    for field, names in SHEET_COLUMNS.items():
+        positions[field] = next((headers.index(name) for name in names if name in headers), None)
+    missing = [field for field in REQUIRED_COLUMNS if positions[field] is None]
+    if missing:
+        raise ValueError(f"Colonnes introuvables dans la feuille: {', '.join(missing)}")
+
+    match_at, room_at, uid_at = positions["match_no"], positions["room_no"], positions["uid"]
+    placement_at, kills_at = positions["placement"], positions["kills"]
+    width = max(position for position in positions.values() if position is not None) + 1
+
+    lines, match_nos, room_nos, uids, placements, kills = [], [], [], [], [], []
+    for line, row in enumerate(rows, start=2):
+        if not row or not any(cell not in (None, "") for cell in row):
+            continue
+        if len(lines) >= MAX_ROWS:
+            raise ValueError(f"Feuille trop longue (maximum {MAX_ROWS} lignes)")
+        if len(row) < width:
+            row = list(row) + [None] * (width - len(row))
+        lines.append(line)
+        match_nos.append(_integer(row[match_at]))
+        room_nos.append(_optional_integer(row, room_at))
+        uids.append(_uid(row[uid_at]))
+        placements.append(_integer(row[placement_at]))
+        kills.append(_optional_integer(row, kills_at))
+
+    return SheetColumns(
+        lines=np.array(lines, dtype=np.int64),
+        match_no=np.array(match_nos, dtype=np.int64),
+        room_no=np.array(room_nos, dtype=np.int64),
+        uids=uids,
+        placement=np.array(placements, dtype=np.int64),
+        kills=np.array(kills, dtype=np.int64),
+    )
+
+
+def resolve_uids(db: Session, tournament: Tournament, uids: Sequence[str]) -> Dict[str, str]:
+    """
+    UID FreeFire -> user_id des inscrits actifs du tournoi (une seule requête)
+
+    Un UID partagé par plusieurs comptes inscrits est ambigu et n'est pas résolu.
+    """
+    rows = db.execute(
+        text("""
+            SELECT up.uid_freefire, min(r.user_id::text) AS user_id
+            FROM tournament_registrations r
+            JOIN user_profiles up ON up.user_id = r.user_id
+            WHERE r.tournament_id = :tournament_id
+              AND r.status IN ('registered', 'paid')
+              AND up.uid_freefire = ANY(:uids)
+            GROUP BY up.uid_freefire
+            HAVING count(DISTINCT r.user_id) = 1
+        """),
+        {"tournament_id": tournament.id, "uids": list(uids)}
+    ).all()
+    return {row.uid_freefire: row.user_id for row in rows}
+
+
+def validate(sheet: SheetColumns, user_index: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Masques des lignes rejetées par motif (évalués dans l'ordre, une ligne = un motif)
+
+    user_index: indice du joueur par ligne, -1 si l'UID n'est pas résolu.
+    """
+    rejected: Dict[str, np.ndarray] = {}
+    remaining = np.ones(len(sheet.lines), dtype=bool)
+
+    def reject(reason: str, mask: np.ndarray) -> None:
+        nonlocal remaining
+        mask = mask & remaining
+        if mask.any():
+            rejected[reason] = mask
+            remaining &= ~mask
+
+    reject("numéro de match invalide", (sheet.match_no < 1) | (sheet.match_no > MAX_MATCH_NO))
+    reject("numéro de salle invalide", (sheet.room_no < 0) | (sheet.room_no > MAX_ROOM_NO))
+    reject("place invalide", (sheet.placement < 1) | (sheet.placement > MAX_PLACEMENT))
+    reject("kills invalides", (sheet.kills < 0) | (sheet.kills > MAX_KILLS))
+    reject("UID inconnu, ambigu ou non inscrit au tournoi", user_index < 0)
+
+    # Un joueur une seule fois par match: la première ligne est gardée
+    key = (sheet.match_no << 40) | (sheet.room_no << 20) | np.maximum(user_index, 0)
+    candidates = np.flatnonzero(remaining)
+    _, first = np.unique(key[candidates], return_index=True)
+    duplicate = remaining.copy()
+    duplicate[candidates[first]] = False
+    reject("joueur en double dans le match", duplicate)
+
+    rejected["_accepted"] = remaining
+    return rejected
+
+
+def copy_results(db: Session, tournament_id, match_ids: Sequence[str], user_ids: Sequence[str],
+                 placements: np.ndarray, kills: np.ndarray, points: np.ndarray) -> None:
+    """
+    Écrire les résultats par COPY, dans la transaction de la session
+    """
+    buffer = io.StringIO()
+    tournament_id = str(tournament_id)
+    buffer.writelines(
+        f"{match_id}\t{tournament_id}\t{user_id}\t{placement}\t{kill_count}\t{point}\n"
+        for match_id, user_id, placement, kill_count, point
+        in zip(match_ids, user_ids, placements.tolist(), kills.tolist(), points.tolist())
+    )
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY tournament_results (match_id, tournament_id, user_id, placement, kills, points) FROM STDIN",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def import_results(
+    db: Session,
+    tournament: Tournament,
+    stream: BinaryIO,
+    filename: str = "",
+    dry_run: bool = False,
+    recorded_by=None
+) -> dict:
+    """
+    Importer une feuille de résultats dans la transaction de l'appelant
+
+    dry_run: lecture, validation et calcul des points sans rien écrire.
+    Lève ValueError si la feuille est illisible.
+    """
+    timings = {}
+    started = time.perf_counter()
+    sheet = read_sheet(stream, filename)
+    if not len(sheet.lines):
+        raise ValueError("Aucune ligne de résultat dans la feuille")
+    timings["read_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    distinct_uids, uid_positions = np.unique(np.array(sheet.uids, dtype=str), return_inverse=True)
+    users_by_uid = resolve_uids(db, tournament, [uid for uid in distinct_uids.tolist() if uid])
+    user_ids = [users_by_uid.get(uid) for uid in distinct_uids.tolist()]
+    resolved = np.array([-1 if user_id is None else position for position, user_id in enumerate(user_ids)], dtype=np.int64)
+    user_index = resolved[uid_positions.reshape(-1)]
+    timings["lookup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    masks = validate(sheet, user_index)
+    accepted = masks.pop("_accepted")
+    rows = np.flatnonzero(accepted)
+    points = scoring.score(scoring.rule_for(tournament.mode), sheet.placement[rows], sheet.kills[rows])
+    timings["score_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    errors = []
+    for reason, mask in masks.items():
+        for row in np.flatnonzero(mask)[:SAMPLE_SIZE].tolist():
+            errors.append({"line": int(sheet.lines[row]), "uid": sheet.uids[row], "reason": reason})
+    errors.sort(key=lambda error: error["line"])
+
+    match_keys = np.unique(np.stack([sheet.match_no[rows], sheet.room_no[rows]], axis=1), axis=0)
+    summary = {
+        "rows": len(sheet.lines),
+        "accepted": len(rows),
+        "rejected": {reason: int(mask.sum()) for reason, mask in masks.items()},
+        "matches": len(match_keys),
+        "players": len(np.unique(user_index[rows])),
+        "points_total": int(points.sum()),
+        "standings_updated": 0,
+        "dry_run": dry_run,
+        "errors": errors[:SAMPLE_SIZE],
+        "timings": timings,
+    }
+    if dry_run or not len(rows):
+        return summary
+
+    started = time.perf_counter()
+    leaderboard.lock_standings(db, tournament.id)
+    match_ids = leaderboard.save_matches(db, tournament.id, [tuple(key) for key in match_keys.tolist()], recorded_by)
+    previous = leaderboard.clear_results(db, list(match_ids.values()))
+
+    row_user_ids = [user_ids[index] for index in user_index[rows].tolist()]
+    row_match_ids = [
+        match_ids[(match_no, room_no)]
+        for match_no, room_no in zip(sheet.match_no[rows].tolist(), sheet.room_no[rows].tolist())
+    ]
+    copy_results(db, tournament.id, row_match_ids, row_user_ids, sheet.placement[rows], sheet.kills[rows], points)
+
+    affected = sorted(set(previous) | set(row_user_ids))
+    leaderboard.update_standings(db, tournament.id, affected, {"import": True, "matches": len(match_keys)})
+    timings["write_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    summary["standings_updated"] = len(affected)
+    return summary
@@ -0,0 +1,172 @@
+"""
+Revenue Rollups - Chiffre d'affaires agrégé par jour
+revenue_daily garde, par jour (fuseau ANALYTICS_TIMEZONE), pays, méthode et type
+de catalogue, le nombre et la somme XOF des paiements validés. Le job
+analytics.revenue_rollup recalcule chaque minute les seuls jours touchés par les
+paiements modifiés depuis le watermark (validation, remboursement): les écrans
+finance lisent quelques centaines de lignes d'agrégats au lieu de parcourir payments.
+"""
+import os
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Fuseau des journées comptables (nom IANA connu de PostgreSQL)
+ANALYTICS_TIMEZONE = os.getenv("ANALYTICS_TIMEZONE", "UTC")
+
+REFRESH_INTERVAL_SECONDS = 60
+
+# Marge relue à chaque passage: updated_at vaut l'heure de début de la transaction
+# qui valide, visible seulement à son commit (possiblement après le passage précédent)
+LAG_SECONDS = 300
+
+WATERMARK = "revenue_daily"
+
+GRANULARITIES = ("day", "week", "month")
+
+# Axes de ventilation, dans l'ordre des colonnes renvoyées
+DIMENSIONS = ("country", "method", "catalog_type")
+
+# Type de catalogue des inscriptions aux tournois (paiements entry_fee)
+ENTRY_FEE = "ENTRY_FEE"
+
+# Agrégation des paiements validés; {scope} restreint aux jours recalculés.
+# Le type de catalogue passe par order_keys pour cibler la partition de la commande.
+_AGGREGATE = """
+    INSERT INTO revenue_daily (day, country, method, catalog_type, payments, revenue_xof, refreshed_at)
+    SELECT (p.validated_at AT TIME ZONE :tz)::date,
+           p.country,
+           COALESCE(p.method, ''),
+           CASE WHEN p.type = 'entry_fee' THEN :entry_fee ELSE COALESCE(ci.type, 'UNKNOWN') END,
+           count(*),
+           COALESCE(sum(p.amount_xof), 0),
+           now()
+    FROM payments p
+    LEFT JOIN order_keys ok ON p.type = 'order' AND ok.id = p.target_id
+    LEFT JOIN orders o ON o.id = ok.id AND o.created_at = ok.created_at
+    LEFT JOIN catalog_items ci ON ci.id = o.catalog_item_id
+    WHERE p.status = 'validated' AND p.validated_at IS NOT NULL {scope}
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+def today() -> date:
+    """
+    Journée comptable en cours (fuseau ANALYTICS_TIMEZONE)
+    """
+    return datetime.now(ZoneInfo(ANALYTICS_TIMEZONE)).date()
+
+
+def refresh(db: Session) -> int:
+    """
+    Recalculer les jours touchés depuis le watermark (tout si watermark NULL)
+
+    Chaque jour touché est recalculé entièrement: un passage rejoué ou une
+    fenêtre chevauchante donne le même résultat, et un remboursement retire le
+    paiement de son jour de validation. Retourne le nombre de jours recalculés.
+    """
+    # Verrou de ligne: un seul passage à la fois (job planifié, reconstruction admin)
+    state = db.execute(
+        text("SELECT watermark, now() AS now FROM rollup_watermarks WHERE name = :name FOR UPDATE"),
+        {"name": WATERMARK}
+    ).one()
+    params = {"tz": ANALYTICS_TIMEZONE, "entry_fee": ENTRY_FEE}
+
+    if state.watermark is None:
+        db.execute(text("DELETE FROM revenue_daily"))
+        db.execute(text(_AGGREGATE.format(scope="")), params)
+        refreshed = db.execute(text("SELECT count(DISTINCT day) FROM revenue_daily")).scalar()
+    else:
+        days = db.execute(
+            text("""
+                SELECT DISTINCT (validated_at AT TIME ZONE :tz)::date
+                FROM payments
+                WHERE validated_at IS NOT NULL
+                  AND updated_at > CAST(:watermark AS timestamptz) - make_interval(secs => :lag)
+            """),
+            {"tz": ANALYTICS_TIMEZONE, "watermark": state.watermark, "lag": LAG_SECONDS}
+        ).scalars().all()
+        if days:
+            db.execute(text("DELETE FROM revenue_daily WHERE day = ANY(:days)"), {"days": days})
+            # Bornes en timestamptz pour l'index idx_pay_validated, puis filtre exact par jour
+            db.execute(
+                text(_AGGREGATE.format(scope="""
+                    AND p.validated_at >= (CAST(:first AS timestamp) AT TIME ZONE :tz)
+                    AND p.validated_at < (CAST(:last AS timestamp) + INTERVAL '1 day') AT TIME ZONE :tz
+                    AND (p.validated_at AT TIME ZONE :tz)::date = ANY(:days)
+                """)),
+                {**params, "first": min(days), "last": max(days), "days": days}
+            )
+        refreshed = len(days)
+
+    db.execute(
+        text("UPDATE rollup_watermarks SET watermark = :now, updated_at = now() WHERE name = :name"),
+        {"now": state.now, "name": WATERMARK}
+    )
+    return refreshed
+
+
+def request_rebuild(db: Session) -> None:
+    """
+    Reconstruire tous les agrégats au prochain passage (fuseau modifié, correction manuelle)
+    """
+    db.execute(
+        text("UPDATE rollup_watermarks SET watermark = NULL, updated_at = now() WHERE name = :name"),
+        {"name": WATERMARK}
+    )
+
+
+def refreshed_through(db: Session) -> Optional[datetime]:
+    """
+    Horodatage jusqu'où les paiements sont agrégés (None: jamais calculé)
+    """
+    return db.execute(
+        text("SELECT watermark FROM rollup_watermarks WHERE name = :name"),
+        {"name": WATERMARK}
+    ).scalar()
+
+
+def series(
+    db: Session,
+    start: date,
+    end: date,
+    granularity: str = "day",
+    group_by: Sequence[str] = (),
+    filters: Optional[Dict[str, str]] = None
+) -> List[dict]:
+    """
+    Revenu par période (jour, semaine ISO, mois) entre start et end inclus,
+    ventilé selon group_by et filtré par dimension (valeurs exactes)
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularité inconnue: {granularity}")
+    unknown = set(group_by) | set(filters or {})
+    unknown -= set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Dimension inconnue: {', '.join(sorted(unknown))}")
+
+    # Noms de colonnes issus de DIMENSIONS uniquement (jamais de la requête)
+    columns = "".join(f", {dimension}" for dimension in DIMENSIONS if dimension in group_by)
+    conditions = ["day >= :start", "day <= :end"]
+    params = {"granularity": granularity, "start": start, "end": end}
+    for dimension in DIMENSIONS:
+        if filters and filters.get(dimension) is not None:
+            conditions.append(f"{dimension} = :{dimension}")
+            params[dimension] = filters[dimension]
+
+    rows = db.execute(
+        text(f"""
+            SELECT date_trunc(:granularity, day::timestamp)::date AS period{columns},
+                   sum(payments)::bigint AS payments,
+                   sum(revenue_xof) AS revenue_xof
+            FROM revenue_daily
+            WHERE {" AND ".join(conditions)}
+            GROUP BY period{columns}
+            ORDER BY period{columns}
+        """),
+        params
+    ).mappings().all()
+    return [dict(row) for row in rows]
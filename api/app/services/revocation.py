@@ -0,0 +1,213 @@
+"""
+Revocation Service - Liste de révocation des tokens JWT en mémoire
+Filtre de Bloom (réponse négative sans recherche) + ensembles exacts, chargés depuis
+token_revocations et synchronisés entre workers via NOTIFY token_revocations.
+"""
+import hashlib
+import math
+import threading
+import time
+from typing import Dict
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, after_commit
+from app.models import TokenRevocation
+from app.services import notifications
+
+# Dimensionnement du filtre de Bloom (capacité attendue et taux de faux positifs)
+BLOOM_CAPACITY = 100_000
+BLOOM_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom sur bytearray (double hachage dérivé d'un seul blake2b)
+    """
+
+    def __init__(self, capacity: int = BLOOM_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class RevocationList:
+    """
+    Révocations actives du processus
+
+    - revoked_jtis: jti -> expiration (epoch) du token révoqué
+    - user_cutoffs: user_id -> epoch en ms; les tokens émis avant (iat_ms) sont révoqués
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = BloomFilter()
+        self.revoked_jtis: Dict[str, float] = {}
+        self.user_cutoffs: Dict[str, int] = {}
+
+    def add_jti(self, jti: str, expires_at: float) -> None:
+        with self.lock:
+            self.revoked_jtis[jti] = expires_at
+            self.bloom.add(f"jti:{jti}")
+
+    def add_user_cutoff(self, user_id: str, revoked_before: int) -> None:
+        with self.lock:
+            if revoked_before > self.user_cutoffs.get(user_id, 0):
+                self.user_cutoffs[user_id] = revoked_before
+            self.bloom.add(f"user:{user_id}")
+
+    def is_revoked(self, payload: dict) -> bool:
+        """
+        Vérifier un payload décodé; le cas courant (non révoqué) ne touche que le filtre
+        """
+        jti = payload.get("jti")
+        if jti and f"jti:{jti}" in self.bloom and jti in self.revoked_jtis:
+            return True
+
+        user_id = str(payload.get("user_id"))
+        if f"user:{user_id}" in self.bloom:
+            cutoff = self.user_cutoffs.get(user_id)
+            if cutoff is not None and _issued_at_ms(payload) < cutoff:
+                return True
+
+        return False
+
+    def replace(self, jtis: Dict[str, float], cutoffs: Dict[str, int]) -> None:
+        """
+        Remplacer tout le contenu (rechargement), en purgeant les entrées expirées du filtre
+        """
+        bloom = BloomFilter()
+        for jti in jtis:
+            bloom.add(f"jti:{jti}")
+        for user_id in cutoffs:
+            bloom.add(f"user:{user_id}")
+        with self.lock:
+            self.bloom = bloom
+            self.revoked_jtis = jtis
+            self.user_cutoffs = cutoffs
+
+
+revocations = RevocationList()
+
+
+def _issued_at_ms(payload: dict) -> int:
+    """
+    Instant d'émission en ms; les tokens sans iat_ms (émis avant son ajout) sont
+    datés du début de leur seconde iat: révoqués même émis dans la seconde de la coupure
+    """
+    if "iat_ms" in payload:
+        return int(payload["iat_ms"])
+    return int(payload.get("iat", 0)) * 1000 - 1
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        return (value - datetime(1970, 1, 1)).total_seconds()
+    return value.timestamp()
+
+
+def reload() -> None:
+    """
+    Charger les révocations non expirées depuis la base
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(TokenRevocation).filter(TokenRevocation.expires_at > datetime.utcnow()).all()
+    finally:
+        db.close()
+
+    jtis: Dict[str, float] = {}
+    cutoffs: Dict[str, int] = {}
+    for row in rows:
+        if row.jti:
+            jtis[row.jti] = _epoch(row.expires_at)
+        if row.user_id and row.revoked_before:
+            user_id = str(row.user_id)
+            cutoffs[user_id] = max(cutoffs.get(user_id, 0), row.revoked_before)
+    revocations.replace(jtis, cutoffs)
+
+
+def _apply_event(event: dict) -> None:
+    """
+    Appliquer une révocation reçue d'un autre worker
+    """
+    if event.get("jti"):
+        revocations.add_jti(event["jti"], event["expires_at"])
+    if event.get("user_id") and event.get("revoked_before"):
+        revocations.add_user_cutoff(event["user_id"], event["revoked_before"])
+
+
+def _apply_after_commit(db: Session, payload: dict) -> None:
+    """
+    Appliquer la révocation à ce worker au commit de l'appelant (jamais après un rollback,
+    même mécanisme que http_cache.invalidate); les autres workers la reçoivent par le
+    NOTIFY, lui aussi envoyé au commit
+    """
+    after_commit(db, lambda: _apply_event(payload))
+
+
+def start() -> None:
+    """
+    Charger les révocations et écouter les nouvelles (au démarrage de chaque worker)
+    """
+    try:
+        reload()
+    except Exception as exc:
+        print(f"⚠️ Chargement des révocations impossible: {exc}")
+    notifications.hub.add_listener(notifications.TOKEN_REVOCATIONS_CHANNEL, _apply_event, on_connect=reload)
+
+
+def revoke_token(db: Session, payload: dict) -> None:
+    """
+    Révoquer un token précis (logout); effectif au commit de l'appelant
+    """
+    jti = payload.get("jti")
+    if not jti:
+        # Anciens tokens sans jti: révoquer tous les tokens de l'utilisateur
+        revoke_user_tokens(db, payload["user_id"])
+        return
+
+    expires_at = float(payload["exp"])
+    db.add(TokenRevocation(
+        jti=jti,
+        user_id=payload.get("user_id"),
+        expires_at=datetime.utcfromtimestamp(expires_at)
+    ))
+    revoked = {"jti": jti, "expires_at": expires_at}
+    notifications.notify(db, notifications.TOKEN_REVOCATIONS_CHANNEL, revoked)
+    _apply_after_commit(db, revoked)
+
+
+def revoke_user_tokens(db: Session, user_id) -> None:
+    """
+    Révoquer tous les tokens déjà émis pour un utilisateur (rôle modifié, mot de passe
+    réinitialisé); effectif au commit de l'appelant
+    """
+    from app.dependencies.auth import JWT_EXPIRATION_HOURS
+
+    revoked_before = int(time.time() * 1000)
+    lifetime = timedelta(hours=JWT_EXPIRATION_HOURS)
+    db.add(TokenRevocation(
+        user_id=user_id,
+        revoked_before=revoked_before,
+        expires_at=datetime.utcnow() + lifetime
+    ))
+    revoked = {"user_id": str(user_id), "revoked_before": revoked_before}
+    notifications.notify(db, notifications.TOKEN_REVOCATIONS_CHANNEL, revoked)
+    _apply_after_commit(db, revoked)
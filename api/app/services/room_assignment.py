@@ -0,0 +1,399 @@
+"""
+Room Assignment - Répartition des inscrits d'un tournoi en salles (rooms)
+Format par mode: taille d'équipe et nombre d'équipes par salle. Les escouades
+pré-formées (même squad_code) restent ensemble, les places restantes sont
+complétées par des joueurs seuls du même pays d'abord. Les équipes sont réparties
+entre les salles par pays (tri par paquets puis distribution circulaire): chaque
+salle reçoit une part équilibrée de chaque pays. Tout est linéaire en nombre d'inscrits.
+
+Nouvelle exécution: les places existantes sont conservées. Seules les salles
+touchées (désinscriptions, places libres comblées) changent et seul le delta est
+écrit. rebuild=True redistribue tout le tournoi.
+"""
+import math
+from collections import Counter, deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import Tournament
+
+
+class RoomFormat(NamedTuple):
+    """
+    Salle personnalisée Free Fire: équipes de team_size joueurs, teams_per_room équipes
+    """
+    team_size: int
+    teams_per_room: int
+
+    @property
+    def capacity(self) -> int:
+        return self.team_size * self.teams_per_room
+
+
+MODE_FORMATS: Dict[str, RoomFormat] = {
+    "BR_SOLO": RoomFormat(1, 48),
+    "BR_DUO": RoomFormat(2, 24),
+    "BR_SQUAD": RoomFormat(4, 12),
+    "CLASH_SQUAD": RoomFormat(4, 2),
+    "LONE_WOLF": RoomFormat(1, 2),
+    "ROOM_HS": RoomFormat(1, 48),
+}
+
+# Profil sans pays renseigné
+UNKNOWN_COUNTRY = "??"
+
+
+class Registrant(NamedTuple):
+    registration_id: object
+    user_id: object
+    country: str
+    squad_code: Optional[str]
+
+
+class Seat(NamedTuple):
+    registration_id: object
+    user_id: object
+    room_no: int
+    team_no: int
+    seat: int
+
+
+class AssignmentPlan(NamedTuple):
+    """
+    Delta à écrire: places ajoutées, inscriptions retirées, salles touchées
+    """
+    added: List[Seat]
+    removed: List[object]
+    affected_rooms: List[int]
+    rooms: int
+
+
+def team_country(team: List[Registrant]) -> str:
+    """
+    Pays majoritaire d'une équipe
+    """
+    if len(team) == 1:
+        return team[0].country
+    return Counter(member.country for member in team).most_common(1)[0][0]
+
+
+def by_country(teams: List[List[Registrant]]) -> List[List[Registrant]]:
+    """
+    Équipes regroupées par pays (pays les plus représentés d'abord), ordre d'inscription conservé
+    """
+    buckets: Dict[str, List[List[Registrant]]] = {}
+    for team in teams:
+        buckets.setdefault(team_country(team), []).append(team)
+    return [team for country in sorted(buckets, key=lambda c: -len(buckets[c])) for team in buckets[country]]
+
+
+def merge_partial(partial: List[List[Registrant]], team_size: int) -> List[List[Registrant]]:
+    """
+    Regrouper des escouades incomplètes sans les séparer (les plus grandes d'abord,
+    complétées par la plus grande escouade qui tient dans les places restantes)
+    """
+    buckets: Dict[int, List[List[Registrant]]] = {size: [] for size in range(1, team_size)}
+    # Paquets inversés: pop() rend l'escouade inscrite la première
+    for team in reversed(partial):
+        buckets[len(team)].append(team)
+
+    merged = []
+    for size in range(team_size - 1, 0, -1):
+        while buckets[size]:
+            team = list(buckets[size].pop())
+            space = team_size - len(team)
+            while space:
+                fit = next((candidate for candidate in range(min(space, size), 0, -1) if buckets[candidate]), None)
+                if fit is None:
+                    break
+                team.extend(buckets[fit].pop())
+                space -= fit
+            merged.append(team)
+    return merged
+
+
+def form_teams(registrants: List[Registrant], team_size: int) -> List[List[Registrant]]:
+    """
+    Former les équipes: escouades pré-formées (découpées si trop grandes) complétées
+    par des joueurs seuls du même pays puis de n'importe quel pays, puis les joueurs
+    seuls restants groupés par pays. Une équipe reste incomplète faute de joueurs seuls.
+    """
+    if team_size == 1:
+        return [[registrant] for registrant in registrants]
+
+    squads: Dict[str, List[Registrant]] = {}
+    solos: Dict[str, deque] = {}
+    for registrant in registrants:
+        if registrant.squad_code:
+            squads.setdefault(registrant.squad_code, []).append(registrant)
+        else:
+            solos.setdefault(registrant.country, deque()).append(registrant)
+
+    # Parcours des pays pour compléter avec n'importe qui (un pays vidé le reste)
+    countries = list(solos)
+    cursor = 0
+
+    def take_any() -> Optional[Registrant]:
+        nonlocal cursor
+        while cursor < len(countries):
+            queue = solos[countries[cursor]]
+            if queue:
+                return queue.popleft()
+            cursor += 1
+        return None
+
+    teams: List[List[Registrant]] = []
+    partial: List[List[Registrant]] = []
+    for members in squads.values():
+        for start in range(0, len(members), team_size):
+            team = members[start:start + team_size]
+            same_country = solos.get(team_country(team))
+            while len(team) < team_size and same_country:
+                team.append(same_country.popleft())
+            while len(team) < team_size:
+                member = take_any()
+                if member is None:
+                    break
+                team.append(member)
+            (teams if len(team) == team_size else partial).append(team)
+    teams.extend(merge_partial(partial, team_size))
+
+    leftovers: List[Registrant] = []
+    for queue in solos.values():
+        players = list(queue)
+        full = len(players) - len(players) % team_size
+        teams.extend(players[start:start + team_size] for start in range(0, full, team_size))
+        leftovers.extend(players[full:])
+    teams.extend(leftovers[start:start + team_size] for start in range(0, len(leftovers), team_size))
+    return teams
+
+
+def deal_rooms(teams: List[List[Registrant]], room_format: RoomFormat, first_room_no: int = 1) -> List[Seat]:
+    """
+    Répartir des équipes dans le minimum de salles, tour à tour par pays
+    (écart d'au plus une équipe entre salles, et par pays entre salles)
+    """
+    if not teams:
+        return []
+    room_count = math.ceil(len(teams) / room_format.teams_per_room)
+    teams_in_room = [0] * room_count
+    seats = []
+    for index, team in enumerate(by_country(teams)):
+        room = index % room_count
+        teams_in_room[room] += 1
+        seats.extend(
+            Seat(member.registration_id, member.user_id, first_room_no + room, teams_in_room[room], seat)
+            for seat, member in enumerate(team, 1)
+        )
+    return seats
+
+
+def plan_assignment(
+    room_format: RoomFormat,
+    registrants: List[Registrant],
+    existing: List[Seat],
+    rebuild: bool = False
+) -> AssignmentPlan:
+    """
+    Calculer le delta entre les places existantes et les inscrits éligibles
+
+    - registrants: inscrits éligibles dans l'ordre d'inscription
+    - existing: places enregistrées, triées par salle, équipe, place
+    """
+    if rebuild:
+        seats = deal_rooms(form_teams(registrants, room_format.team_size), room_format)
+        rooms = {seat.room_no for seat in seats} | {seat.room_no for seat in existing}
+        return AssignmentPlan(
+            added=seats,
+            removed=[seat.registration_id for seat in existing],
+            affected_rooms=sorted(rooms),
+            rooms=max((seat.room_no for seat in seats), default=0)
+        )
+
+    eligible = {registrant.registration_id: registrant for registrant in registrants}
+    removed = [seat for seat in existing if seat.registration_id not in eligible]
+    affected = {seat.room_no for seat in removed}
+    known_rooms = {seat.room_no for seat in existing}
+
+    # Occupation conservée: places par équipe (ordre salle / équipe de la lecture)
+    teams: Dict[Tuple[int, int], List[Seat]] = {}
+    for seat in existing:
+        if seat.registration_id in eligible:
+            teams.setdefault((seat.room_no, seat.team_no), []).append(seat)
+    assigned = {seat.registration_id for members in teams.values() for seat in members}
+    newcomers = [registrant for registrant in registrants if registrant.registration_id not in assigned]
+
+    added: List[Seat] = []
+
+    def place(registrant: Registrant, key: Tuple[int, int]) -> None:
+        members = teams[key]
+        used = {seat.seat for seat in members}
+        seat_no = next(number for number in range(1, room_format.team_size + 1) if number not in used)
+        seat = Seat(registrant.registration_id, registrant.user_id, key[0], key[1], seat_no)
+        members.append(seat)
+        added.append(seat)
+        affected.add(key[0])
+
+    if room_format.team_size > 1 and newcomers:
+        # Un retardataire rejoint son escouade si elle a une place libre
+        squad_teams: Dict[str, Tuple[int, int]] = {}
+        for key, members in teams.items():
+            for seat in members:
+                code = eligible[seat.registration_id].squad_code
+                if code:
+                    squad_teams.setdefault(code, key)
+
+        # Les joueurs seuls comblent les places libérées des équipes existantes
+        holes = deque(key for key, members in teams.items() if len(members) < room_format.team_size)
+        remaining = []
+        for registrant in newcomers:
+            key = squad_teams.get(registrant.squad_code) if registrant.squad_code else None
+            if key is not None and len(teams[key]) < room_format.team_size:
+                place(registrant, key)
+            elif registrant.squad_code is None and holes:
+                place(registrant, holes[0])
+            else:
+                remaining.append(registrant)
+                continue
+            while holes and len(teams[holes[0]]) >= room_format.team_size:
+                holes.popleft()
+        newcomers = remaining
+
+    # Nouvelles équipes: créneaux libres des salles existantes (tour à tour), puis nouvelles salles
+    new_teams = by_country(form_teams(newcomers, room_format.team_size))
+    slots = deque()
+    if new_teams:
+        used_slots: Dict[int, set] = {}
+        for room_no, team_no in teams:
+            if teams[(room_no, team_no)]:
+                used_slots.setdefault(room_no, set()).add(team_no)
+        for room_no in sorted(known_rooms):
+            free = deque(
+                team_no for team_no in range(1, room_format.teams_per_room + 1)
+                if team_no not in used_slots.get(room_no, ())
+            )
+            if free:
+                slots.append((room_no, free))
+
+    placed = 0
+    while placed < len(new_teams) and slots:
+        room_no, free = slots.popleft()
+        team_no = free.popleft()
+        added.extend(
+            Seat(member.registration_id, member.user_id, room_no, team_no, seat)
+            for seat, member in enumerate(new_teams[placed], 1)
+        )
+        affected.add(room_no)
+        placed += 1
+        if free:
+            slots.append((room_no, free))
+
+    first_room_no = max(known_rooms, default=0) + 1
+    new_rooms = deal_rooms(new_teams[placed:], room_format, first_room_no)
+    added.extend(new_rooms)
+    affected.update(seat.room_no for seat in new_rooms)
+
+    return AssignmentPlan(
+        added=added,
+        removed=[seat.registration_id for seat in removed],
+        affected_rooms=sorted(affected),
+        rooms=max(known_rooms | {seat.room_no for seat in new_rooms}, default=0)
+    )
+
+
+def eligible_statuses(tournament: Tournament) -> Tuple[str, ...]:
+    """
+    Inscriptions placées: payées, ou toutes les actives pour un tournoi gratuit
+    """
+    return ("paid",) if tournament.entry_fee_id else ("registered", "paid")
+
+
+def load_registrants(db: Session, tournament: Tournament) -> List[Registrant]:
+    rows = db.execute(
+        text("""
+            SELECT r.id, r.user_id, r.squad_code, up.country_code
+            FROM tournament_registrations r
+            LEFT JOIN user_profiles up ON up.user_id = r.user_id
+            WHERE r.tournament_id = :tournament_id AND r.status = ANY(:statuses)
+            ORDER BY r.created_at, r.id
+        """),
+        {"tournament_id": tournament.id, "statuses": list(eligible_statuses(tournament))}
+    ).all()
+    return [
+        Registrant(row.id, row.user_id, row.country_code or UNKNOWN_COUNTRY, row.squad_code or None)
+        for row in rows
+    ]
+
+
+def load_seats(db: Session, tournament_id) -> List[Seat]:
+    rows = db.execute(
+        text("""
+            SELECT registration_id, user_id, room_no, team_no, seat
+            FROM tournament_room_assignments
+            WHERE tournament_id = :tournament_id
+            ORDER BY room_no, team_no, seat
+        """),
+        {"tournament_id": tournament_id}
+    ).all()
+    return [Seat(*row) for row in rows]
+
+
+def save_plan(db: Session, tournament_id, plan: AssignmentPlan) -> None:
+    """
+    Écrire le delta: une suppression et une insertion en masse (unnest)
+    """
+    if plan.removed:
+        db.execute(
+            text("DELETE FROM tournament_room_assignments WHERE registration_id = ANY(CAST(:ids AS uuid[]))"),
+            {"ids": [str(registration_id) for registration_id in plan.removed]}
+        )
+    if plan.added:
+        db.execute(
+            text("""
+                INSERT INTO tournament_room_assignments
+                    (registration_id, tournament_id, user_id, room_no, team_no, seat)
+                SELECT v.registration_id, :tournament_id, v.user_id, v.room_no, v.team_no, v.seat
+                FROM unnest(
+                    CAST(:registrations AS uuid[]), CAST(:users AS uuid[]), CAST(:rooms AS integer[]),
+                    CAST(:teams AS integer[]), CAST(:seats AS smallint[])
+                ) AS v(registration_id, user_id, room_no, team_no, seat)
+            """),
+            {
+                "tournament_id": tournament_id,
+                "registrations": [str(seat.registration_id) for seat in plan.added],
+                "users": [str(seat.user_id) for seat in plan.added],
+                "rooms": [seat.room_no for seat in plan.added],
+                "teams": [seat.team_no for seat in plan.added],
+                "seats": [seat.seat for seat in plan.added],
+            }
+        )
+
+
+def assign_rooms(db: Session, tournament: Tournament, rebuild: bool = False) -> dict:
+    """
+    Placer les inscrits éligibles d'un tournoi (dans la transaction de l'appelant)
+
+    Verrou consultatif par tournoi: deux répartitions simultanées sont sérialisées.
+    Lève KeyError si le mode n'a pas de format de salle.
+    """
+    room_format = MODE_FORMATS[tournament.mode]
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+        {"key": f"tournament_rooms:{tournament.id}"}
+    )
+    registrants = load_registrants(db, tournament)
+    existing = load_seats(db, tournament.id)
+    plan = plan_assignment(room_format, registrants, existing, rebuild=rebuild)
+    save_plan(db, tournament.id, plan)
+    return {
+        "mode": tournament.mode,
+        "team_size": room_format.team_size,
+        "room_capacity": room_format.capacity,
+        "registrants": len(registrants),
+        "rooms": plan.rooms,
+        "added": len(plan.added),
+        "removed": len(plan.removed),
+        "affected_rooms": plan.affected_rooms,
+    }
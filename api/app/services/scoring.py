@@ -0,0 +1,106 @@
+"""
+Scoring - Barèmes de points des matchs par mode de tournoi
+Les barèmes (points par place, points par kill, plafond de kills) sont stockés dans
+tournament_scoring_rules, modifiables par un admin, et gardés en mémoire par worker
+(invalidation "scoring", voir http_cache.invalidate). Le calcul est vectorisé
+(NumPy): une table de points par place indexée par le tableau des places.
+"""
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.database import SessionLocal
+
+# Filet de sécurité si une invalidation est manquée (coupure LISTEN)
+RULES_TTL_SECONDS = 600
+
+
+class ScoringRule(NamedTuple):
+    """
+    Barème d'un mode
+
+    - placement_points: points de la 1re place, de la 2e, ...; 0 au-delà
+    - kill_points: points par kill
+    - kill_cap: kills comptés au plus par match (None: sans plafond)
+    """
+    placement_points: Tuple[int, ...]
+    kill_points: int
+    kill_cap: Optional[int]
+
+
+# Barème Battle Royale standard; en duel (manches) seule la victoire rapporte des points de place
+_BATTLE_ROYALE = ScoringRule((12, 9, 8, 7, 6, 5, 4, 3, 2, 1), 1, None)
+_DUEL = ScoringRule((3,), 1, None)
+
+# Barèmes utilisés tant qu'aucun n'est enregistré pour le mode (migration 022)
+DEFAULT_RULES: Mapping[str, ScoringRule] = MappingProxyType({
+    "BR_SOLO": _BATTLE_ROYALE,
+    "BR_DUO": _BATTLE_ROYALE,
+    "BR_SQUAD": _BATTLE_ROYALE,
+    "ROOM_HS": _BATTLE_ROYALE,
+    "CLASH_SQUAD": _DUEL,
+    "LONE_WOLF": _DUEL,
+})
+
+_rules: Optional[Mapping[str, ScoringRule]] = None
+_expires_at = 0.0
+_lock = threading.Lock()
+
+
+def _load() -> Mapping[str, ScoringRule]:
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("SELECT mode, placement_points, kill_points, kill_cap FROM tournament_scoring_rules")
+        ).all()
+    finally:
+        db.close()
+    rules = dict(DEFAULT_RULES)
+    for row in rows:
+        rules[row.mode] = ScoringRule(tuple(row.placement_points), row.kill_points, row.kill_cap)
+    return MappingProxyType(rules)
+
+
+def rules() -> Mapping[str, ScoringRule]:
+    """
+    Barèmes courants (rechargés par un seul thread à l'invalidation ou à l'expiration)
+    """
+    global _rules, _expires_at
+    current = _rules
+    if current is not None and time.time() < _expires_at:
+        return current
+    with _lock:
+        if _rules is None or time.time() >= _expires_at:
+            _rules = _load()
+            _expires_at = time.time() + RULES_TTL_SECONDS
+        return _rules
+
+
+def invalidate() -> None:
+    """
+    Recharger les barèmes à la prochaine lecture (barème modifié)
+    """
+    global _expires_at
+    _expires_at = 0.0
+
+
+def rule_for(mode: str) -> ScoringRule:
+    return rules().get(mode) or DEFAULT_RULES.get(mode, _BATTLE_ROYALE)
+
+
+def score(rule: ScoringRule, placements: np.ndarray, kills: np.ndarray) -> np.ndarray:
+    """
+    Points de chaque ligne (places >= 1 et kills >= 0 déjà validés)
+    """
+    # Dernière case à 0: toutes les places au-delà du barème y sont ramenées
+    table = np.zeros(len(rule.placement_points) + 1, dtype=np.int64)
+    table[:-1] = rule.placement_points
+    positions = np.minimum(np.asarray(placements, dtype=np.int64) - 1, len(rule.placement_points))
+    counted = np.asarray(kills, dtype=np.int64)
+    if rule.kill_cap is not None:
+        counted = np.minimum(counted, rule.kill_cap)
+    return table[positions] + counted * rule.kill_points
@@ -0,0 +1,269 @@
+"""
+State Machine - Statuts et transitions autorisées des commandes, paiements et tournois
+Chaque transition est une seule requête UPDATE gardée par le statut de départ (et la
+version si l'appelant la connaît): deux décisions concurrentes ne peuvent pas
+s'écraser, la seconde ne trouve plus de ligne à modifier.
+"""
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Commandes
+ORDER_PENDING = "pending"
+ORDER_PAID = "paid"
+ORDER_DELIVERED = "delivered"
+ORDER_CANCELLED = "cancelled"
+
+# Paiements
+PAYMENT_PENDING = "pending"
+PAYMENT_PROOF_UPLOADED = "proof_uploaded"
+PAYMENT_VALIDATED = "validated"
+PAYMENT_REJECTED = "rejected"
+PAYMENT_EXPIRED = "expired"
+PAYMENT_REFUNDED = "refunded"
+
+# Paiements en attente d'une décision admin (file de revue)
+PAYMENT_REVIEWABLE = (PAYMENT_PENDING, PAYMENT_PROOF_UPLOADED)
+
+# Tournois
+TOURNAMENT_IN_REVIEW = "en_examen"
+TOURNAMENT_VALIDATED = "valide"
+TOURNAMENT_REJECTED = "rejete"
+TOURNAMENT_IN_PROGRESS = "en_cours"
+TOURNAMENT_UNAVAILABLE = "indisponible"
+
+
+class InvalidTransition(Exception):
+    """Transition non prévue par la machine à états"""
+
+    def __init__(self, entity: str, source: Optional[str], target: str):
+        super().__init__(f"{entity}: transition {source} -> {target} interdite")
+        self.source = source
+        self.target = target
+
+
+class StaleState(Exception):
+    """La ligne a changé (statut ou version) depuis sa lecture par l'appelant"""
+
+    def __init__(self, entity: str, current: Optional[dict]):
+        super().__init__(f"{entity}: modifié entre-temps")
+        self.current = current
+
+
+class NotFound(Exception):
+    """Aucune ligne avec cet identifiant"""
+
+
+class StateMachine:
+    """
+    Transitions d'une table partitionnée dont la clé globale est dans une table *_keys
+
+    - transitions: statut de départ -> statuts d'arrivée autorisés
+    - timestamps: colonne horodatée à now() à l'arrivée dans un statut
+    - touch: colonne mise à now() à chaque transition (updated_at)
+    - keys_table None / versioned False: table non partitionnée / sans colonne version
+      (transition seule, pas de transition_many)
+    """
+
+    def __init__(
+        self,
+        entity: str,
+        table: str,
+        keys_table: Optional[str],
+        statuses: Iterable[str],
+        transitions: Dict[str, Iterable[str]],
+        timestamps: Optional[Dict[str, str]] = None,
+        touch: Optional[str] = None,
+        versioned: bool = True
+    ):
+        self.entity = entity
+        self.table = table
+        self.keys_table = keys_table
+        self.versioned = versioned
+        self.statuses: FrozenSet[str] = frozenset(statuses)
+        self.transitions: Dict[str, FrozenSet[str]] = {s: frozenset(t) for s, t in transitions.items()}
+        self.timestamps = timestamps or {}
+        self.touch = touch
+
+    def can(self, source: str, target: str) -> bool:
+        return target in self.transitions.get(source, ())
+
+    def sources(self, target: str) -> list:
+        """
+        Statuts depuis lesquels `target` est atteignable
+        """
+        return sorted(s for s, targets in self.transitions.items() if target in targets)
+
+    def transition(
+        self,
+        db: Session,
+        row_id,
+        target: str,
+        version: Optional[int] = None,
+        source: Optional[str] = None,
+        guard: str = "",
+        values: Optional[dict] = None,
+        params: Optional[dict] = None
+    ) -> dict:
+        """
+        Appliquer une transition en une requête, sans lecture préalable
+
+        - version: version connue de l'appelant (None: seul le statut de départ est vérifié)
+        - source: statut de départ attendu (par défaut tous ceux qui mènent à target)
+        - guard: condition SQL supplémentaire (ex. bail de revue)
+        - values: colonnes supplémentaires à écrire, {colonne: paramètre SQL}
+
+        Retourne la ligne modifiée (id, user_id, status, version, ...). Lève NotFound,
+        InvalidTransition ou StaleState si rien n'a été modifié.
+        """
+        if source is not None and not self.can(source, target):
+            raise InvalidTransition(self.entity, source, target)
+        sources = [source] if source is not None else self.sources(target)
+
+        assignments = ["status = :target"]
+        if self.versioned:
+            assignments.append("version = version + 1")
+        if self.touch:
+            assignments.append(f"{self.touch} = now()")
+        if target in self.timestamps:
+            assignments.append(f"{self.timestamps[target]} = now()")
+        for column, expression in (values or {}).items():
+            assignments.append(f"{column} = {expression}")
+
+        # created_at lu dans la table de clés: seule la partition de la ligne est modifiée
+        partition = (
+            f"AND created_at = (SELECT created_at FROM {self.keys_table} WHERE id = :id)"
+            if self.keys_table else ""
+        )
+        sql = f"""
+            UPDATE {self.table} SET {", ".join(assignments)}
+            WHERE id = :id
+              {partition}
+              AND status = ANY(:sources)
+              {"AND (CAST(:version AS integer) IS NULL OR version = :version)" if self.versioned else ""}
+              {"AND (" + guard + ")" if guard else ""}
+            RETURNING *
+        """
+        row = db.execute(
+            text(sql),
+            {"id": row_id, "target": target, "sources": sources, "version": version, **(params or {})}
+        ).mappings().first()
+        if row is not None:
+            return dict(row)
+
+        # Chemin d'échec uniquement: expliquer pourquoi rien n'a été modifié
+        current = db.execute(
+            text(f"SELECT * FROM {self.table} WHERE id = :id {partition}"),
+            {"id": row_id}
+        ).mappings().first()
+        if current is None:
+            raise NotFound(row_id)
+        if not self.can(current["status"], target):
+            raise InvalidTransition(self.entity, current["status"], target)
+        raise StaleState(self.entity, dict(current))
+
+    def transition_many(
+        self,
+        db: Session,
+        rows: List[Tuple],
+        target: str,
+        guard: str = "",
+        values: Optional[dict] = None,
+        params: Optional[dict] = None
+    ) -> List[dict]:
+        """
+        Appliquer la même transition à un lot en une requête (rapprochements, traitements de masse)
+
+        - rows: (id, created_at, version) connus de l'appelant; created_at évite la
+          table de clés et limite la requête aux partitions concernées; version None:
+          seul le statut de départ est vérifié (cascades)
+
+        Retourne les lignes modifiées; les lignes absentes du résultat ont changé
+        entre-temps (statut, version ou garde) et n'ont pas été touchées.
+        """
+        if not rows:
+            return []
+
+        assignments = ["status = :target", "version = t.version + 1"]
+        if self.touch:
+            assignments.append(f"{self.touch} = now()")
+        if target in self.timestamps:
+            assignments.append(f"{self.timestamps[target]} = now()")
+        for column, expression in (values or {}).items():
+            assignments.append(f"{column} = {expression}")
+
+        sql = f"""
+            UPDATE {self.table} t SET {", ".join(assignments)}
+            FROM unnest(
+                CAST(:ids AS uuid[]), CAST(:created AS timestamptz[]), CAST(:versions AS integer[])
+            ) AS v(id, created_at, version)
+            WHERE t.id = v.id
+              AND t.created_at = v.created_at
+              AND t.created_at = ANY(CAST(:created AS timestamptz[]))
+              AND (v.version IS NULL OR t.version = v.version)
+              AND t.status = ANY(:sources)
+              {"AND (" + guard + ")" if guard else ""}
+            RETURNING t.*
+        """
+        result = db.execute(
+            text(sql),
+            {
+                "ids": [str(row[0]) for row in rows],
+                "created": [row[1] for row in rows],
+                "versions": [row[2] for row in rows],
+                "target": target,
+                "sources": self.sources(target),
+                **(params or {})
+            }
+        ).mappings().all()
+        return [dict(row) for row in result]
+
+
+ORDERS = StateMachine(
+    entity="commande",
+    table="orders",
+    keys_table="order_keys",
+    statuses=(ORDER_PENDING, ORDER_PAID, ORDER_DELIVERED, ORDER_CANCELLED),
+    transitions={
+        ORDER_PENDING: (ORDER_PAID, ORDER_CANCELLED),
+        ORDER_PAID: (ORDER_DELIVERED, ORDER_CANCELLED),
+    },
+    timestamps={ORDER_DELIVERED: "delivered_at"}
+)
+
+PAYMENTS = StateMachine(
+    entity="paiement",
+    table="payments",
+    keys_table="payment_keys",
+    statuses=(
+        PAYMENT_PENDING, PAYMENT_PROOF_UPLOADED, PAYMENT_VALIDATED,
+        PAYMENT_REJECTED, PAYMENT_EXPIRED, PAYMENT_REFUNDED
+    ),
+    transitions={
+        PAYMENT_PENDING: (PAYMENT_PROOF_UPLOADED, PAYMENT_VALIDATED, PAYMENT_REJECTED, PAYMENT_EXPIRED),
+        # Preuve complémentaire: reste en attente de revue
+        PAYMENT_PROOF_UPLOADED: (PAYMENT_PROOF_UPLOADED, PAYMENT_VALIDATED, PAYMENT_REJECTED),
+        # Nouvelle preuve après un rejet
+        PAYMENT_REJECTED: (PAYMENT_PROOF_UPLOADED,),
+        PAYMENT_VALIDATED: (PAYMENT_REFUNDED,),
+    },
+    timestamps={PAYMENT_VALIDATED: "validated_at"},
+    touch="updated_at"
+)
+
+TOURNAMENTS = StateMachine(
+    entity="tournoi",
+    table="tournaments",
+    keys_table=None,
+    statuses=(
+        TOURNAMENT_IN_REVIEW, TOURNAMENT_VALIDATED, TOURNAMENT_REJECTED,
+        TOURNAMENT_IN_PROGRESS, TOURNAMENT_UNAVAILABLE
+    ),
+    transitions={
+        # Décision admin sur un tournoi créé par un joueur
+        TOURNAMENT_IN_REVIEW: (TOURNAMENT_VALIDATED, TOURNAMENT_REJECTED),
+        TOURNAMENT_VALIDATED: (TOURNAMENT_IN_PROGRESS, TOURNAMENT_UNAVAILABLE),
+    },
+    versioned=False
+)
@@ -0,0 +1,70 @@
+"""
+Storage Service - Stockage objet S3-compatible (MinIO) des fichiers uploadés
+Les clés d'objets sont enregistrées en base (file_url, rendition_url, ...);
+les navigateurs y accèdent par des URLs présignées à durée limitée.
+"""
+import os
+import threading
+from typing import Optional
+
+import boto3
+from botocore.client import Config
+from botocore.exceptions import ClientError
+
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "http://minio:9000")
+# Endpoint vu par les navigateurs pour les URLs présignées (par défaut S3_ENDPOINT)
+S3_PUBLIC_ENDPOINT = os.getenv("S3_PUBLIC_ENDPOINT", S3_ENDPOINT)
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "minio")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "minio12345")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_BUCKET_PROOFS = os.getenv("S3_BUCKET_PROOFS", "proofs")
+
+# Durée de validité des URLs présignées (secondes)
+PRESIGNED_URL_SECONDS = 900
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client(endpoint: str = S3_ENDPOINT):
+    """
+    Client boto3 partagé par endpoint (thread-safe, pool de connexions réutilisé)
+    """
+    with _clients_lock:
+        if endpoint not in _clients:
+            _clients[endpoint] = boto3.client(
+                "s3",
+                endpoint_url=endpoint,
+                aws_access_key_id=S3_ACCESS_KEY,
+                aws_secret_access_key=S3_SECRET_KEY,
+                region_name=S3_REGION,
+                config=Config(signature_version="s3v4", s3={"addressing_style": "path"})
+            )
+        return _clients[endpoint]
+
+
+def put_object(key: str, data: bytes, content_type: str, bucket: str = S3_BUCKET_PROOFS) -> None:
+    _client().put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+
+
+def get_object(key: str, bucket: str = S3_BUCKET_PROOFS) -> Optional[bytes]:
+    """
+    Lire un objet (None s'il n'existe pas)
+    """
+    try:
+        return _client().get_object(Bucket=bucket, Key=key)["Body"].read()
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+def presigned_url(key: str, bucket: str = S3_BUCKET_PROOFS, expires: int = PRESIGNED_URL_SECONDS) -> str:
+    """
+    URL de lecture temporaire (calcul local, aucun appel réseau)
+    """
+    return _client(S3_PUBLIC_ENDPOINT).generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=expires
+    )
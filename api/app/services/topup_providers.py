@@ -0,0 +1,141 @@
+"""
+Top-up Providers - Adaptateurs des fournisseurs de recharge FreeFire
+Chaque fournisseur déclare sa concurrence maximale et son débit autorisé; le
+pipeline de livraison (app.services.delivery) les respecte.
+Sélection via TOPUP_PROVIDER (aucun par défaut: la livraison automatique est désactivée).
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional, Type
+
+
+class TopUpRequest(NamedTuple):
+    """
+    Recharge à effectuer (order_code sert de clé d'idempotence chez le fournisseur)
+    """
+    delivery_id: str
+    order_code: str
+    uid_freefire: str
+    sku: str
+
+
+class TopUpResult(NamedTuple):
+    """
+    Résultat d'un appel fournisseur
+
+    - delivered: recharge effectuée
+    - retry: erreur transitoire (timeout, 5xx, quota), nouvelle tentative plus tard
+    - failed: refus définitif (UID inconnu, SKU inconnu), pas de nouvelle tentative
+    """
+    status: str
+    reference: Optional[str] = None
+    error: Optional[str] = None
+
+
+class TopUpProvider(ABC):
+    """
+    Interface commune des fournisseurs
+    """
+    name = "base"
+    # Appels simultanés maximum vers le fournisseur (par processus)
+    max_concurrency = 4
+    # Appels par seconde autorisés par le fournisseur (par processus)
+    rate_per_second = 5.0
+
+    def __init__(self):
+        prefix = f"TOPUP_{self.name.upper()}_"
+        self.max_concurrency = int(os.getenv(prefix + "CONCURRENCY", self.max_concurrency))
+        self.rate_per_second = float(os.getenv(prefix + "RATE", self.rate_per_second))
+
+    @abstractmethod
+    def top_up(self, request: TopUpRequest) -> TopUpResult:
+        """
+        Créditer le compte du joueur (idempotent par order_code)
+        """
+
+
+class FakeProvider(TopUpProvider):
+    """
+    Fournisseur local pour les tests et le développement (aucun appel réseau)
+
+    Latence et taux d'erreur configurables; les order_code déjà livrés renvoient
+    la même référence (idempotence comme un vrai fournisseur).
+    """
+    name = "fake"
+    max_concurrency = 16
+    rate_per_second = 50.0
+
+    def __init__(self, latency: float = None, transient_error_rate: float = None, seed: int = None):
+        super().__init__()
+        self.latency = latency if latency is not None else float(os.getenv("TOPUP_FAKE_LATENCY", "0.05"))
+        self.transient_error_rate = (
+            transient_error_rate if transient_error_rate is not None
+            else float(os.getenv("TOPUP_FAKE_ERROR_RATE", "0"))
+        )
+        self.random = random.Random(seed)
+        self.delivered: Dict[str, str] = {}
+        self.calls: List[TopUpRequest] = []
+        self.lock = threading.Lock()
+
+    def top_up(self, request: TopUpRequest) -> TopUpResult:
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls.append(request)
+            if request.order_code in self.delivered:
+                return TopUpResult("delivered", self.delivered[request.order_code])
+            if not request.uid_freefire.isdigit():
+                return TopUpResult("failed", error="UID FreeFire invalide")
+            if self.random.random() < self.transient_error_rate:
+                return TopUpResult("retry", error="Erreur simulée du fournisseur")
+            reference = f"FAKE-{uuid.uuid4().hex[:12].upper()}"
+            self.delivered[request.order_code] = reference
+            return TopUpResult("delivered", reference)
+
+
+PROVIDERS: Dict[str, Type[TopUpProvider]] = {
+    FakeProvider.name: FakeProvider,
+}
+
+
+def get_provider(name: str = None) -> Optional[TopUpProvider]:
+    """
+    Instancier le fournisseur demandé (TOPUP_PROVIDER par défaut, None si non configuré)
+    """
+    name = name or os.getenv("TOPUP_PROVIDER", "")
+    if not name:
+        return None
+    if name not in PROVIDERS:
+        raise ValueError(f"Fournisseur de recharge inconnu: {name} (disponibles: {', '.join(PROVIDERS)})")
+    return PROVIDERS[name]()
+
+
+class RateLimiter:
+    """
+    Seau à jetons thread-safe: rate_per_second appels en régime, rafale d'une seconde
+    """
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self.capacity = max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Attendre qu'un jeton soit disponible
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,129 @@
+"""
+Upcoming Feed - Flux pré-sérialisé des prochains tournois publics validés
+Le JSON est construit une fois puis servi tel quel (bytes) jusqu'à la fin de la
+tranche de temps courante, au premier démarrage d'un tournoi du flux, ou à une
+invalidation explicite (création / validation / rejet d'un tournoi). L'ETag ne
+dépend que des tournois: un flux reconstruit à l'identique garde le même ETag.
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Optional, Tuple
+from datetime import datetime, timezone
+
+from app.database import SessionLocal
+from app.models import Tournament, EntryFee
+
+# Durée d'une tranche: chaque worker reconstruit au plus une fois par tranche
+BUCKET_SECONDS = 60
+
+# Nombre de tournois servis dans le flux
+FEED_SIZE = 20
+
+
+class _FeedCache:
+    """
+    Cache du flux pour ce processus (un par worker)
+    """
+
+    def __init__(self):
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.expires_at = 0.0
+        # Incrémentée à chaque invalidation: une construction commencée avant est périmée
+        self.generation = 0
+        self.lock = threading.Lock()
+
+
+_cache = _FeedCache()
+
+
+def invalidate() -> None:
+    """
+    Forcer la reconstruction du flux à la prochaine requête
+    """
+    _cache.generation += 1
+    _cache.expires_at = 0.0
+
+
+def _build() -> Tuple[bytes, str, float]:
+    """
+    Construire le JSON du flux, son ETag et son instant d'expiration
+    """
+    now = time.time()
+    bucket_end = (int(now) // BUCKET_SECONDS + 1) * BUCKET_SECONDS
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Tournament, EntryFee.amount)
+            .outerjoin(EntryFee, EntryFee.id == Tournament.entry_fee_id)
+            .filter(
+                Tournament.visibility == "public",
+                Tournament.status == "valide",
+                Tournament.start_at > datetime.utcfromtimestamp(now)
+            )
+            .order_by(Tournament.start_at.asc())
+            .limit(FEED_SIZE)
+            .all()
+        )
+    finally:
+        db.close()
+
+    items = [
+        {
+            "id": str(t.id),
+            "mode": t.mode,
+            "description": t.description,
+            "reward_text": t.reward_text,
+            "start_at": t.start_at.isoformat(),
+            "entry_fee_id": str(t.entry_fee_id) if t.entry_fee_id else None,
+            "entry_fee_amount": float(amount) if amount is not None else None,
+            "contact_whatsapp": t.contact_whatsapp,
+        }
+        for t, amount in rows
+    ]
+    tournaments = json.dumps(items, separators=(",", ":"))
+    body = ('{"generated_at":%d,"tournaments":%s}' % (int(now), tournaments)).encode()
+    etag = '"' + hashlib.sha1(tournaments.encode()).hexdigest()[:16] + '"'
+
+    # Le premier tournoi qui démarre doit sortir du flux sans attendre la fin de la tranche
+    expires_at = bucket_end
+    if rows:
+        first_start = rows[0][0].start_at
+        if first_start.tzinfo is None:
+            first_start = first_start.replace(tzinfo=timezone.utc)
+        expires_at = min(expires_at, first_start.timestamp())
+
+    return body, etag, expires_at
+
+
+def get_feed() -> Tuple[bytes, str]:
+    """
+    Retourner (corps JSON, ETag); reconstruit une seule fois par expiration (single-flight)
+
+    Une construction pendant laquelle le flux est invalidé a pu lire la base avant le
+    commit de la modification: elle est servie à cette requête mais pas mise en cache.
+    """
+    if _cache.body is not None and time.time() < _cache.expires_at:
+        return _cache.body, _cache.etag
+
+    with _cache.lock:
+        # Un autre thread a pu reconstruire pendant l'attente du verrou
+        if _cache.body is None or time.time() >= _cache.expires_at:
+            generation = _cache.generation
+            body, etag, expires_at = _build()
+            if _cache.generation != generation:
+                return body, etag
+            _cache.body = body
+            _cache.etag = etag
+            _cache.expires_at = expires_at
+        return _cache.body, _cache.etag
+
+
+def is_fresh() -> bool:
+    """
+    Le flux en cache peut-il être servi sans reconstruction ?
+    """
+    return _cache.body is not None and time.time() < _cache.expires_at
@@ -0,0 +1,100 @@
+"""
+Worker des tâches en arrière-plan
+Réserve les jobs avec FOR UPDATE SKIP LOCKED (plusieurs workers possibles), exécute
+les handlers enregistrés et replanifie les échecs avec backoff exponentiel.
+
+Usage: python -m app.worker [--queue default] [--batch 10]
+"""
+import argparse
+import os
+import signal
+import socket
+import time
+import traceback
+
+from app.database import SessionLocal
+from app.services import jobs
+from app.services import job_handlers  # noqa: F401 - enregistre les handlers
+
+POLL_INTERVAL_SECONDS = float(os.getenv("JOBS_POLL_INTERVAL", "1.0"))
+
+
+class Worker:
+    """
+    Boucle de consommation de la table jobs
+    """
+
+    def __init__(self, queue: str = "default", batch_size: int = 10):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = True
+
+    def stop(self, *_):
+        """
+        Arrêt propre: terminer le lot en cours puis sortir
+        """
+        self.running = False
+
+    def run_job(self, job: dict) -> None:
+        """
+        Exécuter un job dans sa propre transaction
+        """
+        handler = jobs.HANDLERS.get(job["kind"])
+        db = SessionLocal()
+        try:
+            if handler is None:
+                raise LookupError(f"Aucun handler pour le job {job['kind']}")
+            handler(db, job["payload"])
+            if jobs.mark_done(db, job["id"], self.worker_id):
+                db.commit()
+            else:
+                # Bail expiré et repris: le nouveau détenteur refait le job
+                db.rollback()
+                print(f"⚠️ Job {job['id']} repris par un autre worker, résultat abandonné")
+        except Exception:
+            db.rollback()
+            jobs.mark_failed(db, job, traceback.format_exc(limit=5), self.worker_id)
+        finally:
+            db.close()
+
+    def run_once(self) -> int:
+        """
+        Réserver et exécuter un lot de jobs, retourne le nombre traité
+        """
+        db = SessionLocal()
+        try:
+            claimed = jobs.claim_jobs(db, self.worker_id, self.queue, self.batch_size)
+        finally:
+            db.close()
+
+        for job in claimed:
+            self.run_job(job)
+        return len(claimed)
+
+    def run(self) -> None:
+        """
+        Boucle principale: enchaîner les lots tant qu'il y a du travail
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print(f"🛠️ Worker {self.worker_id} démarré (queue={self.queue})")
+
+        while self.running:
+            processed = self.run_once()
+            if processed == 0:
+                time.sleep(POLL_INTERVAL_SECONDS)
+
+        print(f"🛑 Worker {self.worker_id} arrêté")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker des tâches en arrière-plan")
+    parser.add_argument("--queue", default="default")
+    parser.add_argument("--batch", type=int, default=10)
+    args = parser.parse_args()
+    Worker(queue=args.queue, batch_size=args.batch).run()
+
+
+if __name__ == "__main__":
+    main()
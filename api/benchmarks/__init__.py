@@ -0,0 +1,3 @@
+"""
+Benchmarks package - Mesures de performance (nécessitent une base PostgreSQL)
+"""
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark du coût d'une requête authentifiée
+Compare get_current_user (décodage JWT + SELECT users) et get_current_principal
+(décodage JWT + filtre de révocation en mémoire, sans base de données).
+
+Prérequis: PostgreSQL accessible via DATABASE_URL (un utilisateur temporaire est créé puis supprimé)
+Usage: cd api && python -m benchmarks.bench_auth --requests 2000
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.dependencies.auth import create_access_token, get_current_principal, get_current_user
+from app.models import User
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/with-db")
+def with_db(user=Depends(get_current_user)):
+    return {"id": str(user.id)}
+
+
+@bench_app.get("/claims-only")
+def claims_only(principal=Depends(get_current_principal)):
+    return {"id": str(principal.id)}
+
+
+def measure(client: TestClient, path: str, headers: dict, count: int) -> list:
+    # Échauffement (pool de connexions, caches)
+    for _ in range(50):
+        client.get(path, headers=headers)
+
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append((time.perf_counter() - start) * 1e6)
+        assert response.status_code == 200, response.text
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{label:<14} médiane {statistics.median(timings):8.1f} µs   p99 {p99:8.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'authentification")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    user = User(email=f"bench-{uuid.uuid4().hex[:8]}@bench.local", password_hash="x", role="user")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+
+    try:
+        token = create_access_token(str(user.id), user.email, user.role)
+        headers = {"Authorization": f"Bearer {token}"}
+        client = TestClient(bench_app)
+
+        print(f"{args.requests} requêtes par variante")
+        report("avec DB", measure(client, "/with-db", headers, args.requests))
+        report("claims seuls", measure(client, "/claims-only", headers, args.requests))
+    finally:
+        db.delete(user)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Benchmark des backends JWT et du cache de tokens vérifiés
+Mesure, pour chaque backend installé, le décodage brut (vérification HS256 complète)
+puis decode_token avec le cache de tokens vérifiés.
+
+Aucune base de données requise.
+Usage: cd api && python -m benchmarks.bench_jwt --iterations 20000
+"""
+import argparse
+import time
+import uuid
+
+from app.dependencies import auth
+from app.services.jwt_backends import available_backends, get_backend
+
+
+def per_call_us(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des backends JWT")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = auth.create_access_token(str(uuid.uuid4()), "bench@bench.local", "user")
+    print(f"{args.iterations} décodages par mesure")
+
+    for name in available_backends():
+        backend = get_backend(name)
+        cost = per_call_us(lambda: backend.decode(token, auth.JWT_SECRET, [auth.JWT_ALGORITHM]), args.iterations)
+        print(f"{name:<12} décodage complet   {cost:8.2f} µs")
+
+    auth.decode_token(token)  # remplit le cache
+    cost = per_call_us(lambda: auth.decode_token(token), args.iterations)
+    print(f"{'cache':<12} decode_token        {cost:8.2f} µs  (backend actif: {auth.jwt_backend.name})")
+
+
+if __name__ == "__main__":
+    main()
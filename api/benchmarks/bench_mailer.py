@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'envoi des emails
+Envoie des emails de vérification rendus par les templates vers le serveur SMTP
+configuré, d'abord avec une connexion par message (envoi naïf) puis par lots sur
+les connexions du pool (app.mail_worker).
+
+Aucune base de données requise. Prérequis: un serveur SMTP local (MailHog).
+Usage: cd api && SMTP_HOST=localhost SMTP_PORT=1025 python -m benchmarks.bench_mailer --count 500
+"""
+import argparse
+import smtplib
+import time
+import uuid
+
+from app.services import mailer
+
+
+def make_emails(count: int) -> list:
+    emails = []
+    for index in range(count):
+        subject, body_text, body_html = mailer.render("verify_email", {
+            "display_name": f"Joueur {index}",
+            "link": f"{mailer.FRONTEND_URL}/verify-email?token={uuid.uuid4().hex}",
+            "expires_hours": 24,
+        })
+        emails.append({
+            "id": uuid.uuid4(),
+            "to_address": f"bench{index}@bench.local",
+            "subject": subject,
+            "body_text": body_text,
+            "body_html": body_html,
+        })
+    return emails
+
+
+def one_connection_per_message(emails: list) -> float:
+    start = time.perf_counter()
+    for email in emails:
+        with smtplib.SMTP(mailer.SMTP_HOST, mailer.SMTP_PORT, timeout=mailer.SMTP_TIMEOUT_SECONDS) as smtp:
+            if mailer.SMTP_USER:
+                smtp.login(mailer.SMTP_USER, mailer.SMTP_PASSWORD)
+            smtp.send_message(mailer.build_message(email))
+    return time.perf_counter() - start
+
+
+def pooled(emails: list, batch_size: int, pool_size: int) -> tuple:
+    sender = mailer.Sender(pool_size)
+    statuses = {}
+    start = time.perf_counter()
+    for offset in range(0, len(emails), batch_size):
+        for _, result in sender.send_batch(emails[offset:offset + batch_size]):
+            statuses[result.status] = statuses.get(result.status, 0) + 1
+    elapsed = time.perf_counter() - start
+    opened = sender.pool.opened
+    sender.shutdown()
+    return elapsed, statuses, opened
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'envoi des emails")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--pool", type=int, default=mailer.SMTP_POOL_SIZE)
+    args = parser.parse_args()
+
+    if not mailer.SMTP_HOST:
+        parser.error("SMTP_HOST manquant")
+
+    emails = make_emails(args.count)
+    naive = one_connection_per_message(emails)
+    print(f"connexion par message   {args.count / naive:8.0f} emails/s   ({args.count} connexions)")
+
+    elapsed, statuses, opened = pooled(emails, args.batch, args.pool)
+    print(f"pool ({args.pool} connexions)   {args.count / elapsed:8.0f} emails/s   ({opened} connexions, {statuses})")
+
+
+if __name__ == "__main__":
+    main()
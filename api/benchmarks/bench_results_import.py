@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'import des feuilles de résultats
+Génère une feuille synthétique (salles de 48 joueurs, quelques lignes invalides)
+puis mesure la lecture CSV / XLSX, la validation et le calcul des points. La
+résolution des UID est remplacée par un index en mémoire (une seule requête en
+production).
+
+Aucune base de données requise.
+Usage: cd api && python -m benchmarks.bench_results_import --rows 50000 --xlsx
+"""
+import argparse
+import csv
+import io
+import random
+import time
+
+import numpy as np
+
+from app.services import results_import, scoring
+
+
+def generate_rows(count: int, room_size: int = 48) -> list:
+    rows = []
+    for index in range(count):
+        room_no, seat = divmod(index, room_size)
+        uid = str(1_000_000_000 + index)
+        placement = seat // 4 + 1
+        kills = random.randint(0, 8)
+        if random.random() < 0.001:
+            uid = "inconnu"
+        rows.append((1, room_no + 1, uid, placement, kills))
+    return rows
+
+
+def csv_sheet(rows: list) -> io.BytesIO:
+    text_stream = io.StringIO()
+    writer = csv.writer(text_stream, delimiter=";")
+    writer.writerow(("Match", "Salle", "UID FreeFire", "Place", "Kills"))
+    writer.writerows(rows)
+    return io.BytesIO(text_stream.getvalue().encode())
+
+
+def xlsx_sheet(rows: list) -> io.BytesIO:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(("Match", "Salle", "UID FreeFire", "Place", "Kills"))
+    for row in rows:
+        sheet.append((row[0], row[1], int(row[2]) if row[2].isdigit() else row[2], row[3], row[4]))
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+    return stream
+
+
+def run(label: str, stream: io.BytesIO, filename: str, known: dict) -> None:
+    start = time.perf_counter()
+    sheet = results_import.read_sheet(stream, filename)
+    read_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    distinct_uids, uid_positions = np.unique(np.array(sheet.uids, dtype=str), return_inverse=True)
+    resolved = np.array([known.get(uid, -1) for uid in distinct_uids.tolist()], dtype=np.int64)
+    user_index = resolved[uid_positions.reshape(-1)]
+    masks = results_import.validate(sheet, user_index)
+    rows = np.flatnonzero(masks.pop("_accepted"))
+    points = scoring.score(scoring.DEFAULT_RULES["BR_SQUAD"], sheet.placement[rows], sheet.kills[rows])
+    score_ms = (time.perf_counter() - start) * 1000
+
+    rejected = {reason: int(mask.sum()) for reason, mask in masks.items()}
+    print(f"{label:5} {len(sheet.lines)} lignes   lecture {read_ms:7.1f} ms   "
+          f"validation + points {score_ms:6.1f} ms   acceptées {len(rows)}   rejets {rejected}   "
+          f"points {int(points.sum())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'import des feuilles de résultats")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--xlsx", action="store_true", help="Mesurer aussi une feuille XLSX")
+    args = parser.parse_args()
+
+    rows = generate_rows(args.rows)
+    known = {row[2]: index for index, row in enumerate(rows) if row[2] != "inconnu"}
+    run("CSV", csv_sheet(rows), "resultats.csv", known)
+    if args.xlsx:
+        run("XLSX", xlsx_sheet(rows), "resultats.xlsx", known)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Rejeu de callbacks opérateurs contre POST /payments/webhooks/<opérateur>
+Envoie des callbacks signés en parallèle et mesure le débit et la latence
+d'acquittement (commit groupé côté API, application par le worker).
+
+Sources des callbacks:
+- par défaut: paiements en attente de l'opérateur lus en base (validés par le worker)
+- --synthetic: identifiants aléatoires (ingestion seule, issue unknown_payment)
+- --replay: derniers callbacks enregistrés, renvoyés tels quels (dédoublonnage)
+
+Prérequis: API démarrée avec PAYMENT_<OPÉRATEUR>_WEBHOOK_SECRET, même secret ici
+Usage: cd api && python -m benchmarks.webhook_replay --provider mtn_momo --count 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+
+import httpx
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.services.payment_providers import registry
+
+
+def callback_payload(provider: str, payment: dict) -> dict:
+    """
+    Corps d'un callback réussi au format de l'opérateur
+    """
+    transaction_id = uuid.uuid4().hex[:16].upper()
+    if provider == "mtn_momo":
+        return {
+            "referenceId": payment["id"],
+            "externalId": payment["reference"],
+            "financialTransactionId": transaction_id,
+            "amount": payment["amount"],
+            "currency": payment["currency"],
+            "payer": {"partyIdType": "MSISDN", "partyId": payment["msisdn"]},
+            "status": "SUCCESSFUL",
+        }
+    return {
+        "reference": payment["id"],
+        "transaction_id": transaction_id,
+        "amount": payment["amount"],
+        "currency": payment["currency"],
+        "msisdn": payment["msisdn"],
+        "status": "SUCCESS",
+    }
+
+
+def load_payments(provider: str, count: int) -> list:
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("""
+                SELECT id, reference, amount, currency, payer_msisdn FROM payments
+                WHERE method = :provider AND status IN ('pending', 'proof_uploaded')
+                ORDER BY created_at DESC
+                LIMIT :count
+            """),
+            {"provider": provider, "count": count}
+        ).all()
+    finally:
+        db.close()
+    return [
+        {"id": str(row.id), "reference": row.reference, "amount": str(row.amount),
+         "currency": row.currency, "msisdn": row.payer_msisdn or "22990000001"}
+        for row in rows
+    ]
+
+
+def synthetic_payments(count: int) -> list:
+    return [
+        {"id": str(uuid.uuid4()), "reference": f"PAY{uuid.uuid4().hex[:12].upper()}",
+         "amount": str(random.choice((500, 1000, 2500, 5000))), "currency": "XOF", "msisdn": "22990000001"}
+        for _ in range(count)
+    ]
+
+
+def stored_callbacks(provider: str, count: int) -> list:
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("""
+                SELECT payload FROM payment_webhook_events
+                WHERE provider = :provider
+                ORDER BY id DESC
+                LIMIT :count
+            """),
+            {"provider": provider, "count": count}
+        ).all()
+    finally:
+        db.close()
+    return [row.payload for row in rows]
+
+
+async def fire(url: str, bodies: list, provider, concurrency: int) -> tuple:
+    timings = []
+    statuses = {}
+    duplicates = 0
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    async def sender(client: httpx.AsyncClient):
+        nonlocal duplicates
+        while not queue.empty():
+            body = queue.get_nowait()
+            timestamp = str(int(time.time()))
+            headers = {
+                "Content-Type": "application/json",
+                "X-Webhook-Timestamp": timestamp,
+                "X-Webhook-Signature": provider.sign(body, timestamp),
+            }
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, content=body, headers=headers)
+                status = response.status_code
+                if status == 200 and response.json().get("duplicate"):
+                    duplicates += 1
+            except httpx.HTTPError as exc:
+                status = exc.__class__.__name__
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return timings, statuses, duplicates, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejeu de callbacks opérateurs")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--provider", default="mtn_momo", choices=("mtn_momo", "moov_money"))
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Part de renvois du même callback")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--synthetic", action="store_true")
+    source.add_argument("--replay", action="store_true")
+    args = parser.parse_args()
+
+    provider = registry.get(args.provider)
+    if not provider.webhook_secret:
+        parser.error(f"PAYMENT_{args.provider.upper()}_WEBHOOK_SECRET manquant")
+
+    if args.replay:
+        payloads = stored_callbacks(args.provider, args.count)
+    else:
+        payments = synthetic_payments(args.count) if args.synthetic else load_payments(args.provider, args.count)
+        payloads = [callback_payload(args.provider, payment) for payment in payments]
+        # Renvois: l'opérateur répète un callback tant qu'il n'a pas reçu de 200
+        payloads += random.sample(payloads, int(len(payloads) * args.duplicates))
+        random.shuffle(payloads)
+    if not payloads:
+        parser.error("Aucun callback à envoyer (--synthetic pour des paiements fictifs)")
+
+    bodies = [json.dumps(payload).encode() for payload in payloads]
+    url = f"{args.url.rstrip('/')}/payments/webhooks/{args.provider}"
+    timings, statuses, duplicates, elapsed = asyncio.run(fire(url, bodies, provider, args.concurrency))
+
+    timings.sort()
+    print(f"{len(bodies)} callbacks en {elapsed:.2f} s: {len(bodies) / elapsed:,.0f} callbacks/s")
+    print(f"statuts HTTP {statuses}, renvois acquittés sans effet {duplicates}")
+    print(
+        f"latence médiane {statistics.median(timings):.1f} ms   "
+        f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms   "
+        f"p99 {timings[int(len(timings) * 0.99) - 1]:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+-- =================================================================
+-- Migration 007: File de tâches en arrière-plan
+-- Description: Table des jobs consommée par le worker (FOR UPDATE SKIP LOCKED)
+-- =================================================================
+
+-- Table des jobs
+CREATE TABLE IF NOT EXISTS jobs (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  queue VARCHAR(32) NOT NULL DEFAULT 'default',
+  kind VARCHAR(64) NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+  status VARCHAR(16) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued','running','done','failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 5,
+  run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_at TIMESTAMPTZ NULL,
+  locked_by VARCHAR(64) NULL,
+  last_error TEXT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Index partiel: seuls les jobs à exécuter sont parcourus par le worker
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(queue, run_at) WHERE status = 'queued';
+-- Récupération des jobs abandonnés par un worker arrêté brutalement
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(locked_at) WHERE status = 'running';
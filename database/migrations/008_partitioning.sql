@@ -0,0 +1,215 @@
+-- =================================================================
+-- Migration 008: Partitionnement mensuel de orders et payments
+-- Description: Partitions RANGE (created_at) par mois, création automatique
+--              des partitions futures et tables de clés globales pour
+--              conserver l'unicité de order_code / reference
+-- =================================================================
+--
+-- Une table partitionnée ne peut porter une contrainte UNIQUE que si elle
+-- inclut la clé de partition. Les clés métier (id, order_code, reference,
+-- idempotency_key) sont donc enregistrées dans des tables étroites non
+-- partitionnées (order_keys, payment_keys) alimentées par trigger. Elles
+-- garantissent l'unicité globale, servent de cible aux clés étrangères et
+-- permettent de retrouver created_at pour cibler une seule partition.
+--
+-- Détacher une ancienne partition (sans verrou bloquant, PostgreSQL 14+):
+--   ALTER TABLE payments DETACH PARTITION payments_y2025m01 CONCURRENTLY;
+
+BEGIN;
+
+-- -----------------------------------------------------------------
+-- Fonctions de gestion des partitions
+-- -----------------------------------------------------------------
+
+-- Créer la partition mensuelle <parent>_yYYYYmMM contenant `month`
+CREATE OR REPLACE FUNCTION create_monthly_partition(parent TEXT, month DATE)
+RETURNS TEXT AS $$
+DECLARE
+  start_at DATE := date_trunc('month', month)::date;
+  end_at DATE := (date_trunc('month', month) + INTERVAL '1 month')::date;
+  partition_name TEXT := format('%s_y%sm%s', parent, to_char(start_at, 'YYYY'), to_char(start_at, 'MM'));
+BEGIN
+  EXECUTE format(
+    'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+    partition_name, parent, start_at, end_at
+  );
+  RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- S'assurer que les partitions existent de `from_month` jusqu'à `months_ahead` mois dans le futur
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent TEXT, from_month DATE, months_ahead INT DEFAULT 3)
+RETURNS INT AS $$
+DECLARE
+  month DATE := date_trunc('month', from_month)::date;
+  last_month DATE := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+  created INT := 0;
+BEGIN
+  WHILE month <= last_month LOOP
+    PERFORM create_monthly_partition(parent, month);
+    created := created + 1;
+    month := (month + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------------------
+-- Tables de clés globales
+-- -----------------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS order_keys (
+  id UUID PRIMARY KEY,
+  order_code VARCHAR(20) UNIQUE NOT NULL,
+  idempotency_key VARCHAR(64) UNIQUE NULL,
+  created_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS payment_keys (
+  id UUID PRIMARY KEY,
+  reference VARCHAR(40) UNIQUE NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL
+);
+
+INSERT INTO order_keys (id, order_code, idempotency_key, created_at)
+SELECT id, order_code, idempotency_key, created_at FROM orders
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO payment_keys (id, reference, created_at)
+SELECT id, reference, created_at FROM payments
+ON CONFLICT (id) DO NOTHING;
+
+-- -----------------------------------------------------------------
+-- orders partitionnée
+-- -----------------------------------------------------------------
+
+ALTER TABLE orders RENAME TO orders_legacy;
+
+CREATE TABLE orders (
+  id UUID NOT NULL DEFAULT uuid_generate_v4(),
+  order_code VARCHAR(20) NOT NULL,
+  user_id UUID NOT NULL,
+  catalog_item_id UUID NOT NULL,
+  uid_freefire VARCHAR(32) NOT NULL,
+  status VARCHAR(20) NOT NULL CHECK (status IN ('achete','en_attente','livre')),
+  total_amount NUMERIC(12,2) NOT NULL,
+  currency CHAR(3) NOT NULL DEFAULT 'XOF',
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  idempotency_key VARCHAR(64) NULL,
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+SELECT ensure_monthly_partitions('orders', COALESCE((SELECT min(created_at) FROM orders_legacy), now())::date, 3);
+
+INSERT INTO orders (id, order_code, user_id, catalog_item_id, uid_freefire, status, total_amount, currency, created_at, idempotency_key)
+SELECT id, order_code, user_id, catalog_item_id, uid_freefire, status, total_amount, currency, created_at, idempotency_key
+FROM orders_legacy;
+
+DROP TABLE orders_legacy;
+
+CREATE INDEX IF NOT EXISTS idx_orders_code ON orders(order_code);
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status, created_at DESC);
+
+-- -----------------------------------------------------------------
+-- payments partitionnée
+-- -----------------------------------------------------------------
+
+ALTER TABLE payment_proofs DROP CONSTRAINT IF EXISTS payment_proofs_payment_id_fkey;
+ALTER TABLE tournament_registrations DROP CONSTRAINT IF EXISTS tournament_registrations_payment_id_fkey;
+
+ALTER TABLE payments RENAME TO payments_legacy;
+DROP INDEX IF EXISTS idx_pay_status;
+
+CREATE TABLE payments (
+  id UUID NOT NULL DEFAULT uuid_generate_v4(),
+  type VARCHAR(16) NOT NULL CHECK (type IN ('order','entry_fee')),
+  target_id UUID NOT NULL,
+  user_id UUID NOT NULL,
+  country CHAR(2) NOT NULL,
+  method VARCHAR(32),
+  currency CHAR(3) NOT NULL DEFAULT 'XOF',
+  amount NUMERIC(12,2) NOT NULL,
+  status VARCHAR(20) NOT NULL CHECK (status IN ('initiated','pending_review','confirmed','expired','rejected','refunded')),
+  reference VARCHAR(40) NOT NULL,
+  order_code VARCHAR(20),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+SELECT ensure_monthly_partitions('payments', COALESCE((SELECT min(created_at) FROM payments_legacy), now())::date, 3);
+
+INSERT INTO payments (id, type, target_id, user_id, country, method, currency, amount, status, reference, order_code, created_at, updated_at)
+SELECT id, type, target_id, user_id, country, method, currency, amount, status, reference, order_code, created_at, updated_at
+FROM payments_legacy;
+
+DROP TABLE payments_legacy;
+
+CREATE INDEX IF NOT EXISTS idx_pay_status ON payments(status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_pay_reference ON payments(reference);
+CREATE INDEX IF NOT EXISTS idx_pay_user ON payments(user_id, created_at DESC);
+
+-- Les clés étrangères pointent désormais vers la table de clés globale
+ALTER TABLE payment_proofs
+  ADD CONSTRAINT payment_proofs_payment_id_fkey
+  FOREIGN KEY (payment_id) REFERENCES payment_keys(id) ON DELETE CASCADE;
+ALTER TABLE tournament_registrations
+  ADD CONSTRAINT tournament_registrations_payment_id_fkey
+  FOREIGN KEY (payment_id) REFERENCES payment_keys(id) ON DELETE SET NULL;
+
+-- -----------------------------------------------------------------
+-- Synchronisation des tables de clés
+-- -----------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION sync_order_keys() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO order_keys (id, order_code, idempotency_key, created_at)
+    VALUES (NEW.id, NEW.order_code, NEW.idempotency_key, NEW.created_at);
+  ELSIF TG_OP = 'UPDATE' THEN
+    UPDATE order_keys
+    SET order_code = NEW.order_code, idempotency_key = NEW.idempotency_key, created_at = NEW.created_at
+    WHERE id = OLD.id;
+  ELSE
+    DELETE FROM order_keys WHERE id = OLD.id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_payment_keys() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO payment_keys (id, reference, created_at)
+    VALUES (NEW.id, NEW.reference, NEW.created_at);
+  ELSIF TG_OP = 'UPDATE' THEN
+    UPDATE payment_keys
+    SET reference = NEW.reference, created_at = NEW.created_at
+    WHERE id = OLD.id;
+  ELSE
+    DELETE FROM payment_keys WHERE id = OLD.id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_orders_keys
+  AFTER INSERT OR DELETE OR UPDATE OF order_code, idempotency_key, created_at ON orders
+  FOR EACH ROW EXECUTE FUNCTION sync_order_keys();
+
+CREATE TRIGGER trg_payments_keys
+  AFTER INSERT OR DELETE OR UPDATE OF reference, created_at ON payments
+  FOR EACH ROW EXECUTE FUNCTION sync_payment_keys();
+
+-- -----------------------------------------------------------------
+-- Maintenance quotidienne des partitions futures (exécutée par le worker)
+-- -----------------------------------------------------------------
+
+INSERT INTO jobs (queue, kind, payload)
+SELECT 'default', 'maintenance.partitions', '{}'::jsonb
+WHERE NOT EXISTS (
+  SELECT 1 FROM jobs WHERE kind = 'maintenance.partitions' AND status IN ('queued','running')
+);
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- =================================================================
+-- Migration 009: Recherche plein texte et floue des tournois
+-- Description: Colonnes générées tsvector / texte + index GIN (FTS et trigrammes)
+-- =================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Vecteur plein texte pondéré: description (A) puis récompense (B)
+ALTER TABLE tournaments
+  ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('french', coalesce(description, '')), 'A') ||
+    setweight(to_tsvector('french', coalesce(reward_text, '')), 'B')
+  ) STORED;
+
+-- Texte brut concaténé pour la correspondance floue (fautes de frappe)
+ALTER TABLE tournaments
+  ADD COLUMN IF NOT EXISTS search_text TEXT
+  GENERATED ALWAYS AS (
+    coalesce(description, '') || ' ' || coalesce(reward_text, '')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_tourn_search_vector ON tournaments USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_tourn_search_trgm ON tournaments USING GIN (search_text gin_trgm_ops);
@@ -0,0 +1,10 @@
+-- =================================================================
+-- Migration 010: Filtres du catalogue
+-- Description: Index GIN sur les attributs JSONB et index sur le prix
+-- =================================================================
+
+-- Filtres attributs: containment (@>) et présence de clé (?)
+CREATE INDEX IF NOT EXISTS idx_catalog_attributes ON catalog_items USING GIN (attributes);
+
+-- Filtres et tris par prix sur les produits actifs
+CREATE INDEX IF NOT EXISTS idx_catalog_active_price ON catalog_items(active, price_amount);
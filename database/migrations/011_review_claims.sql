@@ -0,0 +1,11 @@
+-- =================================================================
+-- Migration 011: File de revue des paiements avec baux de réservation
+-- Description: Un admin réserve les preuves à examiner pour une durée limitée
+-- =================================================================
+
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS claimed_by UUID NULL;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMPTZ NULL;
+
+-- File de revue: paiements en attente, du plus ancien au plus récent
+CREATE INDEX IF NOT EXISTS idx_pay_review_queue ON payments(created_at)
+  WHERE status IN ('pending', 'proof_uploaded');
@@ -0,0 +1,25 @@
+-- =================================================================
+-- Migration 012: Révocation des tokens JWT
+-- Description: Révocations par token (logout) ou par utilisateur (changement
+--              de rôle, réinitialisation du mot de passe), synchronisées entre
+--              workers via NOTIFY token_revocations
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS token_revocations (
+  id BIGSERIAL PRIMARY KEY,
+  jti VARCHAR(64) NULL,              -- Token précis révoqué (logout)
+  user_id UUID NULL,                 -- Tous les tokens de l'utilisateur...
+  revoked_before BIGINT NULL,        -- ...émis avant cet instant (epoch, claim iat)
+  expires_at TIMESTAMPTZ NOT NULL,   -- Au-delà, les tokens concernés ont expiré
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  CHECK (jti IS NOT NULL OR (user_id IS NOT NULL AND revoked_before IS NOT NULL))
+);
+
+CREATE INDEX IF NOT EXISTS idx_token_revocations_expires ON token_revocations(expires_at);
+
+-- Purge quotidienne des révocations expirées (exécutée par le worker)
+INSERT INTO jobs (queue, kind, payload)
+SELECT 'default', 'maintenance.token_revocations', '{}'::jsonb
+WHERE NOT EXISTS (
+  SELECT 1 FROM jobs WHERE kind = 'maintenance.token_revocations' AND status IN ('queued','running')
+);
@@ -0,0 +1,23 @@
+-- =================================================================
+-- Migration 013: Versions réduites des preuves de paiement
+-- Description: Rendu de revue compressé et miniature générés par le worker
+--              après l'upload (job proofs.renditions)
+-- =================================================================
+
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS renditions_status VARCHAR(16) NOT NULL DEFAULT 'pending';
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS rendition_url TEXT NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS rendition_bytes INTEGER NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS rendition_width INTEGER NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS rendition_height INTEGER NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS thumbnail_url TEXT NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS thumbnail_bytes INTEGER NULL;
+
+-- pending | done | unsupported (PDF) | failed
+ALTER TABLE payment_proofs DROP CONSTRAINT IF EXISTS payment_proofs_renditions_status_check;
+ALTER TABLE payment_proofs ADD CONSTRAINT payment_proofs_renditions_status_check
+  CHECK (renditions_status IN ('pending', 'done', 'unsupported', 'failed'));
+
+-- Preuves existantes: métadonnées seules, rien à réduire
+UPDATE payment_proofs SET renditions_status = 'unsupported' WHERE renditions_status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_payment_proofs_payment ON payment_proofs(payment_id);
@@ -0,0 +1,36 @@
+-- =================================================================
+-- Migration 014: Livraison automatique des commandes payées
+-- Description: File des recharges à effectuer auprès du fournisseur
+--              (consommée par python -m app.delivery_worker)
+-- =================================================================
+
+-- Date de livraison effective des commandes
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS delivered_at TIMESTAMPTZ NULL;
+
+-- Une livraison par commande; les champs utiles au fournisseur sont copiés
+-- à la mise en file pour ne pas relire orders / catalog_items à chaque tentative
+CREATE TABLE IF NOT EXISTS deliveries (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  order_id UUID NOT NULL UNIQUE REFERENCES order_keys(id) ON DELETE CASCADE,
+  order_created_at TIMESTAMPTZ NOT NULL,
+  order_code VARCHAR(20) NOT NULL,
+  user_id UUID NOT NULL,
+  uid_freefire VARCHAR(32) NOT NULL,
+  sku VARCHAR(60) NOT NULL,
+  provider VARCHAR(32) NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued','in_flight','delivered','failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 8,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_at TIMESTAMPTZ NULL,
+  locked_by VARCHAR(64) NULL,
+  provider_reference VARCHAR(120) NULL,
+  last_error TEXT NULL,
+  delivered_at TIMESTAMPTZ NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Index partiels: seules les livraisons à traiter sont parcourues
+CREATE INDEX IF NOT EXISTS idx_deliveries_ready ON deliveries(provider, next_attempt_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_deliveries_in_flight ON deliveries(locked_at) WHERE status = 'in_flight';
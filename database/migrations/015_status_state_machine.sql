@@ -0,0 +1,40 @@
+-- =================================================================
+-- Migration 015: Machine à états des commandes et paiements
+-- Description: Vocabulaire de statuts unique (celui de l'API, voir
+--              app/services/state_machine.py) et colonne version pour les
+--              transitions gardées (UPDATE ... WHERE status = :from AND version = :v)
+-- =================================================================
+
+-- Colonnes de version (propagées aux partitions)
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS validated_at TIMESTAMPTZ NULL;
+
+-- Commandes: achete / en_attente / livre -> paid / pending / delivered
+ALTER TABLE orders DROP CONSTRAINT IF EXISTS orders_status_check;
+UPDATE orders SET status = CASE status
+  WHEN 'en_attente' THEN 'pending'
+  WHEN 'achete' THEN 'paid'
+  WHEN 'livre' THEN 'delivered'
+  ELSE status
+END
+WHERE status IN ('en_attente', 'achete', 'livre');
+ALTER TABLE orders ADD CONSTRAINT orders_status_check
+  CHECK (status IN ('pending', 'paid', 'delivered', 'cancelled'));
+
+-- Paiements: initiated / pending_review / confirmed -> pending / proof_uploaded / validated
+ALTER TABLE payments DROP CONSTRAINT IF EXISTS payments_status_check;
+UPDATE payments SET status = CASE status
+  WHEN 'initiated' THEN 'pending'
+  WHEN 'pending_review' THEN 'proof_uploaded'
+  WHEN 'confirmed' THEN 'validated'
+  ELSE status
+END
+WHERE status IN ('initiated', 'pending_review', 'confirmed');
+ALTER TABLE payments ADD CONSTRAINT payments_status_check
+  CHECK (status IN ('pending', 'proof_uploaded', 'validated', 'rejected', 'expired', 'refunded'));
+
+-- La file de revue suit le nouveau vocabulaire (index partiel de la migration 011)
+DROP INDEX IF EXISTS idx_pay_review_queue;
+CREATE INDEX IF NOT EXISTS idx_pay_review_queue ON payments(created_at)
+  WHERE status IN ('pending', 'proof_uploaded');
@@ -0,0 +1,11 @@
+-- =================================================================
+-- Migration 016: Rapprochement des relevés opérateurs (MTN MoMo, Moov)
+-- Description: Numéro payeur saisi au checkout, comparé au relevé
+--              en plus de la référence et du montant
+-- =================================================================
+
+-- Numéro mobile money déclaré par le payeur (repli: user_profiles.phone_msisdn)
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS payer_msisdn VARCHAR(32) NULL;
+
+-- Index du rapprochement: paiements d'une méthode sur la fenêtre du relevé
+CREATE INDEX IF NOT EXISTS idx_pay_method_created ON payments(method, created_at);
@@ -0,0 +1,29 @@
+-- =================================================================
+-- Migration 017: Empreintes perceptuelles des preuves de paiement
+-- Description: dHash 64 bits et ses 4 bandes de 16 bits indexées
+--              (hachage multi-index, voir app/services/proof_similarity.py)
+-- =================================================================
+
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS phash BIGINT NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS phash_b0 INTEGER NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS phash_b1 INTEGER NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS phash_b2 INTEGER NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS phash_b3 INTEGER NULL;
+
+-- Preuve antérieure la plus proche (autre paiement) au moment de l'indexation
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS near_duplicate_of UUID NULL
+  REFERENCES payment_proofs(id) ON DELETE SET NULL;
+ALTER TABLE payment_proofs ADD COLUMN IF NOT EXISTS near_duplicate_distance SMALLINT NULL;
+
+-- Une recherche = 4 parcours d'index combinés (BitmapOr)
+CREATE INDEX IF NOT EXISTS idx_payment_proofs_phash_b0 ON payment_proofs(phash_b0) WHERE phash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_payment_proofs_phash_b1 ON payment_proofs(phash_b1) WHERE phash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_payment_proofs_phash_b2 ON payment_proofs(phash_b2) WHERE phash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_payment_proofs_phash_b3 ON payment_proofs(phash_b3) WHERE phash IS NOT NULL;
+
+-- Rattrapage des preuves existantes par le worker (se replanifie par lots)
+INSERT INTO jobs (queue, kind, payload)
+SELECT 'default', 'proofs.phash_backfill', '{}'::jsonb
+WHERE NOT EXISTS (
+  SELECT 1 FROM jobs WHERE kind = 'proofs.phash_backfill' AND status IN ('queued','running')
+);
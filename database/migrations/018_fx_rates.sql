@@ -0,0 +1,26 @@
+-- =================================================================
+-- Migration 018: Taux de change et conversion des prix
+-- Description: Taux par devise (en XOF pour une unité), chargés en mémoire
+--              par chaque worker; taux verrouillé sur le paiement au checkout
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS fx_rates (
+  currency CHAR(3) PRIMARY KEY,
+  xof_per_unit NUMERIC(18,6) NOT NULL CHECK (xof_per_unit > 0),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- XOF: devise de référence. EUR: parité fixe du franc CFA.
+-- USD: valeur indicative, à mettre à jour par l'admin (PUT /admin/fx-rates/USD)
+INSERT INTO fx_rates (currency, xof_per_unit) VALUES
+  ('XOF', 1),
+  ('EUR', 655.957),
+  ('USD', 600)
+ON CONFLICT (currency) DO NOTHING;
+
+-- Taux appliqué au checkout (XOF pour une unité de payments.currency) et contre-valeur XOF
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS fx_rate NUMERIC(18,6) NULL;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS amount_xof NUMERIC(12,2) NULL;
+
+UPDATE payments SET fx_rate = 1, amount_xof = amount
+WHERE currency = 'XOF' AND amount_xof IS NULL;
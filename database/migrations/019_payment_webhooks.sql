@@ -0,0 +1,33 @@
+-- =================================================================
+-- Migration 019: Notifications d'encaissement des opérateurs (webhooks)
+-- Description: Journal des callbacks MTN MoMo / Moov Money, dédoublonné
+--              sur l'identifiant de transaction de l'opérateur, appliqué
+--              par lots par le worker (job payments.webhooks)
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS payment_webhook_events (
+  id BIGSERIAL PRIMARY KEY,
+  provider VARCHAR(32) NOT NULL,
+  transaction_id VARCHAR(120) NOT NULL,
+  -- Paiement visé: identifiant (X-Reference-Id) et/ou référence PAY... selon l'opérateur
+  payment_id UUID NULL,
+  payment_reference VARCHAR(40) NULL,
+  status VARCHAR(16) NOT NULL CHECK (status IN ('successful','failed','pending')),
+  amount NUMERIC(12,2) NULL,
+  currency VARCHAR(3) NULL,
+  msisdn VARCHAR(32) NULL,
+  payload JSONB NOT NULL,
+  received_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  -- Application au paiement: NULL tant que le lot n'est pas passé
+  attempts INT NOT NULL DEFAULT 0,
+  processed_at TIMESTAMPTZ NULL,
+  outcome VARCHAR(32) NULL,
+  -- Un opérateur renvoie le même callback jusqu'à recevoir un 200
+  CONSTRAINT uq_payment_webhook_events_transaction UNIQUE (provider, transaction_id)
+);
+
+-- Index partiel: seuls les événements en attente sont parcourus par le worker
+CREATE INDEX IF NOT EXISTS idx_payment_webhook_events_pending
+  ON payment_webhook_events(id) WHERE processed_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_payment_webhook_events_payment
+  ON payment_webhook_events(payment_id) WHERE payment_id IS NOT NULL;
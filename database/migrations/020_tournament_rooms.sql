@@ -0,0 +1,25 @@
+-- =================================================================
+-- Migration 020: Répartition des inscrits en salles (rooms)
+-- Description: Escouades pré-formées à l'inscription et places attribuées
+--              par salle / équipe (app/services/room_assignment.py)
+-- =================================================================
+
+-- Code d'escouade choisi par les joueurs qui s'inscrivent ensemble
+ALTER TABLE tournament_registrations ADD COLUMN IF NOT EXISTS squad_code VARCHAR(32) NULL;
+
+CREATE INDEX IF NOT EXISTS idx_treg_tournament_status
+  ON tournament_registrations(tournament_id, status, created_at);
+
+-- Une place par inscription: salle, équipe dans la salle, rang dans l'équipe
+CREATE TABLE IF NOT EXISTS tournament_room_assignments (
+  registration_id UUID PRIMARY KEY REFERENCES tournament_registrations(id) ON DELETE CASCADE,
+  tournament_id UUID NOT NULL REFERENCES tournaments(id) ON DELETE CASCADE,
+  user_id UUID NOT NULL,
+  room_no INT NOT NULL,
+  team_no INT NOT NULL,
+  seat SMALLINT NOT NULL,
+  assigned_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  CONSTRAINT uq_room_assignment_seat UNIQUE (tournament_id, room_no, team_no, seat)
+);
+
+CREATE INDEX IF NOT EXISTS idx_room_assignments_user ON tournament_room_assignments(tournament_id, user_id);
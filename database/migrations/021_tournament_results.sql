@@ -0,0 +1,49 @@
+-- =================================================================
+-- Migration 021: Résultats des matchs et classement des tournois
+-- Description: Résultats par match et par joueur (classement, kills, points)
+--              et cumul par joueur lu par le classement en mémoire
+--              (app/services/leaderboard.py)
+-- =================================================================
+
+-- Un match par numéro et par salle (room_no 0: match sans répartition en salles)
+CREATE TABLE IF NOT EXISTS tournament_matches (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  tournament_id UUID NOT NULL REFERENCES tournaments(id) ON DELETE CASCADE,
+  match_no INT NOT NULL CHECK (match_no >= 1),
+  room_no INT NOT NULL DEFAULT 0,
+  recorded_by UUID NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  CONSTRAINT uq_tournament_matches UNIQUE (tournament_id, match_no, room_no)
+);
+
+CREATE TABLE IF NOT EXISTS tournament_results (
+  match_id UUID NOT NULL REFERENCES tournament_matches(id) ON DELETE CASCADE,
+  tournament_id UUID NOT NULL REFERENCES tournaments(id) ON DELETE CASCADE,
+  user_id UUID NOT NULL,
+  placement SMALLINT NOT NULL CHECK (placement >= 1),
+  kills SMALLINT NOT NULL DEFAULT 0 CHECK (kills >= 0),
+  points INT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (match_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tresults_user ON tournament_results(tournament_id, user_id);
+
+-- Révision croissante: chaque worker ne relit que les cumuls modifiés depuis sa dernière lecture
+CREATE SEQUENCE IF NOT EXISTS tournament_standings_revision_seq;
+
+CREATE TABLE IF NOT EXISTS tournament_standings (
+  tournament_id UUID NOT NULL REFERENCES tournaments(id) ON DELETE CASCADE,
+  user_id UUID NOT NULL,
+  points INT NOT NULL DEFAULT 0,
+  kills INT NOT NULL DEFAULT 0,
+  wins INT NOT NULL DEFAULT 0,
+  matches INT NOT NULL DEFAULT 0,
+  best_placement SMALLINT NULL,
+  revision BIGINT NOT NULL DEFAULT nextval('tournament_standings_revision_seq'),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (tournament_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tstandings_revision ON tournament_standings(tournament_id, revision);
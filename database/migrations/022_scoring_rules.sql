@@ -0,0 +1,25 @@
+-- =================================================================
+-- Migration 022: Barèmes de points par mode de tournoi
+-- Description: Points par place et par kill utilisés à l'enregistrement des
+--              résultats (saisie d'un match et import de feuilles)
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS tournament_scoring_rules (
+  mode VARCHAR(20) PRIMARY KEY,
+  -- Points de la 1re place, de la 2e, ...; 0 au-delà
+  placement_points INT[] NOT NULL CHECK (cardinality(placement_points) BETWEEN 1 AND 100),
+  kill_points INT NOT NULL DEFAULT 1 CHECK (kill_points >= 0),
+  kill_cap INT NULL CHECK (kill_cap >= 0),
+  updated_by UUID NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Barème Battle Royale standard; en duel seule la victoire rapporte des points de place
+INSERT INTO tournament_scoring_rules (mode, placement_points, kill_points) VALUES
+  ('BR_SOLO', '{12,9,8,7,6,5,4,3,2,1}', 1),
+  ('BR_DUO', '{12,9,8,7,6,5,4,3,2,1}', 1),
+  ('BR_SQUAD', '{12,9,8,7,6,5,4,3,2,1}', 1),
+  ('ROOM_HS', '{12,9,8,7,6,5,4,3,2,1}', 1),
+  ('CLASH_SQUAD', '{3}', 1),
+  ('LONE_WOLF', '{3}', 1)
+ON CONFLICT (mode) DO NOTHING;
@@ -0,0 +1,28 @@
+-- =================================================================
+-- Migration 023: File d'envoi des emails
+-- Description: Emails rendus (vérification d'adresse, réinitialisation de mot de
+--              passe) consommés par lots par python -m app.mail_worker
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  template VARCHAR(40) NOT NULL,
+  to_address VARCHAR(255) NOT NULL,
+  subject VARCHAR(255) NOT NULL,
+  body_text TEXT NOT NULL,
+  body_html TEXT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued','sending','sent','failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 6,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_at TIMESTAMPTZ NULL,
+  locked_by VARCHAR(64) NULL,
+  last_error TEXT NULL,
+  sent_at TIMESTAMPTZ NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Index partiels: seuls les emails à envoyer sont parcourus
+CREATE INDEX IF NOT EXISTS idx_email_outbox_ready ON email_outbox(next_attempt_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_email_outbox_sending ON email_outbox(locked_at) WHERE status = 'sending';
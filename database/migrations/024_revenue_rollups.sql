@@ -0,0 +1,60 @@
+-- =================================================================
+-- Migration 024: Agrégats quotidiens du chiffre d'affaires
+-- Description: Revenu validé par jour, pays, méthode et type de catalogue,
+--              tenu à jour par le job analytics.revenue_rollup (voir
+--              app/services/revenue_rollups.py) à partir d'un watermark
+--              sur payments.updated_at
+-- =================================================================
+
+BEGIN;
+
+-- Une ligne par (jour, pays, méthode, type de catalogue); method vide si inconnue,
+-- catalog_type = 'ENTRY_FEE' pour les inscriptions aux tournois
+CREATE TABLE IF NOT EXISTS revenue_daily (
+  day DATE NOT NULL,
+  country CHAR(2) NOT NULL,
+  method VARCHAR(32) NOT NULL,
+  catalog_type VARCHAR(24) NOT NULL,
+  payments INT NOT NULL,
+  revenue_xof NUMERIC(16,2) NOT NULL,
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (day, country, method, catalog_type)
+);
+
+-- Horodatage jusqu'où les paiements modifiés ont été agrégés (NULL: reconstruction complète)
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+  name VARCHAR(40) PRIMARY KEY,
+  watermark TIMESTAMPTZ NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO rollup_watermarks (name, watermark) VALUES ('revenue_daily', NULL)
+ON CONFLICT (name) DO NOTHING;
+
+-- Paiements validés avant la migration 015 (validated_at ajouté sans reprise):
+-- datés de leur dernière modification, faute de l'instant exact de validation
+UPDATE payments SET validated_at = updated_at
+WHERE status IN ('validated', 'refunded') AND validated_at IS NULL;
+
+-- Paiements hors XOF antérieurs à la migration 018: seul l'EUR a une contre-valeur
+-- certaine (parité fixe 1 EUR = 655,957 XOF). Les autres devises gardent amount_xof
+-- NULL (le taux d'aujourd'hui n'est pas celui du paiement): comptés sans revenu,
+-- comme dans GET /admin/stats.
+UPDATE payments SET fx_rate = 655.957, amount_xof = round(amount * 655.957, 2)
+WHERE status IN ('validated', 'refunded') AND amount_xof IS NULL AND currency = 'EUR';
+
+-- Paiements modifiés depuis le watermark (validation, remboursement) et jours à recalculer
+CREATE INDEX IF NOT EXISTS idx_pay_updated ON payments(updated_at) WHERE validated_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_pay_validated ON payments(validated_at) WHERE status = 'validated';
+
+-- Le job purge ses passages terminés (un par minute)
+CREATE INDEX IF NOT EXISTS idx_jobs_done_kind ON jobs(kind) WHERE status = 'done';
+
+-- Premier passage: reconstruction complète, puis toutes les minutes (le job se replanifie)
+INSERT INTO jobs (queue, kind, payload)
+SELECT 'default', 'analytics.revenue_rollup', '{}'::jsonb
+WHERE NOT EXISTS (
+  SELECT 1 FROM jobs WHERE kind = 'analytics.revenue_rollup' AND status IN ('queued','running')
+);
+
+COMMIT;
@@ -0,0 +1,12 @@
+-- =================================================================
+-- Migration 025: Révocations par utilisateur à la milliseconde
+-- Description: revoked_before passe de secondes à millisecondes (claim iat_ms):
+--              un token émis dans la même seconde qu'un changement de rôle ou
+--              une réinitialisation de mot de passe n'échappe plus à la révocation
+-- =================================================================
+
+-- Valeurs en secondes (avant l'an 33658): converties une seule fois
+UPDATE token_revocations SET revoked_before = revoked_before * 1000
+WHERE revoked_before IS NOT NULL AND revoked_before < 1000000000000;
+
+COMMENT ON COLUMN token_revocations.revoked_before IS 'Tokens de user_id émis avant cet instant révoqués (epoch en ms, claim iat_ms)';